@@ -1,27 +1,78 @@
-from bson import ObjectId
-from flask import Flask, render_template, request, redirect, url_for, session, json, send_file
+import os
+import threading
 
+from bson import ObjectId, json_util
+from flask import Blueprint, Flask, Response, current_app, render_template, request, redirect, url_for, session, json, stream_with_context
+
+from database.minhash import THRESHOLD
 from database.report import Report
-from database.reports_data_base import ReportsDataBase
-from database.text_processor import TextProcessor
+from database.reports_data_base import LISTING_SORT, ReportsDataBase
+from database.text_processor import TextProcessorPool, lemma_cache
 from utils.functions import *
+from utils.jobs import Job, JobQueue
+from utils.json_stream import iter_json_records
+from utils.lazy import Lazy
 from math import isnan
 
-app = Flask(__name__)
-app.secret_key = generate_secret_key()
+bp = Blueprint('reports', __name__)
+
+DEFAULT_CONFIG = {
+    # !!! Если не в докере то: mongodb://localhost:27017/
+    'DB_URL': 'mongodb',
+    'DB_NAME': 'nosql1h19-report-stats',
+    'UPLOAD_FOLDER': 'reports/',
+    # Загрузки меньше порога разбираются в памяти, большие сбрасываются в UPLOAD_FOLDER
+    'UPLOAD_SPOOL_THRESHOLD': 8 * 1024 * 1024,
+    # Потоковый разбор docx без построения модели документа python-docx
+    'STREAMING_DOCX': True,
+    'TEXT_PROCESSOR_POOL_SIZE': 4,
+    # Фоновая обработка загрузок: запрос сразу получает номер задачи
+    'ASYNC_UPLOADS': False,
+    'UPLOAD_WORKERS': 2,
+    # Импорт больших файлов выполняется фоновой задачей
+    'IMPORT_ASYNC_THRESHOLD': 16 * 1024 * 1024,
+    'IMPORT_BATCH_SIZE': 500,
+    # Размер страницы JSON API списков отчетов
+    'API_PAGE_SIZE': 50,
+    'API_MAX_PAGE_SIZE': 500,
+    # Загрузка словарей анализатора при создании приложения, до fork рабочих процессов
+    # (gunicorn.conf.py включает ее переменной окружения PRELOAD_ANALYZER=1)
+    'PRELOAD_ANALYZER': os.environ.get('PRELOAD_ANALYZER') == '1',
+}
+
+def open_upload(file):
+    if current_app.config['ASYNC_UPLOADS']:
+        # Поток запроса закрывается после ответа, фоновой задаче нужна своя копия
+        return copy_upload(file, current_app.config['UPLOAD_FOLDER'], current_app.config['UPLOAD_SPOOL_THRESHOLD'])
+    return file.stream
+
+def analyse_and_save(app, docx, meta):
+    try:
+        report = Report(docx, meta, app.text_processor,
+                        streaming=app.config['STREAMING_DOCX'],
+                        cache=app.db.analysis_cache)
+    finally:
+        docx.close()
+
+    id_ = app.db.save_report(report)
+    return f'/report_stat/{id_}'
 
-UPLOAD_FOLDER = 'reports/'
-app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
+def analyse_and_update(app, docx, meta, report_id):
+    try:
+        report = Report(docx, meta, app.text_processor,
+                        streaming=app.config['STREAMING_DOCX'],
+                        cache=app.db.analysis_cache)
+    finally:
+        docx.close()
 
-# !!! Если не в докере то первый аргумент: mongodb://localhost:27017/
-app.db = ReportsDataBase('mongodb', 'nosql1h19-report-stats')
-app.text_processor = TextProcessor()
+    app.db.update_report(ObjectId(report_id), report.serialize_db())
+    return f'/groups/{meta["group"]}/{meta["author"]}/{report_id}'
 
-@app.route('/')
+@bp.route('/')
 def main_page():
     return render_template('index.html')
 
-@app.route('/upload', methods=['GET', 'POST'])
+@bp.route('/upload', methods=['GET', 'POST'])
 def upload_page():
     if request.method == 'GET':
         return render_template('upload.html', data=request.form)
@@ -34,18 +85,19 @@ def upload_page():
 
         if code == 'OK':
             try:
-                path = save_file(request.files['file'], app.config['UPLOAD_FOLDER'])
+                docx = open_upload(request.files['file'])
             except:
                 return render_template('upload.html',
                                        data=request.form,
                                        msg='Ошибка загрузки отчета')
 
-            report = Report(path, serialized_meta(request.form), app.text_processor)
-            os.remove(path)
+            meta = serialized_meta(request.form)
+            if current_app.config['ASYNC_UPLOADS']:
+                job_id = current_app.jobs.submit(analyse_and_save, current_app._get_current_object(), docx, meta)
+                return redirect(url_for('.job_page', job_id=job_id))
 
             try:
-                id_ = app.db.save_report(report)
-                return redirect(f'/report_stat/{id_}')
+                return redirect(analyse_and_save(current_app, docx, meta))
 
             except:
                 return render_template('upload.html',
@@ -54,25 +106,60 @@ def upload_page():
         else:
             return render_template('upload.html', data=request.form)
 
-@app.route('/report_stat/<id_>')
+@bp.route('/jobs/<job_id>')
+def job_page(job_id):
+    job = current_app.jobs.get(job_id)
+    as_json = request.args.get('format') == 'json' or \
+              request.accept_mimetypes.best == 'application/json'
+
+    if job is None:
+        if as_json:
+            return json.dumps({})
+        return render_template('error_page.html', msg='Задача обработки отчета не найдена')
+
+    if as_json:
+        return json.dumps(job.serialize())
+
+    if job.status == Job.DONE:
+        if isinstance(job.result, dict):
+            return render_template('import_result.html', result=job.result)
+        return redirect(job.result)
+
+    if job.status == Job.FAILED:
+        return render_template('error_page.html', msg='Ошибка обработки отчета')
+
+    return render_template('job.html', refresh=1)
+
+@bp.route('/cache_stats')
+def cache_stats_page():
+    stats = {'lemmas': lemma_cache.stats()}
+    if current_app.db.cache is not None:
+        stats['queries'] = current_app.db.cache.stats()
+    if current_app.db.analysis_cache is not None:
+        stats['analysis'] = current_app.db.analysis_cache.stats()
+    return json.dumps(stats)
+
+@bp.route('/report_stat/<id_>')
+@versioned()
 def report_stat_page(id_):
     try:
-        statistics_from_db = app.db.get_report_stat_by_id(ObjectId(id_))
+        statistics_from_db = current_app.db.get_report_stat_by_id(ObjectId(id_))
         return render_template('report_stat.html', data={'words': statistics_from_db['words'],
                                                          'symbols': statistics_from_db['symbols']})
     except:
         return render_template('error_page.html',
-                               msg='Невозможно получить статистку по загруженному отчету')
+                               msg='Невозможно получить статистку по загруженному отчету'), 500
 
-@app.route('/groups')
+@bp.route('/groups')
+@versioned()
 def groups_page():
     try:
-        faculties, courses, departments = app.db.get_all_faculties(), \
-                                          app.db.get_all_courses(), \
-                                          app.db.get_all_departments()
+        faculties, courses, departments = current_app.db.get_all_faculties(), \
+                                          current_app.db.get_all_courses(), \
+                                          current_app.db.get_all_departments()
     except:
-        render_template('groups.html',
-                        msg='Невозможно получить список факультетов/кафедр/групп')
+        return render_template('error_page.html',
+                               msg='Невозможно получить список факультетов/кафедр/групп'), 500
 
     create_selectors = lambda x: ['Любой'] + x if x else ['Любой']
 
@@ -81,17 +168,18 @@ def groups_page():
                            departments=create_selectors(departments),
                            courses=create_selectors(courses))
 
-@app.route('/groups_stat', methods=['GET', 'POST'])
+@bp.route('/groups_stat', methods=['GET', 'POST'])
+@versioned()
 def return_groups_info():
     try:
-        faculty, department, course = request.form['faculty'], request.form['department'], request.form['course']
+        faculty, department, course = request.values['faculty'], request.values['department'], request.values['course']
 
         course = int(course) if course != 'Любой' else None
-        res = app.db.get_stat_by_groups(course=course,
+        res = current_app.db.get_stat_by_groups(course=course,
                                         faculty=faculty if faculty != 'Любой' else None,
                                         department=department if department != 'Любой' else None)
     except:
-        return json.dumps({})
+        return json.dumps({}), 500
 
     data = {}
     for id, stat in enumerate(res):
@@ -99,47 +187,35 @@ def return_groups_info():
     return json.dumps(data)
 
 def validate_path(group_num, person=None, report_id=None):
-    groups = app.db.get_stat_by_groups()
-    if group_num not in [g['_id'] for g in groups]:
+    report_id = ObjectId(report_id) if report_id is not None else None
+    if not current_app.db.path_exists(int(group_num), person, report_id):
         raise Exception()
 
-    if person is not None:
-        stat = app.db.get_stat_of_group(int(group_num))
-        if person not in [p['_id'] for p in stat]:
-            raise Exception()
-
-        if report_id is not None:
-            reports = app.db.get_report_stat_by_id(ObjectId(report_id))
-
-@app.route('/groups/<int:group_num>', methods=['GET', 'POST'])
+@bp.route('/groups/<int:group_num>', methods=['GET', 'POST'])
+@versioned('group_num')
 def group_stat_page(group_num):
     try:
         validate_path(group_num=group_num)
     except:
         return render_template('error_page.html',
-                               msg=f'Группа {group_num} не найдена в базе данных')
+                               msg=f'Группа {group_num} не найдена в базе данных'), 404
 
     if request.method == 'GET':
         try:
-            stat = app.db.get_stat_of_group(group_num)
-
-            data = []
-            for person in stat:
-                del person['unique_words']
-                data.append(person)
+            data = list(current_app.db.get_stat_of_group(group_num))
 
             return render_template('group_stat.html', data=data, group_num=group_num)
 
         except:
             return render_template('error_page.html',
-                                   msg=f'Невозможно получить статистику группы {group_num} из базы данных')
+                                   msg=f'Невозможно получить статистику группы {group_num} из базы данных'), 500
 
     if request.method == 'POST':
-        return redirect(url_for('compare_page',
+        return redirect(url_for('.compare_page',
                                 persons=[v for _, v in request.form.items()],
                                 group=group_num))
 
-@app.route('/compare')
+@bp.route('/compare')
 def compare_page():
     try:
         data = request.args.getlist('persons')
@@ -148,14 +224,17 @@ def compare_page():
         return render_template('error_page.html',
                                msg='Некорректные данные для пересечения словарных запасов')
 
-    for person in data:
-        try:
-            validate_path(group_num=group, person=person)
-        except:
-            return render_template('error_page.html',
-                                   msg=f'Студент {person} не найден в группе {group}')
     try:
-        res, words_intersections = app.db.get_words_compare(data, group)
+        missing = current_app.db.get_missing_authors(group, data)
+    except:
+        return render_template('error_page.html',
+                               msg='Некорректные данные для пересечения словарных запасов')
+
+    if missing:
+        return render_template('error_page.html',
+                               msg=f'Студент {missing[0]} не найден в группе {group}')
+    try:
+        res, words_intersections = current_app.db.get_words_compare(data, group)
     except Exception as e:
         return render_template('error_page.html',
                                msg=f'persons:{data}, group:{group}, error:{e} ')
@@ -163,24 +242,25 @@ def compare_page():
     # TODO добавить в data words_intersections
     return render_template('compare.html', data=res, isnan=isnan, words=words_intersections)
 
-@app.route('/groups/<int:group_num>/<person>')
+@bp.route('/groups/<int:group_num>/<person>')
+@versioned()
 def person_stat_page(group_num, person):
     try:
         validate_path(group_num=group_num, person=person)
     except:
         return render_template('error_page.html',
-                               msg=f'{person} не найден в группе {group_num}')
+                               msg=f'{person} не найден в группе {group_num}'), 404
 
     try:
-        total_person_stat = app.db.get_stat_of_author(person)
-        del total_person_stat['unique_words']
+        total_person_stat = current_app.db.get_stat_of_author(person)
     except:
         return render_template('error_page.html',
-                               msg=f'Невозможно получить статистику для {person}')
+                               msg=f'Невозможно получить статистику для {person}'), 500
 
     try:
         report_stat = []
-        for report in app.db.get_reports_by_author(person, group_num):
+        fields = ('title', 'words.total_words', 'words.total_unique_words', 'words.persent_unique_words')
+        for report in current_app.db.get_reports_by_author(person, group_num, fields=fields):
             report_stat.append({
                 'id': report['_id'],
                 'title': report['title'],
@@ -190,7 +270,7 @@ def person_stat_page(group_num, person):
             })
     except:
         return render_template('error_page.html',
-                               msg=f'Невозможно получить статистику по отчетам для {person}')
+                               msg=f'Невозможно получить статистику по отчетам для {person}'), 500
 
     return render_template('person.html',
                            person=person,
@@ -198,33 +278,86 @@ def person_stat_page(group_num, person):
                            total_person_stat=total_person_stat,
                            report_stat=report_stat)
 
-@app.route('/groups/<int:group_num>/<person>/<report_id>')
+@bp.route('/groups/<int:group_num>/<person>/<report_id>')
+@versioned('group_num')
 def report_page(group_num, person, report_id):
     try:
         validate_path(group_num=group_num, person=person, report_id=report_id)
     except:
         return render_template('error_page.html',
-                               msg=f'Некорректная ссылка. Отчет не найден среди отчетов {person} группы {group_num}')
+                               msg=f'Некорректная ссылка. Отчет не найден среди отчетов {person} группы {group_num}'), 404
 
     try:
-        report = app.db.get_report_stat_by_id(ObjectId(report_id))
+        report = current_app.db.get_report_stat_by_id(ObjectId(report_id))
         return render_template('report.html', title=report['title'], data=report)
     except Exception as e:
         return render_template('error_page.html',
-                               msg=e)
+                               msg=e), 500
 
-@app.route('/groups/<int:group_num>/<person>/<report_id>/bar_graph')
+@bp.route('/groups/<int:group_num>/<person>/<report_id>/bar_graph')
+@versioned('group_num')
 def get_plot_data(group_num, person, report_id):
     try:
         validate_path(group_num=group_num, person=person, report_id=report_id)
-        return json.dumps(app.db.get_report_top_words_by_id(ObjectId(report_id), 6))
     except:
-        return json.dumps({})
+        return json.dumps({}), 404
+
+    try:
+        return json.dumps(current_app.db.get_report_top_words_by_id(ObjectId(report_id), 6))
+    except:
+        return json.dumps({}), 500
+
+@bp.route('/groups/<int:group_num>/<person>/<report_id>/distinctive_terms')
+@versioned()
+def get_report_terms(group_num, person, report_id):
+    try:
+        validate_path(group_num=group_num, person=person, report_id=report_id)
+    except:
+        return json.dumps({}), 404
 
-@app.route('/edit/<report_id>', methods=['GET', 'POST'])
+    try:
+        return json.dumps(current_app.db.get_report_distinctive_terms(ObjectId(report_id), 6))
+    except:
+        return json.dumps({}), 500
+
+@bp.route('/groups/<int:group_num>/<person>/<report_id>/similar')
+@versioned()
+def get_similar_reports(group_num, person, report_id):
+    try:
+        validate_path(group_num=group_num, person=person, report_id=report_id)
+        threshold = float(request.args.get('threshold', THRESHOLD))
+    except:
+        return json.dumps([]), 404
+
+    try:
+        return json_util.dumps(current_app.db.get_similar_reports(ObjectId(report_id), threshold))
+    except:
+        return json.dumps([]), 500
+
+@bp.route('/groups/<int:group_num>/<person>/distinctive_terms')
+@versioned()
+def get_author_terms(group_num, person):
+    try:
+        return json.dumps(current_app.db.get_author_distinctive_terms(person, group_num, 10))
+    except KeyError:
+        return json.dumps({}), 404
+    except:
+        return json.dumps({}), 500
+
+@bp.route('/groups/<int:group_num>/distinctive_terms')
+@versioned()
+def get_group_terms(group_num):
+    try:
+        return json.dumps(current_app.db.get_group_distinctive_terms(group_num, 10))
+    except KeyError:
+        return json.dumps({}), 404
+    except:
+        return json.dumps({}), 500
+
+@bp.route('/edit/<report_id>', methods=['GET', 'POST'])
 def edit_page(report_id):
     try:
-        report = app.db.get_report_by_id(ObjectId(report_id))
+        report = current_app.db.get_report_by_id(ObjectId(report_id))
     except:
         return render_template('error_page.html',
                                msg='Невозможно найти выбранный отчет')
@@ -240,23 +373,24 @@ def edit_page(report_id):
 
         if code == 'OK':
             if 'file' not in request.files.keys() or request.form['file'] == '':
-                app.db.update_report(ObjectId(report_id), serialized_meta(request.form))
+                current_app.db.update_report(ObjectId(report_id), serialized_meta(request.form))
                 return redirect(f'/groups/{request.form["group"]}/{request.form["author"]}/{report_id}')
             else:
                 try:
-                    path = save_file(request.files['file'], app.config['UPLOAD_FOLDER'])
+                    docx = open_upload(request.files['file'])
                 except:
                     return render_template('edit.html',
                                            id=report_id,
                                            data=request.form,
                                            msg='Ошибка редактирования отчета')
 
-                report = Report(path, serialized_meta(request.form), app.text_processor)
-                os.remove(path)
+                meta = serialized_meta(request.form)
+                if current_app.config['ASYNC_UPLOADS']:
+                    job_id = current_app.jobs.submit(analyse_and_update, current_app._get_current_object(), docx, meta, report_id)
+                    return redirect(url_for('.job_page', job_id=job_id))
 
                 try:
-                    app.db.update_report(ObjectId(report_id), report.serialize_db())
-                    return redirect(f'/groups/{request.form["group"]}/{request.form["author"]}/{report_id}')
+                    return redirect(analyse_and_update(current_app, docx, meta, report_id))
 
                 except:
                     return render_template('edit.html',
@@ -266,34 +400,211 @@ def edit_page(report_id):
         else:
             return render_template('edit.html', id=report_id, data=request.form)
 
-@app.route('/logout')
+@bp.route('/api/reports')
+@versioned()
+def reports_api():
+    """ Постраничный список отчетов.
+
+    Ровно один фильтр: group (с необязательным author), faculty, course или department.
+    fields - поля через запятую, limit - размер страницы, cursor - значение next
+    предыдущего ответа.
+    """
+    try:
+        args = request.args
+        if 'group' in args and 'author' in args:
+            by, listing_args = 'author', (args['author'], int(args['group']))
+        elif 'group' in args:
+            by, listing_args = 'group', (int(args['group']),)
+        elif 'faculty' in args:
+            by, listing_args = 'faculty', (args['faculty'],)
+        elif 'course' in args:
+            by, listing_args = 'course', (int(args['course']),)
+        elif 'department' in args:
+            by, listing_args = 'department', (args['department'],)
+        else:
+            raise ValueError('Не указан фильтр отчетов')
+
+        sort_keys = LISTING_SORT[by]
+        fields = [field for field in args.get('fields', '').split(',') if field] or None
+        limit = min(int(args.get('limit', current_app.config['API_PAGE_SIZE'])), current_app.config['API_MAX_PAGE_SIZE'])
+        if limit < 1:
+            raise ValueError('Некорректный размер страницы')
+        after = decode_cursor(args['cursor'], len(sort_keys)) if args.get('cursor') else None
+    except (KeyError, ValueError) as ex:
+        return Response(json.dumps({'error': str(ex)}), status=400, mimetype='application/json')
+
+    try:
+        listing = getattr(current_app.db, f'get_reports_by_{by}')
+        # Лишняя запись показывает, есть ли следующая страница
+        reports = list(listing(*listing_args, fields=fields, after=after, limit=limit + 1))
+    except:
+        return Response(json.dumps({'error': 'Невозможно получить список отчетов'}),
+                        status=500, mimetype='application/json')
+
+    next_cursor = None
+    if len(reports) > limit:
+        reports = reports[:limit]
+        next_cursor = encode_cursor(reports[-1][key] for key in sort_keys)
+
+    return Response(json_util.dumps({'reports': reports, 'next': next_cursor}), mimetype='application/json')
+
+@bp.route('/api/unique_words')
+@versioned()
+def unique_words_api():
+    """ Размер общего словаря отчетов факультета, кафедры, курса и/или группы.
+
+    По умолчанию оценивается по скетчам, exact=1 - точный подсчет.
+    """
+    try:
+        filters = {field: request.args[field] for field in ('faculty', 'department') if request.args.get(field)}
+        filters.update({field: int(request.args[field]) for field in ('course', 'group') if request.args.get(field)})
+        exact = request.args.get('exact') == '1'
+    except ValueError as ex:
+        return Response(json.dumps({'error': str(ex)}), status=400, mimetype='application/json')
+
+    try:
+        count = current_app.db.get_unique_words_count(exact=exact, **filters)
+    except:
+        return Response(json.dumps({'error': 'Невозможно получить размер словаря'}),
+                        status=500, mimetype='application/json')
+
+    return json.dumps(dict(filters, total_unique_words=count, exact=exact))
+
+@bp.route('/logout')
 def logout():
     session.clear()
-    return redirect(url_for('main_page'))
+    return redirect(url_for('.main_page'))
 
-@app.route('/export')
+@bp.route('/export')
 def export_page():
     try:
-        name = 'export_db'
-        open(f'{name}.json', 'w').close()
-
-        new_filename = app.db.export_reports_collection(name)
-        return send_file(new_filename, mimetype='application/json')
+        fmt = request.args.get('format', 'json')
+        if fmt not in ('json', 'ndjson'):
+            raise ValueError(fmt)
+
+        filters = {}
+        for field in ('faculty', 'department'):
+            if request.args.get(field):
+                filters[field] = request.args[field]
+        for field in ('course', 'group'):
+            if request.args.get(field):
+                filters[field] = int(request.args[field])
+
+        exclude = [field for field in request.args.get('exclude', '').split(',') if field]
+        chunks = current_app.db.iter_export(fmt, filters, exclude)
+
+        filename = f'db_export.{fmt}'
+        mimetype = 'application/x-ndjson' if fmt == 'ndjson' else 'application/json'
+        if request.args.get('gzip'):
+            chunks = gzip_stream(chunks)
+            filename += '.gz'
+            mimetype = 'application/gzip'
+
+        return Response(stream_with_context(chunks),
+                        mimetype=mimetype,
+                        headers={'Content-Disposition': f'attachment; filename={filename}'})
 
     except:
         return render_template('error_page.html', msg='Невозможно выполнить экспорт')
 
-@app.route('/import', methods=['POST'])
+def import_reports(app, stream):
+    try:
+        records = iter_json_records(stream, object_hook=json_util.object_hook)
+        return app.db.import_reports(records, app.config['IMPORT_BATCH_SIZE']).serialize()
+    finally:
+        stream.close()
+
+@bp.route('/import', methods=['POST'])
 def import_page():
     if request.method == 'POST':
         try:
-            name = 'import_db'
-            open(f'{name}.json', 'w').close()
-            request.files['file'].save(f'{name}.json')
-            app.db.import_reports_collection(name)
-            return redirect(url_for('main_page'))
+            file = request.files['file']
+            if (request.content_length or 0) > current_app.config['IMPORT_ASYNC_THRESHOLD']:
+                stream = copy_upload(file, current_app.config['UPLOAD_FOLDER'], current_app.config['UPLOAD_SPOOL_THRESHOLD'])
+                job_id = current_app.jobs.submit(import_reports, current_app._get_current_object(), stream)
+                return redirect(url_for('.job_page', job_id=job_id))
+
+            return render_template('import_result.html', result=import_reports(current_app, file.stream))
         except Exception as e:
             return render_template('error_page.html', msg='Ошибка импорта. Попробуйте другой файл.')
 
+@bp.route('/ready')
+def ready_page():
+    """ Готовность процесса к работе: 200 после прогрева, иначе 503. Первый запрос запускает прогрев. """
+    app = current_app._get_current_object()
+    start_warm_up(app)
+    if app.warmed_up.is_set():
+        state = Job.DONE
+    else:
+        state = Job.FAILED if app.warm_up_error else Job.RUNNING
+    status = {'ready': state == Job.DONE, 'warm_up': state, 'error': app.warm_up_error}
+    return Response(json.dumps(status), status=200 if status['ready'] else 503, mimetype='application/json')
+
+def preload(app):
+    """ Загружает словари анализатора до создания рабочих процессов.
+
+    Для серверов, создающих процессы после загрузки приложения (gunicorn --preload):
+    словари pymorphy2 и стоп-слова остаются общими страницами памяти процессов.
+    Подключение к базе не создается - MongoClient нельзя передавать через fork.
+    Создаются все экземпляры пула, чтобы рабочим процессам не пришлось создавать их после fork.
+    """
+    app.text_processor.warm_up(app.text_processor.size)
+
+def warm_up(app):
+    """ Прогревает анализатор и базу в отдельном потоке; результат - в app.warmed_up и app.warm_up_error. """
+    try:
+        app.text_processor.warm_up()
+        app.db.ping()
+    except Exception as ex:
+        app.warm_up_error = f'{type(ex).__name__}: {ex}'
+    else:
+        app.warm_up_error = None
+        app.warmed_up.set()
+
+_warm_up_lock = threading.Lock()
+
+def start_warm_up(app):
+    """ Запускает прогрев, если он еще не выполнен, не идет и не завершился ошибкой.
+
+    Прогрев выполняется в собственном потоке, а не в очереди app.jobs: занятые загрузками
+    потоки очереди и вытеснение старых задач не влияют на /ready.
+    """
+    with _warm_up_lock:
+        if app.warmed_up.is_set() or (app.warm_up_thread is not None and app.warm_up_thread.is_alive()):
+            return
+        app.warm_up_thread = threading.Thread(target=warm_up, args=(app,), daemon=True)
+        app.warm_up_thread.start()
+
+def create_app(config=None):
+    """ Создает приложение; база и анализатор инициализируются при первом обращении.
+
+    С PRELOAD_ANALYZER словари анализатора загружаются сразу (см. preload).
+    Индексы создаются отдельно командой manage.py indexes apply.
+    """
+    app = Flask(__name__)
+    app.secret_key = generate_secret_key()
+    app.request_class = UploadRequest
+    app.config.update(DEFAULT_CONFIG)
+    app.config.update(config or {})
+
+    app.db = Lazy(lambda: ReportsDataBase(app.config['DB_URL'], app.config['DB_NAME']))
+    app.text_processor = TextProcessorPool(app.config['TEXT_PROCESSOR_POOL_SIZE'])
+    # Статусы задач хранятся в базе: запрос /jobs/<id> может попасть в другой рабочий процесс
+    app.jobs = JobQueue(app.config['UPLOAD_WORKERS'], store=app.db)
+    app.warmed_up = threading.Event()
+    app.warm_up_error = None
+    app.warm_up_thread = None
+    app.register_blueprint(bp)
+
+    if app.config['PRELOAD_ANALYZER']:
+        preload(app)
+
+    return app
+
+app = create_app()
+
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', debug=True)
\ No newline at end of file
+    # С перезагрузчиком debug-режима запросы обслуживает дочерний процесс, прогревать нужно только его
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_warm_up(app)
+    app.run(host='0.0.0.0', debug=True)
@@ -0,0 +1,102 @@
+""" Пиковая память Report при полном и потоковом разборе большого .docx.
+
+Документ строится размножением тела Samples/NoSQL.docx.
+Запуск из каталога src: python -m benchmarks.report_memory_benchmark [коэффициент]
+"""
+import copy
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+SAMPLE = os.path.join(os.path.dirname(__file__), '..', '..', 'Samples', 'NoSQL.docx')
+META = {'title': 'NoSQL', 'author': 'Benchmark', 'group': 1, 'department': '-', 'course': 1, 'faculty': '-'}
+
+
+def build_document(path, scale):
+    from docx import Document
+
+    document = Document(SAMPLE)
+    body = document.element.body
+    content = [element for element in body if not element.tag.endswith('sectPr')]
+    section = body[-1]
+
+    for _ in range(scale - 1):
+        for element in content:
+            section.addprevious(copy.deepcopy(element))
+
+    document.save(path)
+
+
+def reset_peak_rss():
+    # Linux: сброс VmHWM, чтобы пик загрузки словарей не скрывал пик разбора
+    try:
+        with open('/proc/self/clear_refs', 'w') as clear_refs:
+            clear_refs.write('5')
+    except OSError:
+        pass
+
+
+def rss_kb(field):
+    """ VmHWM - пиковая, VmRSS - текущая резидентная память процесса. """
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def run(path, streaming):
+    """ Выполняется в отдельном процессе, чтобы пики памяти режимов не смешивались. """
+    from database.report import Report
+    from database.text_processor import TextProcessor
+
+    text_processor = TextProcessor()
+    text_processor.process('прогрев словарей')
+    reset_peak_rss()
+    before = rss_kb('VmRSS')
+
+    start = time.perf_counter()
+    report = Report(path, META, text_processor, streaming=streaming)
+    elapsed = time.perf_counter() - start
+
+    serialized = report.serialize_db()
+    print(rss_kb('VmHWM') - before, elapsed, serialized['words']['total_words'],
+          serialized['words']['most_popular_words'][:10], serialized['symbols'])
+
+
+def measure(path, streaming):
+    output = subprocess.check_output([sys.executable, __file__, '--run', path, str(int(streaming))],
+                                     universal_newlines=True)
+    memory, elapsed, result = output.split(' ', 2)
+    return int(memory), float(elapsed), result
+
+
+def main(scale=50):
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'scaled.docx')
+        build_document(path, scale)
+        print(f'Документ: x{scale}, {os.path.getsize(path) / 1024 / 1024:.1f} МБ')
+
+        results = {}
+        for streaming in (False, True):
+            memory, elapsed, result = measure(path, streaming)
+            results[streaming] = result
+            name = 'потоковый' if streaming else 'python-docx'
+            print(f'{name:>11}: прирост пиковой памяти {memory / 1024:.1f} МБ, {elapsed:.2f} с')
+
+        print('Результаты совпадают' if results[False] == results[True] else 'РЕЗУЛЬТАТЫ РАЗЛИЧАЮТСЯ')
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == '--run':
+        run(sys.argv[2], bool(int(sys.argv[3])))
+    else:
+        main(*[int(arg) for arg in sys.argv[1:2]])
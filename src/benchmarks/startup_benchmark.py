@@ -0,0 +1,61 @@
+""" Время запуска рабочего процесса приложения: импорт, create_app, первый запрос и прогрев анализатора.
+
+Каждый замер выполняется в новом процессе интерпретатора. База данных не нужна:
+подключение создается только при первом обращении к app.db.
+
+Запуск из каталога src: python -m benchmarks.startup_benchmark [число повторов]
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+SAMPLE = os.path.join(SRC, '..', 'Samples', 'NoSQL.docx')
+
+WORKER = '''
+import json, sys, time
+start = time.perf_counter()
+import app as app_module
+timings = {'import app': time.perf_counter() - start}
+
+start = time.perf_counter()
+app = app_module.create_app()
+timings['create_app'] = time.perf_counter() - start
+
+start = time.perf_counter()
+app.test_client().get('/')
+timings['первый запрос /'] = time.perf_counter() - start
+
+if sys.argv[1] == 'preload':
+    start = time.perf_counter()
+    app_module.preload(app)
+    timings['preload'] = time.perf_counter() - start
+
+from database.docx_stream import DocxStream
+with DocxStream(sys.argv[2]) as document:
+    paragraphs = list(document.paragraphs())
+start = time.perf_counter()
+app.text_processor.process_chunks(paragraphs)
+timings['первая обработка отчета'] = time.perf_counter() - start
+
+print(json.dumps(timings))
+'''
+
+
+def run(mode):
+    output = subprocess.check_output([sys.executable, '-c', WORKER, mode, SAMPLE], cwd=SRC)
+    return json.loads(output.decode('utf-8').strip().splitlines()[-1])
+
+
+def main(repeat):
+    for mode in ('lazy', 'preload'):
+        runs = [run(mode) for _ in range(repeat)]
+        print(f'{mode}: медиана по {repeat} запускам')
+        for name in runs[0]:
+            print(f'  {name:<26}{statistics.median(timings[name] for timings in runs) * 1000:>9.1f} мс')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
@@ -0,0 +1,62 @@
+""" Нагрузочная проверка изоляции результатов TextProcessor при работе в потоках.
+
+Запуск из каталога src: python -m benchmarks.text_processor_concurrency
+"""
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from database.text_processor import TextProcessor, TextProcessorPool
+
+WORDS = ['отчет', 'база', 'данных', 'запрос', 'индекс', 'коллекция', 'документ',
+         'сервер', 'клиент', 'таблица', 'поле', 'значение', 'группа', 'студент']
+
+
+def make_text(seed, length=2000):
+    # У каждого текста своя длина и свой набор слов, результаты легко отличить
+    words = [WORDS[(seed * 7 + i * (seed % 5 + 1)) % len(WORDS)] for i in range(length + seed)]
+    return ' '.join(words)
+
+
+def snapshot(result):
+    return (result['symbols']['total_raw_symbols'],
+            result['words']['total_words'],
+            tuple(result['words']['most_popular_words']))
+
+
+def check(name, text_processor, texts, expected, workers, rounds):
+    jobs = [i % len(texts) for i in range(len(texts) * rounds)]
+
+    def run(index):
+        result = text_processor.process(texts[index])
+        return index, snapshot(result), result
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(run, jobs))
+    elapsed = time.perf_counter() - start
+
+    mismatches = sum(1 for index, stat, _ in results if stat != expected[index])
+    shared = len(results) - len({id(result) for _, _, result in results})
+
+    print(f'{name}: {len(results)} текстов за {elapsed:.2f} с, '
+          f'расхождений {mismatches}, общих объектов результата {shared}')
+    return mismatches == 0 and shared == 0
+
+
+def main(workers=16, rounds=20):
+    texts = [make_text(seed) for seed in range(32)]
+    reference = TextProcessor()
+    expected = [snapshot(reference.process(text)) for text in texts]
+
+    ok = check('TextProcessor', reference, texts, expected, workers, rounds)
+    ok &= check('TextProcessorPool', TextProcessorPool(size=4), texts, expected, workers, rounds)
+
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+""" Сравнение скорости и результатов токенизаторов TextProcessor.
+
+Запуск из каталога src: python -m benchmarks.tokenizer_benchmark [файлы.docx]
+"""
+import glob
+import os
+import sys
+import timeit
+
+from docx import Document
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from database.text_processor import TextProcessor
+
+SAMPLES = os.path.join(os.path.dirname(__file__), '..', '..', 'Samples', '*.docx')
+
+
+def read_text(path):
+    return ' '.join([par.text for par in Document(path).paragraphs])
+
+
+def statistics(processor, text):
+    result = processor.process(text)
+    return {
+        'symbols': dict(result['symbols']),
+        'words': {key: value for key, value in result['words'].items() if key != 'words'}
+    }
+
+
+def main(paths):
+    texts = [read_text(path) for path in paths]
+    processors = {name: TextProcessor(tokenizer=name) for name in TextProcessor.TOKENIZERS}
+
+    for path, text in zip(paths, texts):
+        fast, reference = (statistics(processors[name], text) for name in ('fast', 'nltk'))
+        status = 'OK' if fast == reference else 'MISMATCH'
+        print(f'{os.path.basename(path)}: {len(text)} символов, статистика {status}')
+
+    # Лемматизация кэшируется одинаково для обоих путей, прогреваем кэш
+    for processor in processors.values():
+        for text in texts:
+            processor.process(text)
+
+    timings = {}
+    for name, processor in processors.items():
+        timer = timeit.Timer(lambda: [processor.process(text) for text in texts])
+        number, _ = timer.autorange()
+        timings[name] = min(timer.repeat(repeat=5, number=number)) / number
+        print(f'{name:>5}: {timings[name] * 1000:.2f} мс на корпус')
+
+    print(f'Ускорение: {timings["nltk"] / timings["fast"]:.1f}x')
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:] or sorted(glob.glob(SAMPLES)))
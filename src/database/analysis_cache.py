@@ -0,0 +1,121 @@
+import datetime
+import hashlib
+import zlib
+
+import bson
+import pymongo
+from pymongo import ReturnDocument
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def file_digest(docx):
+    """ SHA-256 содержимого docx: путь к файлу, поток или bytes. Поток возвращается в начало. """
+    if isinstance(docx, (bytes, bytearray)):
+        return hashlib.sha256(docx).hexdigest()
+
+    if isinstance(docx, str):
+        with open(docx, 'rb') as stream:
+            return file_digest(stream)
+
+    digest = hashlib.sha256()
+    start = docx.tell()
+    for chunk in iter(lambda: docx.read(CHUNK_SIZE), b''):
+        digest.update(chunk)
+    docx.seek(start)
+
+    return digest.hexdigest()
+
+
+class AnalysisCache:
+    """ Результаты обработки docx, адресуемые хэшем содержимого и настройками TextProcessor.
+
+    Исходный текст хранится сжатым zlib, как в TextStore. Хранится не больше
+    max_entries записей общим размером не больше max_bytes байт (размер BSON);
+    при переполнении удаляются дольше всего не использовавшиеся. Счетчики
+    попаданий и суммарный размер общие для всех процессов приложения
+    и хранятся в коллекции counters.
+    """
+    FIELDS = ('date', 'text', 'words', 'symbols')
+
+    def __init__(self, db, max_entries=10000, max_bytes=256 * 1024 * 1024, level=6):
+        self.entries = db['analysis_cache']
+        self.counters = db['counters']
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.level = level
+
+    def _count(self, field):
+        self.counters.update_one({'_id': 'analysis_cache'}, {'$inc': {field: 1}}, upsert=True)
+
+    def get(self, digest, config):
+        """ Сохраненный результат {'date', 'text', 'words', 'symbols'} или None. """
+        entry = self.entries.find_one_and_update(
+            {'sha256': digest, 'config': config},
+            {'$set': {'last_used': datetime.datetime.utcnow()}},
+            projection={field: 1 for field in self.FIELDS}
+        )
+
+        self._count('misses' if entry is None else 'hits')
+        if entry is None:
+            return None
+
+        analysis = {field: entry[field] for field in self.FIELDS}
+        raw_text = analysis['text'].get('raw_text')
+        if isinstance(raw_text, bytes):
+            analysis['text']['raw_text'] = zlib.decompress(raw_text).decode('utf-8')
+        return analysis
+
+    def put(self, digest, config, analysis):
+        entry = {field: analysis[field] for field in self.FIELDS}
+        if 'raw_text' in entry['text']:
+            entry['text'] = dict(entry['text'], raw_text=zlib.compress(entry['text']['raw_text'].encode('utf-8'),
+                                                                       self.level))
+        entry['last_used'] = datetime.datetime.utcnow()
+        entry['size'] = len(bson.BSON.encode(entry))
+
+        old = self.entries.find_one_and_update({'sha256': digest, 'config': config}, {'$set': entry},
+                                               projection={'size': 1}, upsert=True,
+                                               return_document=ReturnDocument.BEFORE)
+        self._add_bytes(entry['size'] - ((old or {}).get('size') or 0))
+        self._evict()
+
+    def _add_bytes(self, delta):
+        self.counters.update_one({'_id': 'analysis_cache'}, {'$inc': {'bytes': delta}}, upsert=True)
+
+    def _total_bytes(self):
+        return (self.counters.find_one({'_id': 'analysis_cache'}, {'bytes': 1}) or {}).get('bytes', 0)
+
+    def _evict(self):
+        excess = self.entries.estimated_document_count() - self.max_entries
+        excess_bytes = self._total_bytes() - self.max_bytes
+        if excess <= 0 and excess_bytes <= 0:
+            return
+
+        evicted, freed = [], 0
+        for entry in self.entries.find({}, {'_id': 1, 'size': 1}).sort('last_used', pymongo.ASCENDING):
+            if len(evicted) >= excess and freed >= excess_bytes:
+                break
+            evicted.append(entry['_id'])
+            freed += entry.get('size') or 0
+
+        self.entries.delete_many({'_id': {'$in': evicted}})
+        self._add_bytes(-freed)
+
+    def clear(self):
+        self.entries.delete_many({})
+        self.counters.delete_one({'_id': 'analysis_cache'})
+
+    def stats(self):
+        counter = self.counters.find_one({'_id': 'analysis_cache'}) or {}
+        hits, misses = counter.get('hits', 0), counter.get('misses', 0)
+        requests = hits + misses
+        return {
+            'size': self.entries.estimated_document_count(),
+            'max_size': self.max_entries,
+            'bytes': counter.get('bytes', 0),
+            'max_bytes': self.max_bytes,
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': hits / requests if requests else 0.0
+        }
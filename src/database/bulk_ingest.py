@@ -0,0 +1,135 @@
+import csv
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from pymongo.errors import BulkWriteError
+
+from database.report import Report
+from database.text_processor import TextProcessor
+from utils.functions import serialized_meta, validate_input
+
+META_FIELDS = ('title', 'author', 'group', 'department', 'course', 'faculty')
+
+# TextProcessor рабочего процесса, создается один раз в _init_worker
+_text_processor = None
+
+
+def read_manifest(path):
+    """ Читает метаданные отчетов из CSV или JSON: {имя файла: метаданные}.
+
+    CSV должен содержать столбец file и столбцы META_FIELDS. JSON - список
+    объектов с ключом file либо словарь {имя файла: метаданные}.
+    """
+    with open(path, encoding='utf-8') as manifest_file:
+        if path.endswith('.json'):
+            data = json.load(manifest_file)
+            if isinstance(data, dict):
+                data = [dict(meta, file=name) for name, meta in data.items()]
+        else:
+            data = list(csv.DictReader(manifest_file))
+
+    return {os.path.normpath(row['file']): row for row in data}
+
+
+def find_reports(directory):
+    for root, _, files in os.walk(directory):
+        for name in sorted(files):
+            if name.endswith('.docx') and not name.startswith('~$'):
+                yield os.path.join(root, name)
+
+
+def _init_worker(processor_kwargs):
+    global _text_processor
+    _text_processor = TextProcessor(**processor_kwargs)
+
+
+def _analyse(job):
+    path, meta, streaming = job
+    try:
+        return path, Report(path, meta, _text_processor, streaming=streaming), None
+    except Exception as ex:
+        return path, None, f'{type(ex).__name__}: {ex}'
+
+
+class IngestResult:
+    def __init__(self):
+        self.total = 0
+        self.inserted = 0
+        self.failures = []
+        self.elapsed = 0.0
+
+    @property
+    def throughput(self):
+        return self.inserted / self.elapsed if self.elapsed else 0.0
+
+    def fail(self, path, error):
+        self.failures.append((path, error))
+
+
+def _prepare_jobs(directory, manifest, result):
+    for path in find_reports(directory):
+        result.total += 1
+        row = manifest.get(os.path.normpath(os.path.relpath(path, directory)))
+        if row is None:
+            result.fail(path, 'нет метаданных в манифесте')
+            continue
+
+        try:
+            meta = {key: str(row[key]).strip() for key in META_FIELDS}
+            validate_input(meta)
+            yield path, serialized_meta(meta)
+        except (KeyError, ValueError) as ex:
+            result.fail(path, f'некорректные метаданные: {ex}')
+
+
+def _flush(db, batch, result):
+    if not batch:
+        return
+
+    try:
+        result.inserted += len(db.save_reports([report for _, report in batch], ordered=False))
+    except BulkWriteError as ex:
+        errors = ex.details.get('writeErrors', [])
+        result.inserted += ex.details.get('nInserted', 0)
+        for error in errors:
+            result.fail(batch[error['index']][0], error.get('errmsg', 'ошибка записи'))
+    except Exception as ex:
+        for path, _ in batch:
+            result.fail(path, f'{type(ex).__name__}: {ex}')
+
+    batch.clear()
+
+
+def ingest_directory(db, directory, manifest_path, workers=None, batch_size=100,
+                     processor_kwargs=None, streaming=False, progress=None):
+    """ Разбирает все .docx из directory в пуле процессов и сохраняет их пачками.
+
+    Ошибки отдельных файлов собираются в IngestResult.failures и не прерывают загрузку.
+    """
+    result = IngestResult()
+    manifest = read_manifest(manifest_path)
+    jobs = [(path, meta, streaming) for path, meta in _prepare_jobs(directory, manifest, result)]
+    batch = []
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers,
+                             initializer=_init_worker,
+                             initargs=(processor_kwargs or {},)) as executor:
+        for done, (path, report, error) in enumerate(executor.map(_analyse, jobs, chunksize=4), 1):
+            if error is not None:
+                result.fail(path, error)
+            else:
+                batch.append((path, report))
+
+            if len(batch) >= batch_size:
+                _flush(db, batch, result)
+
+            if progress is not None:
+                progress(done, len(jobs))
+
+    _flush(db, batch, result)
+    result.elapsed = time.perf_counter() - start
+
+    return result
@@ -0,0 +1,85 @@
+import copy
+import functools
+import threading
+import time
+from collections import OrderedDict
+
+
+class QueryCache:
+    """ LRU-кэш результатов чтения с ограничением времени жизни записей.
+
+    Каждая запись помнит версию данных, при которой была получена, и
+    считается недействительной, как только версия коллекции изменилась.
+    """
+
+    def __init__(self, max_size=256, ttl=300):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, version):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry_version, expires, value = entry
+                if entry_version == version and expires > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return True, value
+                del self._entries[key]
+
+            self.misses += 1
+            return False, None
+
+    def put(self, key, version, value):
+        with self._lock:
+            self._entries[key] = (version, time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            requests = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / requests if requests else 0.0
+            }
+
+
+def cached(method):
+    """ Кэширует результат метода ReportsDataBase по имени метода и аргументам.
+
+    Курсоры и генераторы сохраняются списком; вызывающий получает копию.
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if self.cache is None:
+            return method(self, *args, **kwargs)
+
+        key = (method.__name__, args, tuple(sorted(kwargs.items())))
+        # Версия читается до данных: если запись произойдет между чтениями,
+        # результат сохранится со старой версией и больше не будет выдан
+        version = self.data_version()
+
+        hit, value = self.cache.get(key, version)
+        if not hit:
+            value = method(self, *args, **kwargs)
+            if not isinstance(value, (dict, list, tuple, str, int, float)):
+                value = list(value)
+            self.cache.put(key, version, value)
+
+        return copy.deepcopy(value)
+
+    return wrapper
@@ -0,0 +1,94 @@
+import posixpath
+import zipfile
+
+from docx.opc.constants import RELATIONSHIP_TYPE as RT
+from docx.oxml import parse_xml
+from docx.oxml.ns import qn
+from lxml import etree
+
+PACKAGE_RELS = '_rels/.rels'
+DEFAULT_DOCUMENT = 'word/document.xml'
+
+BODY = qn('w:body')
+PARAGRAPH = qn('w:p')
+TABLE = qn('w:tbl')
+RUN = qn('w:r')
+TEXT = qn('w:t')
+TAB = qn('w:tab')
+BREAKS = (qn('w:br'), qn('w:cr'))
+
+
+class DocxStream:
+    """ Потоковое чтение текста .docx без построения объектной модели python-docx.
+
+    Абзацы разбираются по одному через iterparse и сразу освобождаются.
+    Текст совпадает с Document(...).paragraphs: учитываются только абзацы
+    верхнего уровня тела документа и прямые дочерние w:r каждого абзаца.
+    """
+
+    def __init__(self, docx):
+        self.zip = zipfile.ZipFile(docx)
+        self.parts = self._package_parts()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.zip.close()
+
+    def _package_parts(self):
+        parts = {}
+        try:
+            rels = etree.fromstring(self.zip.read(PACKAGE_RELS))
+        except KeyError:
+            return parts
+
+        for rel in rels:
+            target = rel.get('Target', '').lstrip('/')
+            parts[rel.get('Type')] = posixpath.normpath(target)
+
+        return parts
+
+    @property
+    def modified(self):
+        """ Дата изменения из свойств документа, как Document(...).core_properties.modified. """
+        name = self.parts.get(RT.CORE_PROPERTIES)
+        if name is None:
+            return None
+
+        return parse_xml(self.zip.read(name)).modified_datetime
+
+    @staticmethod
+    def _paragraph_text(paragraph):
+        text = []
+        for run in paragraph.iterchildren(RUN):
+            for child in run:
+                if child.tag == TEXT:
+                    text.append(child.text or '')
+                elif child.tag == TAB:
+                    text.append('\t')
+                elif child.tag in BREAKS:
+                    text.append('\n')
+
+        return ''.join(text)
+
+    def paragraphs(self):
+        """ Генератор текстов абзацев верхнего уровня. """
+        name = self.parts.get(RT.OFFICE_DOCUMENT, DEFAULT_DOCUMENT)
+
+        with self.zip.open(name) as document:
+            for _, element in etree.iterparse(document, events=('end',), tag=(PARAGRAPH, TABLE)):
+                parent = element.getparent()
+                if parent is None or parent.tag != BODY:
+                    continue
+
+                if element.tag == PARAGRAPH:
+                    yield self._paragraph_text(element)
+
+                # Освобождаем уже обработанные элементы тела документа
+                element.clear()
+                while element.getprevious() is not None:
+                    del parent[0]
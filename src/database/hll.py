@@ -0,0 +1,70 @@
+import hashlib
+import math
+import zlib
+
+import numpy as np
+
+
+class HyperLogLog:
+    """ Оценка числа различных слов по 2^precision регистрам.
+
+    Скетчи с одинаковой точностью объединяются поэлементным максимумом,
+    поэтому словарь автора, группы или факультета оценивается по скетчам
+    отчетов без передачи самих слов. Стандартная ошибка ~ 1.04 / sqrt(2^precision),
+    для precision=11 около 2.3%. Слова хэшируются SHA-1, чтобы скетчи из разных
+    процессов совпадали.
+    """
+
+    def __init__(self, precision=11, registers=None):
+        if not 4 <= precision <= 16:
+            raise ValueError(f'HyperLogLog precision must be in [4, 16], got {precision}')
+
+        self.precision = precision
+        self.registers = bytearray(1 << precision) if registers is None else bytearray(registers)
+
+    @classmethod
+    def from_words(cls, words, precision=11):
+        sketch = cls(precision)
+        sketch.update(words)
+        return sketch
+
+    def update(self, words):
+        bits = 64 - self.precision
+        mask = (1 << bits) - 1
+        registers = self.registers
+
+        for word in words:
+            value = int.from_bytes(hashlib.sha1(word.encode('utf-8')).digest()[:8], 'big')
+            index = value >> bits
+            rank = bits - (value & mask).bit_length() + 1
+            if rank > registers[index]:
+                registers[index] = rank
+
+    def merge(self, other):
+        if other.precision != self.precision:
+            raise ValueError(f'Cannot merge HyperLogLog sketches of precision {self.precision} and {other.precision}')
+
+        registers = np.frombuffer(self.registers, dtype=np.uint8)
+        np.maximum(registers, np.frombuffer(other.registers, dtype=np.uint8), out=registers)
+        return self
+
+    def count(self):
+        registers = np.frombuffer(self.registers, dtype=np.uint8)
+        size = len(registers)
+        alpha = 0.7213 / (1 + 1.079 / size)
+        estimate = alpha * size * size / np.sum(np.ldexp(1.0, -registers.astype(np.int32)))
+
+        # Для малых множеств точнее линейный подсчет по пустым регистрам
+        zeros = size - np.count_nonzero(registers)
+        if estimate <= 2.5 * size and zeros:
+            estimate = size * math.log(size / zeros)
+
+        return int(round(estimate))
+
+    def to_bytes(self):
+        """ Первый байт - точность, далее сжатые zlib регистры (у небольших словарей почти все нулевые). """
+        return bytes([self.precision]) + zlib.compress(bytes(self.registers))
+
+    @classmethod
+    def from_bytes(cls, data):
+        return cls(data[0], zlib.decompress(data[1:]))
@@ -0,0 +1,180 @@
+from collections import namedtuple
+
+import pymongo
+
+ASC = pymongo.ASCENDING
+
+# Полный набор индексов базы: коллекция -> [(ключи, параметры create_index)].
+# Применяется командой manage.py indexes apply, а не при каждом запуске приложения.
+INDEXES = {
+    'reports': [
+        # Сводки автора и группы, проверка ссылок, списки по группе и автору
+        ([('group', ASC), ('author', ASC), ('title', ASC), ('_id', ASC)], {}),
+        # Списки, distinct и $match по факультету, курсу и кафедре
+        ([('faculty', ASC), ('_id', ASC)], {}),
+        ([('course', ASC), ('_id', ASC)], {}),
+        ([('department', ASC), ('_id', ASC)], {}),
+        # Кандидаты в похожие отчеты по LSH-полосам MinHash-подписей
+        ([('lsh_bands', ASC)], {}),
+    ],
+    'rollup_cube': [
+        ([('group', ASC)], {}),
+    ],
+    'author_stats': [
+        ([('group', ASC), ('author', ASC)], {'unique': True}),
+        ([('author', ASC)], {}),
+    ],
+    'vocabulary': [
+        ([('word', ASC)], {'unique': True}),
+    ],
+    # Статусы фоновых задач хранятся сутки после последнего изменения
+    'jobs': [
+        ([('modified', ASC)], {'expireAfterSeconds': 24 * 3600}),
+    ],
+    'analysis_cache': [
+        ([('sha256', ASC), ('config', ASC)], {'unique': True}),
+        ([('last_used', ASC)], {}),
+    ],
+}
+
+# Запрос, который выполняет ReportsDataBase. Для find задаются filter, projection
+# и sort, для агрегации - pipeline, для distinct - имя поля.
+# full_scan=True - полный просмотр коллекции ожидаем (пересчет всех данных).
+QueryPattern = namedtuple('QueryPattern', 'name collection filter projection sort pipeline distinct full_scan')
+QueryPattern.__new__.__defaults__ = (None, None, None, None, None, False)
+
+
+# Параметры, от которых зависит поведение индекса; индекс с теми же ключами,
+# но другими значениями этих параметров, не считается созданным
+OPTIONS = ('unique', 'expireAfterSeconds', 'partialFilterExpression')
+
+
+def _key(keys):
+    return tuple((field, int(direction)) for field, direction in keys)
+
+
+def _options(options):
+    return {option: options[option] for option in OPTIONS if options.get(option) not in (None, False)}
+
+
+def apply_indexes(db, drop_undeclared=False, recreate=False):
+    """ Создает недостающие индексы из INDEXES; с drop_undeclared удаляет не объявленные.
+
+    Индексы с объявленными ключами, но другими OPTIONS, попадают в mismatched;
+    с recreate они удаляются и создаются заново с объявленными параметрами.
+    Возвращает {'created': [...], 'dropped': [...], 'mismatched': [...]} с именами 'коллекция.индекс'.
+    """
+    created, dropped, mismatched = [], [], []
+
+    for name, indexes in INDEXES.items():
+        collection = db[name]
+        existing = {_key(info['key']): (index_name, _options(info))
+                    for index_name, info in collection.index_information().items()}
+        declared = {_key(keys) for keys, _ in indexes}
+
+        missing = []
+        for keys, options in indexes:
+            if _key(keys) not in existing:
+                missing.append(pymongo.IndexModel(keys, **options))
+                continue
+
+            index_name, existing_options = existing[_key(keys)]
+            if existing_options != _options(options):
+                mismatched.append(f'{name}.{index_name}')
+                if recreate:
+                    collection.drop_index(index_name)
+                    missing.append(pymongo.IndexModel(keys, **options))
+
+        if missing:
+            created.extend(f'{name}.{index_name}' for index_name in collection.create_indexes(missing))
+
+        if drop_undeclared:
+            for key, (index_name, _) in existing.items():
+                if index_name != '_id_' and key not in declared:
+                    collection.drop_index(index_name)
+                    dropped.append(f'{name}.{index_name}')
+
+    return {'created': created, 'dropped': dropped, 'mismatched': mismatched}
+
+
+def missing_unique_indexes(db):
+    """ Объявленные в INDEXES уникальные индексы, которых нет в базе: ['коллекция.поле_поле']. """
+    missing = []
+    for name, indexes in INDEXES.items():
+        existing = {_key(info['key']) for info in db[name].index_information().values() if info.get('unique')}
+        for keys, options in indexes:
+            if options.get('unique') and _key(keys) not in existing:
+                missing.append(f'{name}.{"_".join(field for field, _ in keys)}')
+    return missing
+
+
+def _winning_plans(explain):
+    if isinstance(explain, dict):
+        for key, value in explain.items():
+            if key == 'winningPlan':
+                yield value
+            elif key != 'rejectedPlans':
+                yield from _winning_plans(value)
+    elif isinstance(explain, list):
+        for item in explain:
+            yield from _winning_plans(item)
+
+
+def _stages(plan):
+    # Начиная с MongoDB 5.0 план может быть вложен в queryPlan
+    plan = plan.get('queryPlan', plan)
+    yield plan['stage'], plan.get('indexName')
+    for child in [plan.get('inputStage')] + plan.get('inputStages', []):
+        if child:
+            yield from _stages(child)
+
+
+def explain_pattern(db, pattern):
+    """ Список стадий (стадия, индекс) выигравших планов запроса pattern. """
+    collection = db[pattern.collection]
+
+    if pattern.pipeline is not None:
+        explain = db.command('aggregate', pattern.collection, pipeline=pattern.pipeline, explain=True)
+    elif pattern.distinct is not None:
+        explain = db.command('explain', {'distinct': pattern.collection,
+                                         'key': pattern.distinct,
+                                         'query': pattern.filter or {}})
+    else:
+        cursor = collection.find(pattern.filter or {}, pattern.projection)
+        if pattern.sort:
+            cursor = cursor.sort(pattern.sort)
+        explain = cursor.explain()
+
+    return [stage for plan in _winning_plans(explain) for stage in _stages(plan)]
+
+
+def audit_patterns(db, patterns):
+    """ Выполняет explain для всех patterns и отмечает полные просмотры и сортировки в памяти. """
+    results = []
+
+    for pattern in patterns:
+        stages = explain_pattern(db, pattern)
+        problems = []
+        if any(stage == 'COLLSCAN' for stage, _ in stages) and not pattern.full_scan:
+            problems.append('COLLSCAN')
+        if any(stage == 'SORT' for stage, _ in stages):
+            problems.append('SORT в памяти')
+
+        results.append({
+            'name': pattern.name,
+            'collection': pattern.collection,
+            'stages': stages,
+            'indexes': sorted({index for _, index in stages if index}),
+            'problems': problems,
+        })
+
+    return results
+
+
+def index_usage(db):
+    """ {коллекция: {индекс: число использований}} по $indexStats с момента запуска сервера. """
+    usage = dict()
+    for name in INDEXES:
+        usage[name] = {stat['name']: stat['accesses']['ops']
+                       for stat in db[name].aggregate([{'$indexStats': {}}])}
+    return usage
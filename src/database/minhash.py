@@ -0,0 +1,73 @@
+import hashlib
+import re
+
+import numpy as np
+
+# Шинглы - последовательности SHINGLE_SIZE соседних слов исходного текста
+SHINGLE_SIZE = 3
+NUM_PERM = 128
+# BANDS полос по ROWS значений: пара отчетов становится кандидатом, если совпала
+# хотя бы одна полоса; вероятность 1 - (1 - s^ROWS)^BANDS равна 1/2 при сходстве s ~ 0.7
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+# Порог сходства, на который рассчитано разбиение на полосы
+THRESHOLD = (1 / BANDS) ** (1 / ROWS)
+
+_word_re = re.compile(r'[^\W\d_]+')
+
+# Параметры хэш-функций a * x + b (mod 2^64), старшие 32 бита; одинаковы во всех процессах
+_random = np.random.RandomState(1)
+_A = _random.randint(0, 1 << 63, NUM_PERM, dtype=np.int64).astype(np.uint64) * np.uint64(2) + np.uint64(1)
+_B = _random.randint(0, 1 << 63, NUM_PERM, dtype=np.int64).astype(np.uint64)
+_MAX = np.uint32(0xFFFFFFFF)
+_CHUNK = 4096
+
+
+def _hash(value):
+    return int.from_bytes(hashlib.sha1(value.encode('utf-8')).digest()[:8], 'big')
+
+
+def shingles(raw_text, size=SHINGLE_SIZE):
+    """ Множество хэшей шинглов текста (слова в нижнем регистре, без цифр и знаков). """
+    words = _word_re.findall(raw_text.lower())
+    if len(words) < size:
+        return {_hash(' '.join(words))} if words else set()
+    return {_hash(' '.join(words[i:i + size])) for i in range(len(words) - size + 1)}
+
+
+def signature(raw_text):
+    """ MinHash-подпись текста: NUM_PERM минимумов 32-битных хэшей шинглов в виде bytes.
+
+    Для текста без слов возвращает None: такие отчеты не сравниваются.
+    """
+    values = np.fromiter(shingles(raw_text), dtype=np.uint64)
+    if not len(values):
+        return None
+
+    result = np.full(NUM_PERM, _MAX, dtype=np.uint32)
+
+    with np.errstate(over='ignore'):
+        for start in range(0, len(values), _CHUNK):
+            chunk = values[start:start + _CHUNK, np.newaxis]
+            hashes = ((chunk * _A + _B) >> np.uint64(32)).astype(np.uint32)
+            np.minimum(result, hashes.min(axis=0), out=result)
+
+    return result.tobytes()
+
+
+def lsh_bands(signature):
+    """ Ключи LSH-полос подписи: int64 по номеру полосы и ее значениям. """
+    if signature is None:
+        return []
+
+    bands = []
+    for band in range(BANDS):
+        rows = signature[band * ROWS * 4:(band + 1) * ROWS * 4]
+        key = hashlib.sha1(bytes([band]) + rows).digest()[:8]
+        bands.append(int.from_bytes(key, 'big', signed=True))
+    return bands
+
+
+def similarity(first, second):
+    """ Оценка коэффициента Жаккара множеств шинглов по двум подписям. """
+    return float(np.mean(np.frombuffer(first, dtype=np.uint32) == np.frombuffer(second, dtype=np.uint32)))
@@ -0,0 +1,119 @@
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from database.text_processor import TextProcessor, processor_config
+
+# TextProcessor рабочего процесса, создается один раз в _init_worker
+_text_processor = None
+
+
+def _init_worker(processor_kwargs):
+    global _text_processor
+    _text_processor = TextProcessor(**processor_kwargs)
+
+
+def _process(job):
+    report_id, raw_text = job
+    try:
+        processed_text = _text_processor.process(raw_text)
+    except Exception as ex:
+        return report_id, None, f'{type(ex).__name__}: {ex}'
+
+    # Как в Report: очищенный текст и список всех слов не хранятся
+    processed_text['text'].pop('clean_text', None)
+    processed_text['words'].pop('words', None)
+    return report_id, processed_text, None
+
+
+class ReanalysisResult:
+    def __init__(self, config, processed=0, updated=0, failed=0, skipped=0):
+        self.config = config
+        self.total = 0
+        self.processed = processed
+        self.updated = updated
+        self.failed = failed
+        self.skipped = skipped
+        self.failures = []
+        self.elapsed = 0.0
+
+    @property
+    def throughput(self):
+        return self.updated / self.elapsed if self.elapsed else 0.0
+
+    def fail(self, report_id, error):
+        self.failed += 1
+        self.failures.append((report_id, error))
+
+
+def reanalyse_reports(db, processor_kwargs=None, workers=2, batch_size=100, throttle=1.0,
+                      restart=False, progress=None):
+    """ Повторно обрабатывает сохраненные тексты отчетов с настройками processor_kwargs.
+
+    Отчеты читаются пачками по возрастанию _id и обрабатываются в пуле процессов;
+    после каждой пачки в counters сохраняется последний обработанный _id, поэтому
+    прерванная обработка продолжается с места остановки (restart=True начинает заново).
+    После завершения отметка удаляется: следующий запуск снова просматривает все отчеты.
+    Отчеты без сохраненного текста пропускаются и считаются в result.skipped.
+    После пачки процесс спит throttle * время пачки, чтобы не мешать работе сайта.
+    """
+    processor_kwargs = processor_kwargs or {}
+    config = processor_config(**processor_kwargs)
+
+    checkpoint = None if restart else db.get_reanalysis_checkpoint(config)
+    if checkpoint is None:
+        result = ReanalysisResult(config)
+        after = None
+    else:
+        result = ReanalysisResult(config, checkpoint.get('processed', 0), checkpoint.get('updated', 0),
+                                  checkpoint.get('failed', 0), checkpoint.get('skipped', 0))
+        after = checkpoint['last_id']
+        if checkpoint.get('pending'):
+            # Пачка могла быть записана без пересчета сводок и частот слов
+            db.refresh_summaries(tuple(key) for key in checkpoint['pending'])
+            db.rebuild_term_stats()
+    result.total = result.processed + db.count_stale_reports(config, after)
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers,
+                             initializer=_init_worker,
+                             initargs=(processor_kwargs,)) as executor:
+        while True:
+            batch = db.get_stale_reports(config, after, batch_size)
+            if not batch:
+                break
+
+            batch_start = time.perf_counter()
+            jobs = []
+            for report_id, _, _, raw_text in batch:
+                if raw_text is None:
+                    result.skipped += 1
+                else:
+                    jobs.append((report_id, raw_text))
+
+            results = []
+            for report_id, processed_text, error in executor.map(_process, jobs, chunksize=4):
+                if error is not None:
+                    result.fail(report_id, error)
+                else:
+                    results.append((report_id, processed_text))
+
+            # До записи отмечаются затронутые пары (автор, группа): после сбоя пачка
+            # перечитывается с прежнего _id, уже записанные отчеты в нее не попадут
+            db.save_reanalysis_checkpoint(config, last_id=after,
+                                          pending=sorted({(author, group) for _, author, group, _ in batch}))
+            result.updated += db.save_reanalysis(results, config)
+            result.processed += len(batch)
+            after = batch[-1][0]
+            db.save_reanalysis_checkpoint(config, last_id=after, processed=result.processed,
+                                          updated=result.updated, failed=result.failed,
+                                          skipped=result.skipped, pending=[])
+
+            if progress is not None:
+                progress(result.processed, result.total)
+
+            if throttle:
+                time.sleep(throttle * (time.perf_counter() - batch_start))
+
+    db.clear_reanalysis_checkpoint()
+    result.elapsed = time.perf_counter() - start
+    return result
@@ -1,19 +1,56 @@
+import io
+
 from docx import Document
 
+from database.analysis_cache import file_digest
+from database.docx_stream import DocxStream
+from database.minhash import lsh_bands, signature
+
 class Report:
-    def __init__(self, docx_text, meta, text_processor):
-        self.document = Document(docx_text)
-        
-        self.date = self.document.core_properties.modified
+    def __init__(self, docx_text, meta, text_processor, streaming=False, cache=None):
+        """ docx_text - путь к файлу, открытый файл (поток) или содержимое docx в bytes.
+
+        При streaming=True документ читается по абзацам без построения модели python-docx.
+        С cache (AnalysisCache) повторно загруженный файл не обрабатывается заново.
+        """
+        if isinstance(docx_text, (bytes, bytearray)):
+            docx_text = io.BytesIO(docx_text)
+
         self.title = meta['title']
         self.author = meta['author']
         self.group = int(meta['group'])
         self.department = meta['department']
         self.course = int(meta['course'])
         self.faculty = meta['faculty']
-        
-        raw_text = ' '.join([par.text for par in self.document.paragraphs])
-        processed_text = text_processor.process(raw_text)
+        # Ключ настроек обработки: отчеты с другим ключом пересчитывает manage.py reanalyse
+        self.analysis_config = text_processor.config
+
+        if cache is None:
+            self._analyse(docx_text, text_processor, streaming)
+        else:
+            digest = file_digest(docx_text)
+            analysis = cache.get(digest, text_processor.config)
+            if analysis is None:
+                self._analyse(docx_text, text_processor, streaming)
+                cache.put(digest, text_processor.config, self.__dict__)
+            else:
+                self.__dict__.update(analysis)
+
+        # MinHash-подпись исходного текста для поиска похожих отчетов; от настроек обработки не зависит
+        self.minhash = signature(self.text['raw_text'])
+
+    def _analyse(self, docx_text, text_processor, streaming):
+        if streaming:
+            with DocxStream(docx_text) as document:
+                self.date = document.modified
+                processed_text = text_processor.process_chunks(document.paragraphs())
+        else:
+            # Документ не сохраняется в объекте, чтобы Report можно было передавать между процессами
+            document = Document(docx_text)
+            self.date = document.core_properties.modified
+
+            raw_text = ' '.join([par.text for par in document.paragraphs])
+            processed_text = text_processor.process(raw_text)
 
         self.text = processed_text['text']
         self.text.pop('clean_text', None) # Не храним очищенный текст
@@ -34,7 +71,10 @@ class Report:
             'faculty': self.faculty,
             'text': self.text,
             'words': self.words,
-            'symbols': self.symbols
+            'symbols': self.symbols,
+            'analysis_config': self.analysis_config,
+            'minhash': self.minhash,
+            'lsh_bands': lsh_bands(self.minhash)
         }
 
         return serialized_document
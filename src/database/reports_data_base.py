@@ -1,176 +1,906 @@
-import subprocess
+import itertools
+from collections import Counter, defaultdict
 
 import pymongo
+from bson import ObjectId, json_util
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from database.analysis_cache import AnalysisCache
+from database.cache import QueryCache, cached
+from database.hll import HyperLogLog
+from database.indexes import QueryPattern, apply_indexes, audit_patterns, index_usage, missing_unique_indexes
+from database.minhash import THRESHOLD, lsh_bands, signature, similarity
+from database.rollups import CELL_FIELDS, CELL_PROJECTION, build_cells, group_averages, merge_cell
+from database.text_store import TextStore
+from database.summaries import STAT_PROJECTION, SummaryDelta, merge_summaries, summarize, term_counts
+from database.tfidf import top_terms
+from database.vocabulary import Vocabulary
+from database.vocabulary_compare import compare_vocabularies
+
+REPORT_FIELDS = {
+    'title': str,
+    'author': str,
+    'group': int,
+    'department': str,
+    'course': int,
+    'faculty': str,
+    'words': dict,
+    'symbols': dict,
+}
+
+REPORT_STAT_FIELDS = {
+    'words': ('total_words', 'total_unique_words', 'persent_unique_words'),
+    'symbols': ('total_raw_symbols', 'total_clean_symbols'),
+}
+
+# Поля сводок со словарями и служебный номер изменения: не нужны для показа статистики
+VOCABULARY_FIELDS = {'unique_words': 0, 'word_counts': 0, 'vocabulary_sketch': 0, 'revision': 0}
+
+# Поля отчетов, по которым изменяются сводки авторов, групп и ячейки куба
+SUMMARY_PROJECTION = dict(CELL_PROJECTION, author=1, **{'words.unique_words': 1,
+                                                         'words.word_counts': 1,
+                                                         'words.most_popular_words': 1})
+
+# Поля отчетов в ответах поиска похожих отчетов
+SIMILAR_FIELDS = {'title': 1, 'author': 1, 'group': 1, 'course': 1, 'minhash': 1}
+
+# Ключи сортировки списков отчетов; _id в конце делает порядок однозначным для постраничного вывода
+LISTING_SORT = {
+    'author': ('title', '_id'),
+    'group': ('author', 'title', '_id'),
+    'faculty': ('_id',),
+    'course': ('_id',),
+    'department': ('_id',),
+}
+
+
+class ImportResult:
+    MAX_FAILURES = 100
+
+    def __init__(self):
+        self.inserted = 0
+        self.updated = 0
+        self.failed = 0
+        self.failures = []
+        self.error = None
+
+    def fail(self, index, error):
+        self.failed += 1
+        if len(self.failures) < self.MAX_FAILURES:
+            self.failures.append((index, error))
+
+    def serialize(self):
+        return {
+            'inserted': self.inserted,
+            'updated': self.updated,
+            'failed': self.failed,
+            'failures': self.failures,
+            'error': self.error
+        }
+
 
 class ReportsDataBase:
-    def __init__(self, url, db_name):
+    # Словари до такого суммарного размера объединяются точно, большие - по скетчам
+    EXACT_UNIQUE_WORDS_LIMIT = 20000
+
+    def __init__(self, url, db_name, cache_size=256, cache_ttl=300, analysis_cache_size=10000,
+                 analysis_cache_bytes=256 * 1024 * 1024, check_indexes=True):
+        """ check_indexes=True проверяет, что созданы уникальные индексы (manage.py indexes apply).
+
+        Без них общий словарь и сводки могут получить дубликаты.
+        """
         self.db_name = db_name
 
         self.db = pymongo.MongoClient(url)[self.db_name]
+        if check_indexes:
+            missing = missing_unique_indexes(self.db)
+            if missing:
+                raise RuntimeError(f'Unique indexes are missing: {", ".join(missing)}; '
+                                   f'run "python manage.py indexes apply" first '
+                                   '(with --recreate if an index with the same keys is not unique)')
+
+        self.cache = QueryCache(cache_size, cache_ttl) if cache_size else None
+        self.analysis_cache = (AnalysisCache(self.db, analysis_cache_size, analysis_cache_bytes)
+                               if analysis_cache_size else None)
+        self.vocabulary = Vocabulary(self.db)
+        self.texts = TextStore(self.db)
+
+    def ping(self):
+        """ Проверяет доступность сервера; при недоступности выбрасывает pymongo.errors.PyMongoError. """
+        self.db.command('ping')
+
+    def apply_indexes(self, drop_undeclared=False, recreate=False):
+        """ Приводит индексы к набору database.indexes.INDEXES. """
+        return apply_indexes(self.db, drop_undeclared, recreate)
+
+    def index_usage(self):
+        return index_usage(self.db)
+
+    def _query_patterns(self):
+        """ Все виды запросов и агрегаций класса с подставленными значениями из базы. """
+        sample = self.db['reports'].find_one({}, {'group': 1, 'author': 1, 'title': 1, 'faculty': 1,
+                                                 'course': 1, 'department': 1}) or {}
+        # Для пустой базы - любые непустые значения: планы строятся и без подходящих документов
+        group, author = sample.get('group', 1), sample.get('author', '-')
+        faculty, course, department = sample.get('faculty', '-'), sample.get('course', 1), sample.get('department', '-')
+        id_ = sample.get('_id', ObjectId())
+
+        def listing(by, query, after):
+            sort = [(key, pymongo.ASCENDING) for key in LISTING_SORT[by]]
+            return [QueryPattern(f'get_reports_by_{by}', 'reports', query, sort=sort),
+                    QueryPattern(f'get_reports_by_{by} (страница)', 'reports',
+                                 self._seek_query(query, LISTING_SORT[by], after), sort=sort)]
+
+        patterns = [
+            QueryPattern('path_exists (группа)', 'reports', {'group': group}, {'_id': 1}),
+            QueryPattern('path_exists (автор)', 'reports', {'group': group, 'author': author}, {'_id': 1}),
+            QueryPattern('path_exists (отчет)', 'reports', {'group': group, 'author': author, '_id': id_}, {'_id': 1}),
+            QueryPattern('get_report_by_id', 'reports', {'_id': id_}),
+            QueryPattern('_import_batch', 'reports', {'_id': {'$in': [id_]}}, SUMMARY_PROJECTION),
+            QueryPattern('_refresh_author_summary', 'reports', {'author': author, 'group': group}, STAT_PROJECTION),
+            QueryPattern('iter_export (группа)', 'reports', {'group': group}),
+            QueryPattern('iter_export (все)', 'reports', {}, full_scan=True),
+            QueryPattern('get_all_faculties', 'reports', distinct='faculty'),
+            QueryPattern('get_all_courses', 'reports', distinct='course'),
+            QueryPattern('get_all_departments', 'reports', distinct='department'),
+            QueryPattern('_drop_reports', 'reports', distinct='group'),
+            QueryPattern('rebuild_summaries', 'reports', pipeline=[
+                {'$group': {'_id': {'author': '$author', 'group': '$group'}}}
+            ], full_scan=True),
+            QueryPattern('rebuild_term_stats', 'reports', pipeline=[
+                {'$project': {'words.unique_words': 1}},
+                {'$unwind': '$words.unique_words'},
+                {'$group': {'_id': '$words.unique_words', 'df': {'$sum': 1}}}
+            ], full_scan=True),
+            # В кубе по ячейке на группу и набор (факультет, кафедра, курс): просмотр целиком дешев
+            QueryPattern('get_stat_by_groups (курс)', 'rollup_cube', {'course': course}, full_scan=True),
+            QueryPattern('get_stat_by_groups (все условия)', 'rollup_cube',
+                         {'faculty': faculty, 'department': department, 'course': course}, full_scan=True),
+            QueryPattern('_refresh_group_summary (куб)', 'rollup_cube', {'group': group}),
+            QueryPattern('_refresh_group_summary', 'reports', {'group': group}, CELL_PROJECTION),
+            QueryPattern('get_stat_by_groups', 'group_stats', {}, sort=[('_id', pymongo.ASCENDING)]),
+            QueryPattern('_apply_delta (автор)', 'author_stats', {'author': author, 'group': group}),
+            QueryPattern('_apply_delta (группа)', 'group_stats', {'_id': group}),
+            QueryPattern('_apply_delta (куб)', 'rollup_cube', {'_id': {'faculty': faculty, 'department': department,
+                                                                      'course': course, 'group': group}}),
+            QueryPattern('_reports_sketch (автор)', 'reports', {'author': author, 'group': group},
+                         {'words.vocabulary_sketch': 1}),
+            QueryPattern('_reports_sketch (куб)', 'reports', {'faculty': faculty, 'department': department,
+                                                              'course': course, 'group': group},
+                         {'words.vocabulary_sketch': 1}),
+            QueryPattern('_author_stats_sketch', 'author_stats', {'group': group},
+                         {'unique_words': 1, 'vocabulary_sketch': 1}),
+            QueryPattern('get_author_distinctive_terms', 'author_stats', {'author': author, 'group': group},
+                         {'unique_words': 1, 'word_counts': 1}),
+            QueryPattern('get_stat_of_author', 'author_stats', {'author': author}, VOCABULARY_FIELDS),
+            QueryPattern('get_stat_of_group', 'author_stats', {'group': group}, VOCABULARY_FIELDS,
+                         sort=[('author', pymongo.ASCENDING)]),
+            QueryPattern('get_words_compare', 'author_stats', {'group': group, 'author': {'$in': [author]}},
+                         {'author': 1, 'unique_words': 1}, sort=[('author', pymongo.ASCENDING)]),
+            QueryPattern('get_missing_authors', 'author_stats', {'group': group, 'author': {'$in': [author]}},
+                         {'_id': 0, 'author': 1}),
+            QueryPattern('Vocabulary.ids', 'vocabulary', {'word': {'$in': ['']}}),
+            QueryPattern('Vocabulary.words', 'vocabulary', {'_id': {'$in': [0]}}),
+            QueryPattern('get_unique_words_count', 'rollup_cube', {'faculty': faculty},
+                         {'vocabulary_sketch': 1}, full_scan=True),
+            QueryPattern('get_unique_words_count (точно)', 'reports', {'faculty': faculty},
+                         {'words.unique_words': 1}),
+            QueryPattern('_distinctive_terms', 'term_stats', {'_id': {'$in': [0]}}),
+            QueryPattern('TextStore.get_many', 'report_texts', {'_id': {'$in': [id_]}}),
+            QueryPattern('AnalysisCache.get', 'analysis_cache', {'sha256': '', 'config': ''}),
+            QueryPattern('AnalysisCache._evict', 'analysis_cache', {}, {'_id': 1, 'size': 1},
+                         sort=[('last_used', pymongo.ASCENDING)]),
+            QueryPattern('migrate_vocabulary', 'reports', {'$or': [
+                {'words.unique_words.0': {'$type': 'string'}},
+                {'words.most_popular_words.0.0': {'$type': 'string'}}
+            ]}, full_scan=True),
+            QueryPattern('get_similar_reports', 'reports', {'lsh_bands': {'$in': [0]}, '_id': {'$ne': id_}},
+                         SIMILAR_FIELDS),
+            QueryPattern('find_near_duplicates', 'reports', pipeline=[
+                {'$match': {'lsh_bands.0': {'$exists': True}}},
+                {'$project': {'lsh_bands': 1}},
+                {'$unwind': '$lsh_bands'},
+                {'$group': {'_id': '$lsh_bands', 'ids': {'$push': '$_id'}}}
+            ], full_scan=True),
+            # Отчеты с другими настройками обработки: обычно почти все, индекс не нужен
+            QueryPattern('get_stale_reports', 'reports', self._stale_query('', id_),
+                         {'author': 1, 'group': 1, 'text.raw_text': 1},
+                         sort=[('_id', pymongo.ASCENDING)], full_scan=True),
+            QueryPattern('backfill_minhash', 'reports', {'minhash': {'$exists': False}}, full_scan=True),
+            QueryPattern('migrate_texts', 'reports', {'text.raw_text': {'$exists': True}}, full_scan=True),
+        ]
+
+        patterns += listing('author', {'author': author, 'group': group}, [sample.get('title', ''), id_])
+        patterns += listing('group', {'group': group}, [author, sample.get('title', ''), id_])
+        patterns += listing('faculty', {'faculty': faculty}, [id_])
+        patterns += listing('course', {'course': course}, [id_])
+        patterns += listing('department', {'department': department}, [id_])
 
-        self.db['reports'].create_index('group')
-        self.db['reports'].create_index('author')
-        self.db['reports'].create_index('title')
-        
-        self.db['reports'].create_index([
-            ('group', pymongo.ASCENDING),
-            ('author', pymongo.ASCENDING)
-        ])
-        
-        self.db['reports'].create_index([
-            ('group', pymongo.ASCENDING), 
-            ('faculty', pymongo.ASCENDING), 
-            ('department', pymongo.ASCENDING)
-        ])
-
-    def export_reports_collection(self, file_name):
-        result = subprocess.run(['mongoexport',
-        f'--host=mongodb',
-        '--pretty',
-        '--jsonArray',
-        f'--db={self.db_name}',
-        '--collection=reports',
-        f'--out={file_name}.json'])
-
-        if result.returncode == 0:
-            return f'{file_name}.json'
+        return patterns
+
+    def audit_indexes(self):
+        """ Планы выполнения всех запросов класса; см. database.indexes.audit_patterns. """
+        return audit_patterns(self.db, self._query_patterns())
+
+    def iter_export(self, fmt='json', filters=None, exclude=None, batch_size=500):
+        """ Выгружает отчеты по курсору частями: JSON-массив или NDJSON (fmt='ndjson').
+
+        filters - условия по полям отчета, exclude - исключаемые поля (например, text.raw_text).
+        Тексты отчетов подгружаются из report_texts, если text.raw_text не исключен.
+        Память не зависит от размера коллекции: в ней держится только одна пачка курсора.
+        _id нужен для подгрузки текстов, поэтому читается всегда и удаляется уже из готовых отчетов.
+        """
+        exclude = set(exclude or ())
+        strip_id = '_id' in exclude
+        projection = {field: 0 for field in exclude - {'_id'}} or None
+        cursor = self.db['reports'].find(filters or {}, projection, batch_size=batch_size)
+        with_text = not {'text', 'text.raw_text'} & exclude
+        batches = self._export_batches(cursor, batch_size, with_text, strip_id)
+
+        if fmt == 'ndjson':
+            for batch in batches:
+                yield '\n'.join(batch) + '\n'
         else:
-            raise ChildProcessError(f'mongoexport error return code [{result.returncode}]')
+            yield '['
+            for number, batch in enumerate(batches):
+                yield (',\n' if number else '\n') + ',\n'.join(batch)
+            yield '\n]\n'
+
+    def _export_batches(self, cursor, batch_size, with_text, strip_id=False):
+        while True:
+            reports = list(itertools.islice(cursor, batch_size))
+            if not reports:
+                return
+            if with_text:
+                self._attach_texts(reports)
+            if strip_id:
+                for report in reports:
+                    del report['_id']
+            # Выгрузка содержит слова, а не номера, и не зависит от коллекции vocabulary
+            yield [json_util.dumps(report) for report in self._decode_reports(reports)]
+
+    def _encode(self, report):
+        """ Копия документа отчета, в которой слова заменены номерами из общего словаря. """
+        if 'words' not in report:
+            return report
+        return dict(report, words=self.vocabulary.encode_words(report['words']))
+
+    @staticmethod
+    def _split_text(report):
+        """ (копия документа без text.raw_text, текст или None): тексты хранятся в TextStore. """
+        if 'raw_text' not in report.get('text', {}):
+            return report, None
+
+        text = dict(report['text'])
+        raw_text = text.pop('raw_text')
+        return dict(report, text=text), raw_text
+
+    def _attach_texts(self, reports):
+        texts = self.texts.get_many(report['_id'] for report in reports)
+        for report in reports:
+            if report['_id'] in texts:
+                report.setdefault('text', {})['raw_text'] = texts[report['_id']]
+        return reports
+
+    def _decode(self, report):
+        if report is not None and 'words' in report:
+            self.vocabulary.decode_words(report['words'])
+        return report
+
+    def _decode_reports(self, reports):
+        # Номера всех отчетов загружаются из словаря одним запросом
+        ids = set()
+        for report in reports:
+            words = report.get('words', {})
+            ids.update(words.get('unique_words', ()))
+            ids.update(word for word, _ in words.get('most_popular_words', ()))
+        self.vocabulary.words(id_ for id_ in ids if not isinstance(id_, str))
+
+        for report in reports:
+            self._decode(report)
+        return reports
+
+    @staticmethod
+    def _validate_record(record):
+        if not isinstance(record, dict):
+            raise ValueError('запись должна быть объектом')
+
+        for field, types in REPORT_FIELDS.items():
+            if not isinstance(record.get(field), types):
+                raise ValueError(f'поле {field} отсутствует или имеет неверный тип')
+
+        for section, fields in REPORT_STAT_FIELDS.items():
+            for field in fields:
+                if not isinstance(record[section].get(field), (int, float)):
+                    raise ValueError(f'поле {section}.{field} отсутствует или не число')
+
+        if not isinstance(record['words'].get('unique_words'), list):
+            raise ValueError('поле words.unique_words отсутствует или не список')
+
+    def _import_batch(self, batch, result):
+        ids = [record['_id'] for _, record in batch if '_id' in record]
+        old_reports = {report['_id']: report for report in self.db['reports'].find(
+            {'_id': {'$in': ids}}, SUMMARY_PROJECTION)}
+
+        requests = []
+        texts = []
+        vocabularies = []
+        for _, record in batch:
+            record, raw_text = self._split_text(self._encode(record))
+            if raw_text is not None:
+                # Подпись для поиска похожих отчетов, как у загруженных через Report
+                record['minhash'] = signature(raw_text)
+                record['lsh_bands'] = lsh_bands(record['minhash'])
+            vocabularies.append((old_reports.get(record.get('_id'), {}).get('words', {}).get('unique_words', ()),
+                                 record['words']['unique_words']))
+            if '_id' in record:
+                fields = {key: value for key, value in record.items() if key != '_id'}
+                # Как mongoimport --mode=merge: поля записи дописываются в существующий документ
+                requests.append(pymongo.UpdateOne({'_id': record['_id']}, {'$set': fields}, upsert=True))
+            else:
+                record['_id'] = ObjectId()
+                requests.append(pymongo.InsertOne(record))
+            texts.append((record['_id'], raw_text))
+
+        failed = set()
+        try:
+            write_result = self.db['reports'].bulk_write(requests, ordered=False)
+            details = write_result.bulk_api_result
+        except BulkWriteError as ex:
+            details = ex.details
+            for error in details.get('writeErrors', []):
+                failed.add(error['index'])
+                result.fail(batch[error['index']][0], error.get('errmsg', 'ошибка записи'))
+
+        self.texts.put_many(text for index, text in enumerate(texts)
+                            if index not in failed and text[1] is not None)
+        written = [vocabulary for index, vocabulary in enumerate(vocabularies) if index not in failed]
+        self._update_document_frequencies([old for old, _ in written], [new for _, new in written])
+
+        result.inserted += details.get('nInserted', 0) + details.get('nUpserted', 0)
+        result.updated += details.get('nMatched', 0)
+
+        written_ids = [report_id for index, (report_id, _) in enumerate(texts) if index not in failed]
+        self._after_write((old_reports[report_id] for report_id in written_ids if report_id in old_reports),
+                          self.db['reports'].find({'_id': {'$in': written_ids}}, SUMMARY_PROJECTION))
+
+    def import_reports(self, records, batch_size=500):
+        """ Импортирует записи (номер, объект) пачками bulk_write(ordered=False).
+
+        Записи с _id сливаются с существующими документами или добавляются, без _id - добавляются.
+        """
+        result = ImportResult()
+        batch = []
 
-    def import_reports_collection(self, file_name):
-        result = subprocess.run(['mongoimport',
-        f'--host=mongodb',
-        '--jsonArray',
-        '--mode=merge',
-        f'--db={self.db_name}',
-        '--collection=reports',
-        f'--file={file_name}.json'])
+        try:
+            for index, record in records:
+                try:
+                    self._validate_record(record)
+                except ValueError as ex:
+                    result.fail(index, str(ex))
+                    continue
 
-        if result.returncode != 0:
-            raise ChildProcessError(f'mongoimport error return code [{result.returncode}]')
+                batch.append((index, record))
+                if len(batch) >= batch_size:
+                    self._import_batch(batch, result)
+                    batch = []
+        except ValueError as ex:
+            # Файл поврежден: сохраняем все, что удалось прочитать до ошибки
+            result.error = str(ex)
+
+        if batch:
+            self._import_batch(batch, result)
+
+        return result
 
     def _drop_reports(self):
+        groups = self.db['reports'].distinct('group')
         self.db['reports'].drop()
-        
+        self.db['author_stats'].drop()
+        self.db['group_stats'].drop()
+        self.db['rollup_cube'].drop()
+        self.texts.drop()
+        self.db['term_stats'].drop()
+        self._bump_version(groups)
+
+    def get_version(self, group=None):
+        """ (версия, время изменения) всех отчетов или отчетов одной группы.
+
+        Версия увеличивается при каждой записи, затрагивающей эти отчеты.
+        """
+        counter = self.db['counters'].find_one({'_id': 'reports' if group is None else f'group:{group}'})
+        if counter is None:
+            return 0, None
+        return counter['version'], counter.get('modified')
+
+    def data_version(self):
+        return self.get_version()[0]
+
+    def _bump_version(self, groups=()):
+        # Счетчики не сбрасываются даже при удалении отчетов, чтобы версии не повторялись
+        update = {'$inc': {'version': 1}, '$currentDate': {'modified': True}}
+        counters = ['reports'] + [f'group:{group}' for group in set(groups)]
+        self.db['counters'].bulk_write([pymongo.UpdateOne({'_id': counter}, update, upsert=True)
+                                        for counter in counters])
+
+    def _after_write(self, removed, added):
+        """ Обновляет производные данные после записи отчетов.
+
+        removed и added - документы отчетов (поля SUMMARY_PROJECTION) до и после записи.
+        """
+        removed, added = list(removed), list(added)
+        self._apply_summary_changes(removed, added)
+        self._bump_version(report['group'] for report in removed + added)
+
+    def _apply_summary_changes(self, removed, added):
+        """ Добавляет к сводкам авторов, групп и ячейкам куба изменения от записанных отчетов.
+
+        Сводки не пересчитываются по всем отчетам: стоимость записи зависит от числа
+        записанных отчетов и размера словарей затронутых сводок, а не от размера группы.
+        Отчеты заново читаются, только если из сводки удален отчет: из скетча словаря
+        нельзя вычесть слова, и он строится по скетчам оставшихся отчетов.
+        """
+        # Отчеты, у которых не изменились поля сводок (например, только название), не учитываются
+        unchanged = {report['_id']: report for report in removed}
+        unchanged = {report['_id'] for report in added if unchanged.get(report['_id']) == report}
+        removed = [report for report in removed if report['_id'] not in unchanged]
+        added = [report for report in added if report['_id'] not in unchanged]
+
+        authors, groups, cells = defaultdict(SummaryDelta), defaultdict(SummaryDelta), defaultdict(SummaryDelta)
+        for sign, reports in ((-1, removed), (1, added)):
+            for report in self._with_sketches(reports):
+                authors[report['author'], report['group']].add(report, sign)
+                groups[report['group']].add(report, sign)
+                cells[tuple(report[field] for field in CELL_FIELDS)].add(report, sign)
+
+        for (author, group), delta in authors.items():
+            key = {'author': author, 'group': group}
+            sketch = (lambda key=key: self._reports_sketch(key)) if delta.removed else None
+            self._apply_delta('author_stats', key, delta.merge, 'total_reports_loaded', sketch)
+
+        # Скетч группы складывается из уже измененных скетчей авторов
+        for group, delta in groups.items():
+            sketch = (lambda group=group: self._author_stats_sketch(group)) if delta.removed else None
+            self._apply_delta('group_stats', {'_id': group}, delta.merge, 'total_reports_loaded', sketch)
+
+        for cell, delta in cells.items():
+            fields = dict(zip(CELL_FIELDS, cell))
+            sketch = (lambda fields=fields: self._reports_sketch(fields)) if delta.removed else None
+            self._apply_delta('rollup_cube', {'_id': fields}, lambda cell, delta=delta: merge_cell(cell, delta),
+                              'count', sketch, fields)
+
+    def _apply_delta(self, collection, key, merge, count_field, sketch=None, fields=None):
+        """ Изменяет документ сводки key коллекции collection.
+
+        merge(документ или None) возвращает ($inc, новые значения полей). Запись
+        выполняется, только если поле revision не изменилось с момента чтения;
+        иначе другой процесс успел изменить сводку, и она перечитывается.
+        sketch() строит скетч словаря заново, fields - поля нового документа.
+        """
+        entries = self.db[collection]
+        while True:
+            summary = entries.find_one(key)
+            inc, values = merge(summary)
+
+            if values[count_field] <= 0:
+                if summary is None or entries.delete_one(dict(key, revision=summary.get('revision'))).deleted_count:
+                    return
+                continue
+
+            if sketch is not None:
+                values['vocabulary_sketch'] = sketch().to_bytes()
+
+            if summary is None:
+                try:
+                    entries.insert_one(dict(values, revision=1, **dict(key, **(fields or {}))))
+                    return
+                except DuplicateKeyError:
+                    continue
+
+            update = {'$inc': dict(inc, revision=1),
+                      '$set': {field: value for field, value in values.items() if field not in inc}}
+            if entries.update_one(dict(key, revision=summary.get('revision')), update).matched_count:
+                return
+
+    def _reports_sketch(self, query):
+        sketch = HyperLogLog()
+        for report in self._with_sketches(self.db['reports'].find(query, {'words.vocabulary_sketch': 1})):
+            sketch.merge(HyperLogLog.from_bytes(report['words']['vocabulary_sketch']))
+        return sketch
+
+    def _author_stats_sketch(self, group):
+        sketch = HyperLogLog()
+        for summary in self.db['author_stats'].find({'group': group}, {'unique_words': 1, 'vocabulary_sketch': 1}):
+            sketch.merge(self._sketch(summary))
+        return sketch
+
+    def _update_document_frequencies(self, removed, added):
+        """ Обновляет term_stats (число отчетов с каждым словом) по словарям удаленных и добавленных отчетов.
+
+        Меняются только счетчики слов этих отчетов, IDF вычисляется при чтении.
+        """
+        delta = Counter()
+        for words in added:
+            delta.update(words)
+        for words in removed:
+            delta.subtract(words)
+
+        requests = [pymongo.UpdateOne({'_id': word}, {'$inc': {'df': count}}, upsert=True)
+                    for word, count in delta.items() if count]
+        if requests:
+            self.db['term_stats'].bulk_write(requests, ordered=False)
+        if any(count < 0 for count in delta.values()):
+            self.db['term_stats'].delete_many({'df': {'$lte': 0}})
+
+    def rebuild_term_stats(self):
+        """ Пересчитывает term_stats по всем отчетам (после импорта старых данных или сбоя). """
+        frequencies = self.db['reports'].aggregate([
+            {'$project': {'words.unique_words': 1}},
+            {'$unwind': '$words.unique_words'},
+            {'$group': {'_id': '$words.unique_words', 'df': {'$sum': 1}}}
+        ], allowDiskUse=True)
+
+        self.db['term_stats'].delete_many({})
+        while True:
+            batch = list(itertools.islice(frequencies, 1000))
+            if not batch:
+                break
+            # Незакодированные слова (до migrate_vocabulary) в индекс не попадают
+            batch = [entry for entry in batch if not isinstance(entry['_id'], str)]
+            if batch:
+                self.db['term_stats'].insert_many(batch)
+
+    def _sketch(self, vocabulary):
+        """ Скетч словаря отчета или сводки; у сохраненных без скетча строится по unique_words. """
+        if 'vocabulary_sketch' in vocabulary:
+            return HyperLogLog.from_bytes(vocabulary['vocabulary_sketch'])
+        return HyperLogLog.from_words(self.vocabulary.decode(vocabulary['unique_words']))
+
+    def _with_sketches(self, reports):
+        for report in reports:
+            words = report['words']
+            if 'vocabulary_sketch' not in words:
+                if 'unique_words' not in words:
+                    words.update(self.db['reports'].find_one({'_id': report['_id']}, {'words.unique_words': 1})['words'])
+                words['vocabulary_sketch'] = self._sketch(words).to_bytes()
+            yield report
+
+    def _refresh_author_summary(self, author, group):
+        reports = self.db['reports'].find({'author': author, 'group': group},
+                                          dict(STAT_PROJECTION, **{'words.unique_words': 1,
+                                                                   'words.word_counts': 1,
+                                                                   'words.most_popular_words': 1,
+                                                                   'words.vocabulary_sketch': 1}))
+        summary = summarize(self._with_sketches(reports), with_vocabulary=True)
+        summary.update(self.vocabulary.encode_words({'unique_words': summary['unique_words'],
+                                                     'word_counts': summary['word_counts']}))
+        summary['total_unique_words'] = len(summary['unique_words'])
+
+        if summary['total_reports_loaded']:
+            self.db['author_stats'].replace_one({'author': author, 'group': group},
+                                                dict(summary, author=author, group=group),
+                                                upsert=True)
+        else:
+            self.db['author_stats'].delete_one({'author': author, 'group': group})
+
+    def _refresh_group_summary(self, group):
+        """ Пересчитывает сводку группы и ее ячейки куба rollup_cube одним чтением отчетов группы. """
+        reports = list(self._with_sketches(self.db['reports'].find({'group': group}, CELL_PROJECTION)))
+        summary = summarize(reports)
+
+        cells = build_cells(reports)
+        for cell in cells:
+            self.db['rollup_cube'].replace_one({'_id': cell['_id']}, cell, upsert=True)
+        # Ячейки, из которых ушли все отчеты группы (например, после смены кафедры)
+        self.db['rollup_cube'].delete_many({'group': group, '_id': {'$nin': [cell['_id'] for cell in cells]}})
+
+        # Словарь группы складывается из уже пересчитанных сводок авторов
+        counts = Counter()
+        sketch = HyperLogLog()
+        for author_summary in self.db['author_stats'].find({'group': group}, {'unique_words': 1, 'word_counts': 1,
+                                                                              'vocabulary_sketch': 1}):
+            counts.update(term_counts(author_summary))
+            sketch.merge(self._sketch(author_summary))
+        summary['unique_words'] = sorted(counts)
+        summary['word_counts'] = [counts[word] for word in summary['unique_words']]
+        summary['total_unique_words'] = len(counts)
+        summary['vocabulary_sketch'] = sketch.to_bytes()
+
+        if summary['total_reports_loaded']:
+            self.db['group_stats'].replace_one({'_id': group}, summary, upsert=True)
+        else:
+            self.db['group_stats'].delete_one({'_id': group})
+
+    def refresh_summaries(self, keys):
+        """ Заново строит по отчетам сводки пар (автор, группа), их групп и ячейки куба.
+
+        Обычные записи изменяют сводки в _apply_summary_changes; полный пересчет нужен
+        для rebuild_summaries и после сбоя между записью отчетов и изменением сводок.
+        """
+        keys = set(keys)
+        for author, group in keys:
+            self._refresh_author_summary(author, group)
+
+        for group in {group for _, group in keys}:
+            self._refresh_group_summary(group)
+
+    def rebuild_summaries(self):
+        """ Пересчитывает сводки авторов, групп и куб rollup_cube по всем отчетам. """
+        self.db['author_stats'].delete_many({})
+        self.db['group_stats'].delete_many({})
+        self.db['rollup_cube'].delete_many({})
+
+        keys = {(key['_id']['author'], key['_id']['group']) for key in self.db['reports'].aggregate([
+            {'$group': {'_id': {'author': '$author', 'group': '$group'}}}
+        ])}
+        self.refresh_summaries(keys)
+        self._bump_version(group for _, group in keys)
+
     def save_report(self, report):
-        insert_result = self.db['reports'].insert_one(report.serialize_db())
+        document, raw_text = self._split_text(self._encode(report.serialize_db()))
+        insert_result = self.db['reports'].insert_one(document)
         inserted_id =  insert_result.inserted_id
 
+        if raw_text is not None:
+            self.texts.put_many([(inserted_id, raw_text)])
+        self._update_document_frequencies([], [document['words']['unique_words']])
+        self._after_write([], [document])
+
         return inserted_id
 
-    def save_reports(self, reports):
-        reports_to_insert = map(lambda report: report.serialize_db(), reports)
-        insert_result = self.db['reports'].insert_many(reports_to_insert)
-        insterted_ids = insert_result.insterted_ids
+    def save_reports(self, reports, ordered=True):
+        reports = list(reports)
+        documents, texts = [], []
+        for report in reports:
+            document, raw_text = self._split_text(self._encode(report.serialize_db()))
+            documents.append(document)
+            texts.append(raw_text)
 
-        return insterted_ids
+        inserted = []
+        try:
+            insert_result = self.db['reports'].insert_many(documents, ordered=ordered)
+            inserted_ids = insert_result.inserted_ids
+            inserted = range(len(documents))
+        except BulkWriteError as ex:
+            failed = {error['index'] for error in ex.details.get('writeErrors', [])}
+            # При ordered=True после первой ошибки вставка прекращается
+            last = min(failed) if ordered and failed else len(documents)
+            inserted = [index for index in range(last) if index not in failed]
+            raise
+        finally:
+            self.texts.put_many((documents[index]['_id'], texts[index])
+                                for index in inserted if texts[index] is not None)
+            self._update_document_frequencies([], (documents[index]['words']['unique_words'] for index in inserted))
+            # Сводки обновляются и при частично выполненной вставке
+            self._after_write([], (documents[index] for index in inserted))
+
+        return inserted_ids
 
     def update_report(self, report_id, update_dict):
-        self.db['reports'].update_one({'_id': report_id}, {'$set': update_dict})
+        update_dict, raw_text = self._split_text(self._encode(update_dict))
+        old_report = self.db['reports'].find_one_and_update({'_id': report_id},
+                                                            {'$set': update_dict},
+                                                            SUMMARY_PROJECTION)
+        if old_report is None:
+            return
+        new_report = self.db['reports'].find_one({'_id': report_id}, SUMMARY_PROJECTION)
+
+        if raw_text is not None:
+            self.texts.put_many([(report_id, raw_text)])
+        if 'unique_words' in update_dict.get('words', {}):
+            self._update_document_frequencies([old_report['words']['unique_words']],
+                                              [update_dict['words']['unique_words']])
 
+        self._after_write([old_report], [new_report] if new_report is not None else [])
+
+    def path_exists(self, group, author=None, report_id=None):
+        """ Проверяет одним индексированным запросом, что группа, автор в ней
+        и отчет этого автора существуют. """
+        query = {'group': group}
+        if author is not None:
+            query['author'] = author
+        if report_id is not None:
+            query['_id'] = report_id
+
+        return self.db['reports'].find_one(query, {'_id': 1}) is not None
+
+    def get_missing_authors(self, group, authors):
+        """ Авторы из authors, у которых нет отчетов в группе group. """
+        found = {summary['author'] for summary in self.db['author_stats'].find(
+            {'group': group, 'author': {'$in': list(authors)}}, {'_id': 0, 'author': 1})}
+
+        return [author for author in authors if author not in found]
+
+    @cached
     def get_all_faculties(self):
         return sorted(self.db['reports'].distinct('faculty'))
 
+    @cached
     def get_all_courses(self):
         return sorted(self.db['reports'].distinct('course'))
 
+    @cached
     def get_all_departments(self):
         return sorted(self.db['reports'].distinct('department'))
 
-    def get_report_by_id(self, report_id):
-        return self.db['reports'].find_one({'_id': report_id})
+    def get_report_by_id(self, report_id, with_text=False):
+        report = self._decode(self.db['reports'].find_one({'_id': report_id}))
+        if report is not None and with_text:
+            self._attach_texts([report])
+        return report
+
+    def get_report_text(self, report_id):
+        return self.texts.get(report_id)
 
     def get_report_stat_by_id(self, report_id):
-        return self.db['reports'].find_one({'_id': report_id}, 
-        {'text': 0, 'words.unique_words': 0})
+        return self._decode(self.db['reports'].find_one({'_id': report_id},
+        {'text': 0, 'words.unique_words': 0, 'words.word_counts': 0, 'words.vocabulary_sketch': 0,
+         'minhash': 0, 'lsh_bands': 0}))
 
     def get_report_top_words_by_id(self, report_id, num_words):
-        report = self.db['reports'].find_one({'_id': report_id}, 
-        {'words.most_popular_words': 1})
+        report = self._decode(self.db['reports'].find_one({'_id': report_id},
+        {'words.most_popular_words': 1}))
 
         if len(report['words']['most_popular_words']) < num_words:
             return report['words']['most_popular_words']
         else:
-            return report['words']['most_popular_words'][:num_words - 1]
+            return report['words']['most_popular_words'][:num_words]
 
-    def get_reports_by_author(self, author, group):
-        for report in self.db['reports'].find({'author': author, 'group': group}).sort('title'):
-            yield report
+    def _distinctive_terms(self, words, limit):
+        counts = term_counts(words)
+        frequencies = {entry['_id']: entry['df']
+                       for entry in self.db['term_stats'].find({'_id': {'$in': list(counts)}})}
+        terms = top_terms(counts, frequencies, self.db['reports'].estimated_document_count(), limit)
 
-    def get_reports_by_group(self, group):
-        for report in self.db['reports'].find({'group': group}).sort('author'):
-            yield report
-    
-    def get_reports_by_faculty(self, faculty):
-        for report in self.db['reports'].find({'faculty': faculty}):
-            yield report
+        decoded = self.vocabulary.decode([word for word, _ in terms])
+        return [[word, score] for word, (_, score) in zip(decoded, terms)]
 
-    def get_reports_by_course(self, course):
-        for report in self.db['reports'].find({'course': course}):
-            yield report
+    @cached
+    def get_report_distinctive_terms(self, report_id, limit=10):
+        """ [слово, вес TF-IDF] самых характерных для отчета слов по сравнению со всеми отчетами. """
+        report = self.db['reports'].find_one({'_id': report_id}, {'words.unique_words': 1,
+                                                                  'words.word_counts': 1,
+                                                                  'words.most_popular_words': 1})
+        if report is None:
+            raise KeyError(report_id)
+        return self._distinctive_terms(report['words'], limit)
 
-    def get_reports_by_department(self, department):
-        for report in self.db['reports'].find({'department': department}):
-            yield report
+    @cached
+    def get_author_distinctive_terms(self, author, group, limit=10):
+        summary = self.db['author_stats'].find_one({'author': author, 'group': group},
+                                                   {'unique_words': 1, 'word_counts': 1})
+        if summary is None:
+            raise KeyError(author)
+        return self._distinctive_terms(summary, limit)
 
-    def get_stat_of_author(self, author):
-        cur = self.db['reports'].aggregate([
-            {'$match': {'author': author}},
-            {'$group': {
-                '_id': None, 
-                'avg_total_words': {'$avg': '$words.total_words'},
-                'avg_unique_words': {'$avg': '$words.total_unique_words'},
-                'avg_persent_unique_words': {'$avg': '$words.persent_unique_words'},
-                'unique_words': {'$addToSet': '$words.unique_words'},
-                'avg_total_raw_symbols': {'$avg': '$symbols.total_raw_symbols'},
-                'avg_total_clean_symbols': {'$avg': '$symbols.total_clean_symbols'},
-                'total_reports_loaded': {'$sum': 1},
-                }
-            },
-            {'$addFields': {
-                'unique_words': {
-                    '$reduce': {
-                        'input': '$unique_words',
-                        'initialValue': [],
-                        'in': {'$setUnion': ['$$value', '$$this']}
-                    }
-                }
-                }
-            },
-            {'$addFields': {'total_unique_words': {'$size': '$unique_words'}}}
-        ])
-
-        return cur.next()
+    @cached
+    def get_group_distinctive_terms(self, group, limit=10):
+        summary = self.db['group_stats'].find_one({'_id': group}, {'unique_words': 1, 'word_counts': 1})
+        if summary is None:
+            raise KeyError(group)
+        return self._distinctive_terms(summary, limit)
+
+    @staticmethod
+    def _seek_query(query, sort_keys, after):
+        if after is None:
+            return query
+
+        # (k1 > v1) или (k1 = v1 и k2 > v2) или ...
+        seek = [dict(zip(sort_keys[:position], after[:position]), **{key: {'$gt': after[position]}})
+                for position, key in enumerate(sort_keys)]
+        return {'$and': [query, {'$or': seek}]}
+
+    def _list_reports(self, query, sort_keys, fields=None, after=None, limit=None):
+        """ Отчеты по query в порядке sort_keys.
+
+        fields - возвращаемые поля (по умолчанию все), after - значения ключей
+        сортировки последнего отчета предыдущей страницы, limit - размер страницы.
+        Следующая страница начинается условием по ключам, а не пропуском
+        записей, поэтому время ее получения не зависит от номера страницы.
+        """
+        query = self._seek_query(query, sort_keys, after)
+        projection = None
+        if fields:
+            projection = dict.fromkeys(fields, 1)
+            projection.update(dict.fromkeys(sort_keys, 1))
+
+        cursor = self.db['reports'].find(query, projection).sort([(key, pymongo.ASCENDING) for key in sort_keys])
+        if limit:
+            cursor = cursor.limit(limit)
+
+        for report in cursor:
+            yield self._decode(report)
+
+    def get_reports_by_author(self, author, group, fields=None, after=None, limit=None):
+        return self._list_reports({'author': author, 'group': group}, LISTING_SORT['author'], fields, after, limit)
+
+    def get_reports_by_group(self, group, fields=None, after=None, limit=None):
+        return self._list_reports({'group': group}, LISTING_SORT['group'], fields, after, limit)
+
+    def get_reports_by_faculty(self, faculty, fields=None, after=None, limit=None):
+        return self._list_reports({'faculty': faculty}, LISTING_SORT['faculty'], fields, after, limit)
+
+    def get_reports_by_course(self, course, fields=None, after=None, limit=None):
+        return self._list_reports({'course': course}, LISTING_SORT['course'], fields, after, limit)
 
+    def get_reports_by_department(self, department, fields=None, after=None, limit=None):
+        return self._list_reports({'department': department}, LISTING_SORT['department'], fields, after, limit)
+
+    @cached
+    def get_stat_of_author(self, author, exact=False):
+        summaries = list(self.db['author_stats'].find({'author': author}, VOCABULARY_FIELDS))
+        if not summaries:
+            raise KeyError(author)
+
+        if len(summaries) == 1:
+            stat = summaries[0]
+        else:
+            # Автор встречается в нескольких группах: объединяем сводки и словари
+            stat = merge_summaries(summaries)
+            exact = exact or sum(summary['total_unique_words'] for summary in summaries) <= self.EXACT_UNIQUE_WORDS_LIMIT
+            stat['total_unique_words'] = self._count_unique_words(
+                self.db['author_stats'].find({'author': author}, {'unique_words': 1, 'vocabulary_sketch': 1}), exact)
+
+        stat['_id'] = None
+        return stat
+
+    def _count_unique_words(self, vocabularies, exact):
+        """ Размер объединения словарей (документов с unique_words и vocabulary_sketch). """
+        if exact:
+            words = set()
+            for vocabulary in vocabularies:
+                words.update(vocabulary['unique_words'])
+            return len(words)
+
+        sketch = HyperLogLog()
+        for vocabulary in vocabularies:
+            sketch.merge(self._sketch(vocabulary))
+        return sketch.count()
+
+    @cached
+    def get_unique_words_count(self, faculty=None, department=None, course=None, group=None, exact=False):
+        """ Размер общего словаря отчетов, отобранных по непустым условиям.
+
+        По умолчанию объединяются скетчи ячеек куба (ошибка около 2%),
+        exact=True объединяет сами словари.
+        """
+        query = {field: value for field, value in zip(CELL_FIELDS, (faculty, department, course, group)) if value}
+        if exact:
+            return self._count_unique_words((report['words'] for report in self.db['reports'].find(
+                query, {'words.unique_words': 1})), True)
+
+        # Скетчи ячеек куба уже объединяют скетчи их отчетов
+        return self._count_unique_words(self.db['rollup_cube'].find(query, {'vocabulary_sketch': 1}), False)
+
+    @cached
     def get_stat_of_group(self, group):
-        return self.db['reports'].aggregate([
-            {'$match': {'group': group}},
-            {'$group': {
-                '_id': '$author', 
-                'avg_total_words': {'$avg': '$words.total_words'},
-                'avg_unique_words': {'$avg': '$words.total_unique_words'},
-                'avg_persent_unique_words': {'$avg': '$words.persent_unique_words'},
-                'unique_words': {'$addToSet': '$words.unique_words'},
-                'avg_total_raw_symbols': {'$avg': '$symbols.total_raw_symbols'},
-                'avg_total_clean_symbols': {'$avg': '$symbols.total_clean_symbols'},
-                'total_reports_loaded': {'$sum': 1}
-                }
-            },
-            {'$addFields': {
-                'unique_words': {
-                    '$reduce': {
-                        'input': '$unique_words',
-                        'initialValue': [],
-                        'in': {'$setUnion': ['$$value', '$$this']}
-                    }
-                }
-                }
-            },
-            {'$addFields': {'total_unique_words': {'$size': '$unique_words'}}},
-            {'$sort': {'_id': 1, 'total_unique_words': -1}}
-        ])
+        for summary in self.db['author_stats'].find({'group': group}, VOCABULARY_FIELDS).sort('author'):
+            summary['_id'] = summary.pop('author')
+            yield summary
 
+    @cached
     def get_stat_by_groups(self, course=None, faculty=None, department=None):
+        """ Средние по группам отчетов с заданными курсом, факультетом и кафедрой.
+
+        С условиями ответ собирается из ячеек куба rollup_cube, без условий - из group_stats,
+        без чтения отчетов. Группы и числа отчетов совпадают с агрегацией
+        _stat_by_groups_pipeline, средние - с точностью до округления суммы double
+        (tests/test_rollups.py).
+        """
+        if not course and not faculty and not department:
+            return self.db['group_stats'].find({}, {
+                'avg_total_words': 1,
+                'avg_unique_words': 1,
+                'avg_persent_unique_words': 1,
+                'total_reports_loaded': 1
+            }).sort('_id')
+
+        query = {field: value for field, value in zip(CELL_FIELDS, (faculty, department, course)) if value}
+        return group_averages(self.db['rollup_cube'].find(query, {'group': 1, 'count': 1, 'sums': 1}))
+
+    @staticmethod
+    def _stat_by_groups_pipeline(course, faculty, department):
+        """ Агрегация по отчетам, которую заменяют куб и group_stats; по ней их проверяет тест. """
         group = {
             '$group': {
                 '_id': '$group',
@@ -182,12 +912,6 @@ class ReportsDataBase:
 
         sort = {'$sort': {'_id': 1}}
 
-        if not course and not faculty and not department:
-            return self.db['reports'].aggregate([
-                group,
-                sort
-            ])
-
         if course and not faculty and not department:
             match = {'$match': {'course': course}}
         elif faculty and not course and not department:
@@ -208,73 +932,256 @@ class ReportsDataBase:
                 sort['$sort']['department'] = 1
 
             match = {'$match': {'$and': match_list}}
+        else:
+            match = {'$match': {}}
 
-        return self.db['reports'].aggregate([
+        return [
             match,
             group,
             sort
-        ])
+        ]
 
     def get_words_compare(self, authors, group):
-        match_list = []
-        for author in authors:
-            match_list.append({'author': author})
-
-        match = {
-            '$match': {
-                '$and': [
-                        {'group': group},
-                        {'$or': match_list}
-                    ]
-            }
-        }
-
-        query = self.db['reports'].aggregate([
-            match,
-            {'$group': {
-                '_id': '$author', 
-                'unique_words': {'$addToSet': '$words.unique_words'}
-            }},
-            {'$addFields': {
-                'unique_words': {
-                    '$reduce': {
-                        'input': '$unique_words',
-                        'initialValue': [],
-                        'in': {'$setUnion': ['$$value', '$$this']}
-                    }
-                }
-                }
-            },
-            {'$sort': {'_id': 1}}
-        ])
-
-        authors = list(query)
-        compare = {}
-        words_intersections = []
-
-        for author in authors:
-            compare[author['_id']] = dict()
-
-            for other_author in authors:
-                if other_author['_id'] == author['_id']:
-                    compare[author['_id']][author['_id']] = float('nan')
-                else:
-                    author_unique_words = set(author['unique_words'])
-                    other_author_unique_words = set(other_author['unique_words'])
-
-                    author_num_unique_words = len(author_unique_words)
-                    other_author_num_unique_words = len(other_author_unique_words)
-
-                    words_intersection = author_unique_words.intersection(other_author_unique_words)
-
-                    compare[author['_id']][other_author['_id']] = len(words_intersection) \
-                        / min(author_num_unique_words, other_author_num_unique_words) * 100.0
-
-                    words_intersections.append((
-                        author['_id'],
-                        other_author['_id'],
-                        words_intersection
-                    ))
+        summaries = self.db['author_stats'].find({'group': group, 'author': {'$in': list(authors)}},
+                                                 {'author': 1, 'unique_words': 1}).sort('author')
 
         # words_intersections = [ (author_name, other_author_name, ['word1', 'word2', 'word3', ...]), .... ]
-        return compare, words_intersections
\ No newline at end of file
+        # Списки общих слов вычисляются только при обходе words_intersections
+        return compare_vocabularies([(summary['author'], summary['unique_words']) for summary in summaries],
+                                    self.vocabulary.decode)
+
+    @cached
+    def get_similar_reports(self, report_id, threshold=THRESHOLD, limit=20):
+        """ Отчеты всех групп, похожие на report_id: [{_id, title, author, group, course, similarity}].
+
+        Кандидаты - отчеты хотя бы с одной общей LSH-полосой (выборка по индексу
+        lsh_bands), сходство оценивается по MinHash-подписям. Пары со сходством
+        заметно ниже THRESHOLD редко попадают в кандидаты.
+        """
+        report = self.db['reports'].find_one({'_id': report_id}, {'minhash': 1, 'lsh_bands': 1})
+        if report is None:
+            raise KeyError(report_id)
+        if not report.get('lsh_bands'):
+            return []
+
+        similar = []
+        for candidate in self.db['reports'].find({'lsh_bands': {'$in': report['lsh_bands']}, '_id': {'$ne': report_id}},
+                                                 SIMILAR_FIELDS):
+            score = similarity(report['minhash'], candidate.pop('minhash'))
+            if score >= threshold:
+                similar.append(dict(candidate, similarity=score))
+
+        similar.sort(key=lambda candidate: -candidate['similarity'])
+        return similar[:limit]
+
+    def find_near_duplicates(self, threshold=0.8, max_bucket=100):
+        """ Группы почти одинаковых отчетов во всей базе, по убыванию размера.
+
+        Пары-кандидаты берутся из общих LSH-полос, связанные пары со сходством
+        не ниже threshold объединяются в кластеры. Полосы, общие для больше чем
+        max_bucket отчетов (общий шаблон), пропускаются: число пар в них растет
+        квадратично, а настоящие копии почти всегда совпадают и по другим полосам.
+        """
+        buckets = self.db['reports'].aggregate([
+            {'$match': {'lsh_bands.0': {'$exists': True}}},
+            {'$project': {'lsh_bands': 1}},
+            {'$unwind': '$lsh_bands'},
+            {'$group': {'_id': '$lsh_bands', 'ids': {'$push': '$_id'}}},
+            {'$match': {'ids.1': {'$exists': True}, f'ids.{max_bucket}': {'$exists': False}}}
+        ], allowDiskUse=True)
+
+        pairs = set()
+        for bucket in buckets:
+            pairs.update(itertools.combinations(sorted(bucket['ids']), 2))
+
+        reports = dict()
+        ids = sorted({report_id for pair in pairs for report_id in pair})
+        for start in range(0, len(ids), 1000):
+            for report in self.db['reports'].find({'_id': {'$in': ids[start:start + 1000]}}, SIMILAR_FIELDS):
+                reports[report['_id']] = report
+
+        parents = dict()
+
+        def root(report_id):
+            while parents.get(report_id, report_id) != report_id:
+                report_id = parents[report_id]
+            return report_id
+
+        for first, second in pairs:
+            if similarity(reports[first]['minhash'], reports[second]['minhash']) >= threshold:
+                parents[root(second)] = root(first)
+
+        clusters = dict()
+        for report_id in parents:
+            clusters.setdefault(root(report_id), []).append(report_id)
+        for report_id, members in clusters.items():
+            if report_id not in members:
+                members.append(report_id)
+
+        result = []
+        for members in clusters.values():
+            result.append([{field: value for field, value in reports[report_id].items() if field != 'minhash'}
+                           for report_id in sorted(members)])
+        result.sort(key=lambda members: -len(members))
+        return result
+
+    def backfill_minhash(self, batch_size=500):
+        """ Вычисляет MinHash-подписи отчетов, сохраненных до их появления. Возвращает число отчетов. """
+        cursor = self.db['reports'].find({'minhash': {'$exists': False}}, {'text.raw_text': 1},
+                                         batch_size=batch_size)
+        updated = 0
+
+        while True:
+            reports = list(itertools.islice(cursor, batch_size))
+            if not reports:
+                break
+
+            texts = self.texts.get_many(report['_id'] for report in reports)
+            requests = []
+            for report in reports:
+                raw_text = texts.get(report['_id'], report.get('text', {}).get('raw_text'))
+                if raw_text is None:
+                    continue
+                minhash = signature(raw_text)
+                requests.append(pymongo.UpdateOne({'_id': report['_id']},
+                                                  {'$set': {'minhash': minhash, 'lsh_bands': lsh_bands(minhash)}}))
+
+            if requests:
+                self.db['reports'].bulk_write(requests, ordered=False)
+            updated += len(requests)
+
+        if updated:
+            self._bump_version()
+        return updated
+
+    def migrate_vocabulary(self, batch_size=500):
+        """ Переводит слова отчетов, сохраненных до появления общего словаря, в номера.
+
+        Возвращает число преобразованных отчетов; сводки пересчитываются.
+        """
+        not_encoded = {'$or': [{'words.unique_words.0': {'$type': 'string'}},
+                               {'words.most_popular_words.0.0': {'$type': 'string'}}]}
+        cursor = self.db['reports'].find(not_encoded, {'words.unique_words': 1, 'words.most_popular_words': 1,
+                                                       'words.word_counts': 1},
+                                         batch_size=batch_size)
+        converted = 0
+
+        while True:
+            reports = list(itertools.islice(cursor, batch_size))
+            if not reports:
+                break
+
+            requests = []
+            for report in reports:
+                words = self.vocabulary.encode_words(report['words'])
+                requests.append(pymongo.UpdateOne({'_id': report['_id']}, {'$set': {
+                    f'words.{field}': value for field, value in words.items()
+                }}))
+
+            self.db['reports'].bulk_write(requests, ordered=False)
+            converted += len(requests)
+
+        self.rebuild_summaries()
+        self.rebuild_term_stats()
+        return converted
+
+    def migrate_texts(self, batch_size=500):
+        """ Переносит text.raw_text отчетов, сохраненных до появления TextStore, в report_texts.
+
+        Возвращает число перенесенных текстов.
+        """
+        cursor = self.db['reports'].find({'text.raw_text': {'$exists': True}}, {'text.raw_text': 1},
+                                         batch_size=batch_size)
+        moved = 0
+
+        while True:
+            reports = list(itertools.islice(cursor, batch_size))
+            if not reports:
+                break
+
+            self.texts.put_many((report['_id'], report['text']['raw_text']) for report in reports)
+            self.db['reports'].bulk_write([pymongo.UpdateOne({'_id': report['_id']}, {'$unset': {'text.raw_text': ''}})
+                                           for report in reports], ordered=False)
+            moved += len(reports)
+
+        return moved
+
+    def get_reanalysis_checkpoint(self, config):
+        """ Сохраненный ход повторной обработки для настроек config или None. """
+        return self.db['counters'].find_one({'_id': 'reanalysis', 'config': config})
+
+    def save_reanalysis_checkpoint(self, config, **progress):
+        self.db['counters'].update_one({'_id': 'reanalysis'},
+                                       {'$set': dict(progress, config=config),
+                                        '$currentDate': {'modified': True}},
+                                       upsert=True)
+
+    def clear_reanalysis_checkpoint(self):
+        self.db['counters'].delete_one({'_id': 'reanalysis'})
+
+    def save_job(self, job):
+        """ Сохраняет статус фоновой задачи; записи удаляются TTL-индексом по полю modified. """
+        self.db['jobs'].update_one({'_id': job['id']},
+                                   {'$set': job, '$currentDate': {'modified': True}},
+                                   upsert=True)
+
+    def get_job(self, job_id):
+        return self.db['jobs'].find_one({'_id': job_id}, {'_id': False, 'modified': False})
+
+    @staticmethod
+    def _stale_query(config, after=None):
+        query = {'analysis_config': {'$ne': config}}
+        if after is not None:
+            query['_id'] = {'$gt': after}
+        return query
+
+    def count_stale_reports(self, config, after=None):
+        return self.db['reports'].count_documents(self._stale_query(config, after))
+
+    def get_stale_reports(self, config, after=None, limit=100):
+        """ До limit отчетов, обработанных не с настройками config, по возрастанию _id после after.
+
+        Возвращает [(номер, автор, группа, текст)]; текст None, если он не сохранен.
+        """
+        reports = list(self.db['reports'].find(self._stale_query(config, after),
+                                               {'author': 1, 'group': 1, 'text.raw_text': 1})
+                       .sort('_id', pymongo.ASCENDING).limit(limit))
+        texts = self.texts.get_many(report['_id'] for report in reports)
+
+        # У отчетов, сохраненных до migrate_texts, текст еще в самом документе
+        return [(report['_id'], report['author'], report['group'],
+                 texts.get(report['_id'], report.get('text', {}).get('raw_text')))
+                for report in reports]
+
+    def save_reanalysis(self, results, config):
+        """ Записывает результаты повторной обработки [(номер, {'text', 'words', 'symbols'})].
+
+        Тексты не меняются; частоты слов и сводки затронутых авторов пересчитываются.
+        """
+        results = [(report_id, self._encode(analysis)) for report_id, analysis in results]
+        if not results:
+            return 0
+
+        report_ids = [report_id for report_id, _ in results]
+        old_reports = list(self.db['reports'].find({'_id': {'$in': report_ids}}, SUMMARY_PROJECTION))
+
+        requests = []
+        for report_id, analysis in results:
+            update = {f'text.{field}': value for field, value in analysis['text'].items() if field != 'raw_text'}
+            update.update(words=analysis['words'], symbols=analysis['symbols'], analysis_config=config)
+            requests.append(pymongo.UpdateOne({'_id': report_id}, {'$set': update}))
+        self.db['reports'].bulk_write(requests, ordered=False)
+
+        self._update_document_frequencies([report['words']['unique_words'] for report in old_reports],
+                                          [analysis['words']['unique_words'] for _, analysis in results])
+        self._after_write(old_reports, self.db['reports'].find({'_id': {'$in': report_ids}}, SUMMARY_PROJECTION))
+
+        return len(requests)
+
+    def collection_sizes(self, names=('reports', 'author_stats', 'vocabulary', 'report_texts')):
+        """ {коллекция: (размер данных, размер на диске)} в байтах по collStats. """
+        sizes = dict()
+        for name in names:
+            stats = self.db.command('collStats', name)
+            sizes[name] = (stats.get('size', 0), stats.get('storageSize', 0))
+        return sizes
@@ -0,0 +1,90 @@
+import math
+from collections import OrderedDict
+
+from database.hll import HyperLogLog
+from database.summaries import STAT_FIELDS, STAT_PROJECTION
+
+# Измерения куба: ячейка - отчеты одной группы с одинаковыми факультетом, кафедрой и курсом
+CELL_FIELDS = ('faculty', 'department', 'course', 'group')
+
+CELL_PROJECTION = dict(STAT_PROJECTION, **{field: 1 for field in CELL_FIELDS})
+CELL_PROJECTION['words.vocabulary_sketch'] = 1
+
+# Средние get_stat_by_groups: поле ответа -> поле STAT_FIELDS
+GROUP_AVERAGES = (
+    ('avg_total_words', 'total_words'),
+    ('avg_unique_words', 'unique_words'),
+    ('avg_persent_unique_words', 'persent_unique_words'),
+)
+
+
+def exact_sum(values):
+    """ Сумма в виде пары [округленная сумма, остаток].
+
+    Суммы ячеек складываются math.fsum по обеим частям, поэтому сумма
+    по нескольким ячейкам совпадает с fsum по всем их отчетам.
+    """
+    values = list(values)
+    total = math.fsum(values)
+    return [total, math.fsum(values + [-total])]
+
+
+def build_cells(reports):
+    """ Ячейки куба по отчетам (с полями CELL_PROJECTION): количество, суммы и скетч словаря. """
+    buckets = OrderedDict()
+    for report in reports:
+        buckets.setdefault(tuple(report[field] for field in CELL_FIELDS), []).append(report)
+
+    cells = []
+    for key, items in buckets.items():
+        cell = dict(zip(CELL_FIELDS, key))
+        cell['_id'] = dict(zip(CELL_FIELDS, key))
+        cell['count'] = len(items)
+        cell['sums'] = {}
+        for name, (section, field) in STAT_FIELDS.items():
+            cell['sums'][name] = exact_sum(report[section][field] for report in items)
+
+        sketch = HyperLogLog()
+        for report in items:
+            sketch.merge(HyperLogLog.from_bytes(report['words']['vocabulary_sketch']))
+        cell['vocabulary_sketch'] = sketch.to_bytes()
+
+        cells.append(cell)
+
+    return cells
+
+
+def merge_cell(cell, delta):
+    """ Изменение ячейки cell (None - ячейки еще нет) на SummaryDelta: ($inc, новые значения полей).
+
+    Суммы остаются точными парами exact_sum и после вычитания удаленных отчетов.
+    """
+    cell = cell or {}
+    sums = cell.get('sums', {})
+    values = {
+        'count': cell.get('count', 0) + delta.count,
+        'sums': {name: exact_sum(sums.get(name, []) + delta.values[name]) for name in STAT_FIELDS},
+        'vocabulary_sketch': delta.merged_sketch(cell),
+    }
+    return {'count': delta.count}, values
+
+
+def group_averages(cells):
+    """ Ответ get_stat_by_groups по ячейкам: средние по группам в порядке номера группы. """
+    groups = dict()
+    for cell in cells:
+        group = groups.setdefault(cell['group'], {'count': 0, 'sums': {name: [] for _, name in GROUP_AVERAGES}})
+        group['count'] += cell['count']
+        for _, name in GROUP_AVERAGES:
+            group['sums'][name].extend(cell['sums'][name])
+
+    result = []
+    for number in sorted(groups):
+        group = groups[number]
+        row = {'_id': number}
+        for average, name in GROUP_AVERAGES:
+            row[average] = math.fsum(group['sums'][name]) / group['count']
+        row['total_reports_loaded'] = group['count']
+        result.append(row)
+
+    return result
@@ -0,0 +1,138 @@
+import math
+from collections import Counter
+
+from database.hll import HyperLogLog
+
+# Поле сводки -> путь к значению в документе отчета
+STAT_FIELDS = {
+    'total_words': ('words', 'total_words'),
+    'unique_words': ('words', 'total_unique_words'),
+    'persent_unique_words': ('words', 'persent_unique_words'),
+    'total_raw_symbols': ('symbols', 'total_raw_symbols'),
+    'total_clean_symbols': ('symbols', 'total_clean_symbols'),
+}
+
+STAT_PROJECTION = {'.'.join(path): 1 for path in STAT_FIELDS.values()}
+
+
+def _value(report, path):
+    value = report
+    for key in path:
+        value = value[key]
+    return value
+
+
+def term_counts(words):
+    """ {слово: число вхождений} раздела words отчета или сводки.
+
+    У отчетов, сохраненных без word_counts, известны только числа самых
+    частых слов; остальные слова считаются встретившимися один раз.
+    """
+    if 'word_counts' in words:
+        return dict(zip(words['unique_words'], words['word_counts']))
+
+    counts = dict.fromkeys(words.get('unique_words', ()), 1)
+    counts.update((word, count) for word, count in words.get('most_popular_words', ()))
+    return counts
+
+
+def summarize(reports, with_vocabulary=False):
+    """ Суммы и средние по отчетам так же, как $group с $avg в агрегациях.
+
+    Суммы считаются math.fsum, чтобы средние совпадали с $avg MongoDB.
+    with_vocabulary добавляет объединенный словарь unique_words, суммарные
+    числа вхождений слов word_counts и объединенный скетч vocabulary_sketch.
+    """
+    values = {name: [] for name in STAT_FIELDS}
+    vocabulary = Counter()
+    sketch = HyperLogLog()
+    total = 0
+
+    for report in reports:
+        total += 1
+        for name, path in STAT_FIELDS.items():
+            values[name].append(_value(report, path))
+        if with_vocabulary:
+            vocabulary.update(term_counts(report['words']))
+            sketch.merge(HyperLogLog.from_bytes(report['words']['vocabulary_sketch']))
+
+    summary = {'total_reports_loaded': total}
+    for name, items in values.items():
+        summary[f'sum_{name}'] = math.fsum(items)
+        summary[f'avg_{name}'] = summary[f'sum_{name}'] / total if total else None
+
+    if with_vocabulary:
+        summary['unique_words'] = list(vocabulary)
+        summary['word_counts'] = list(vocabulary.values())
+        summary['vocabulary_sketch'] = sketch.to_bytes()
+        summary['total_unique_words'] = len(vocabulary)
+
+    return summary
+
+
+def merge_summaries(summaries):
+    """ Объединяет несколько сводок (например, одного автора в разных группах). """
+    total = sum(summary['total_reports_loaded'] for summary in summaries)
+    merged = {'total_reports_loaded': total}
+
+    for name in STAT_FIELDS:
+        merged[f'sum_{name}'] = math.fsum(summary[f'sum_{name}'] for summary in summaries)
+        merged[f'avg_{name}'] = merged[f'sum_{name}'] / total if total else None
+
+    return merged
+
+
+class SummaryDelta:
+    """ Изменение сводки (автора, группы или ячейки куба) от удаленных и добавленных отчетов.
+
+    Отчеты - документы с полями STAT_PROJECTION и разделом words (unique_words,
+    word_counts, vocabulary_sketch). Удаленные отчеты входят со знаком минус;
+    из скетча их слова убрать нельзя, поэтому после удаления removed=True
+    и скетч сводки строится заново.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.values = {name: [] for name in STAT_FIELDS}
+        self.words = Counter()
+        self.sketch = HyperLogLog()
+        self.removed = False
+
+    def add(self, report, sign=1):
+        self.count += sign
+        for name, path in STAT_FIELDS.items():
+            self.values[name].append(sign * _value(report, path))
+        self.words.update({word: sign * count for word, count in term_counts(report['words']).items()})
+        if sign > 0:
+            self.sketch.merge(HyperLogLog.from_bytes(report['words']['vocabulary_sketch']))
+        else:
+            self.removed = True
+
+    def merge(self, summary):
+        """ Изменение сводки summary (None - сводки еще нет): ($inc, новые значения полей).
+
+        Количество и суммы изменяются $inc, средние вычисляются так же, как их
+        пересчитает MongoDB, а словарь складывается с изменениями чисел вхождений.
+        """
+        summary = summary or {}
+        total = summary.get('total_reports_loaded', 0) + self.count
+        inc = {'total_reports_loaded': self.count}
+        values = {'total_reports_loaded': total}
+
+        for name in STAT_FIELDS:
+            inc[f'sum_{name}'] = math.fsum(self.values[name])
+            values[f'sum_{name}'] = summary.get(f'sum_{name}', 0) + inc[f'sum_{name}']
+            values[f'avg_{name}'] = values[f'sum_{name}'] / total if total > 0 else None
+
+        counts = Counter(term_counts(summary)) if 'unique_words' in summary else Counter()
+        counts.update(self.words)
+        values['unique_words'] = sorted(word for word, count in counts.items() if count > 0)
+        values['word_counts'] = [counts[word] for word in values['unique_words']]
+        values['total_unique_words'] = len(values['unique_words'])
+        values['vocabulary_sketch'] = self.merged_sketch(summary)
+
+        return inc, values
+
+    def merged_sketch(self, summary):
+        sketch = HyperLogLog.from_bytes(summary['vocabulary_sketch']) if 'vocabulary_sketch' in summary else HyperLogLog()
+        return sketch.merge(self.sketch).to_bytes()
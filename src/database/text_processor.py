@@ -1,59 +1,262 @@
+import hashlib
+import json
+import queue
 import re
 import string
-from collections import Counter
+import threading
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
 
 import pymorphy2
-from nltk.corpus import stopwords
-from nltk.tokenize import word_tokenize
+
+from database.hll import HyperLogLog
+from database.tokenizer import FastTokenizer
+
+class LemmaCache:
+    """ Ограниченный LRU-кэш нормальных форм слов, общий для процесса. """
+
+    def __init__(self, max_size=100000):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._lemmas = OrderedDict()
+        self._lock = threading.Lock()
+
+    def lemmatize(self, words, morph):
+        """ Возвращает словарь {слово: нормальная форма} для набора различных слов. """
+        lemmas = dict()
+        missing = []
+
+        with self._lock:
+            for word in words:
+                lemma = self._lemmas.get(word)
+                if lemma is None:
+                    missing.append(word)
+                else:
+                    self._lemmas.move_to_end(word)
+                    lemmas[word] = lemma
+
+            self.hits += len(lemmas)
+            self.misses += len(missing)
+
+        # Разбор pymorphy2 выполняется вне блокировки
+        parsed = {word: morph.parse(word)[0].normal_form for word in missing}
+        lemmas.update(parsed)
+
+        with self._lock:
+            self._lemmas.update(parsed)
+            while len(self._lemmas) > self.max_size:
+                self._lemmas.popitem(last=False)
+
+        return lemmas
+
+    def stats(self):
+        with self._lock:
+            requests = self.hits + self.misses
+            return {
+                'size': len(self._lemmas),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / requests if requests else 0.0
+            }
+
+    def clear(self):
+        with self._lock:
+            self._lemmas.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+lemma_cache = LemmaCache()
+
+# Увеличивается при изменении алгоритма обработки, чтобы старые результаты не переиспользовались
+ANALYSIS_VERSION = 3
+
+
+def processor_config(extra_stop_words=[], num_top_words=25, tokenizer='fast'):
+    """ Ключ настроек TextProcessor: одинаковые ключи дают одинаковый результат обработки. """
+    config = [ANALYSIS_VERSION, tokenizer, num_top_words, sorted(set(extra_stop_words))]
+    return hashlib.sha1(json.dumps(config, ensure_ascii=False).encode('utf-8')).hexdigest()
+
 
 class TextProcessor:
-    def __init__(self, extra_stop_words=[], num_top_words=25):
+    TOKENIZERS = ('fast', 'nltk')
+
+    def __init__(self, extra_stop_words=[], num_top_words=25, tokenizer='fast', morph=None):
+        if tokenizer not in self.TOKENIZERS:
+            raise ValueError(f'Unknown tokenizer {tokenizer!r}, expected one of {self.TOKENIZERS}')
+
         self.punctuation_re = re.compile(f'[{re.escape(string.punctuation)}]')
         self.digits_re = re.compile(r'\d+')
         self.no_words_re = re.compile(r'\W+')
-        self.stop_words = stopwords.words('russian') + extra_stop_words
-        self.morph = pymorphy2.MorphAnalyzer()
+        # nltk импортируется долго и нужен только при создании обработчика
+        from nltk.corpus import stopwords
+
+        self.stop_words = frozenset(stopwords.words('russian') + extra_stop_words)
+        self.tokenizer = tokenizer
+        self.fast_tokenizer = FastTokenizer(self.stop_words)
+        self.morph = morph if morph is not None else pymorphy2.MorphAnalyzer()
         self.num_top_words = num_top_words
+        self.lemma_cache = lemma_cache
+        self.config = processor_config(extra_stop_words, num_top_words, tokenizer)
 
-        self.processed_text = dict()
-        self.processed_text['symbols'] = dict()
-        self.processed_text['text'] = dict()
-        self.processed_text['words'] = dict()
-        
-    def _clean_raw_text(self, raw_text):
-        self.processed_text['text']['raw_text'] = raw_text
-        self.processed_text['symbols']['total_raw_symbols'] = len(raw_text)
+    def _clean_raw_text(self, raw_text, processed_text):
+        processed_text['text']['raw_text'] = raw_text
+        processed_text['symbols']['total_raw_symbols'] = len(raw_text)
 
         clean_text = raw_text.lower()
         clean_text = self.punctuation_re.sub('', clean_text)
         clean_text = self.digits_re.sub('', clean_text)
         clean_text = self.no_words_re.sub(' ', clean_text)
 
-        self.processed_text['text']['clean_text'] = clean_text
-        self.processed_text['symbols']['total_clean_symbols'] = len(clean_text)
+        processed_text['text']['clean_text'] = clean_text
+        processed_text['symbols']['total_clean_symbols'] = len(clean_text)
+
+    def _fast_clean_and_tokenize(self, raw_text, processed_text):
+        processed_text['text']['raw_text'] = raw_text
+        processed_text['symbols']['total_raw_symbols'] = len(raw_text)
+
+        clean_words, total_clean_symbols = self.fast_tokenizer.tokenize(raw_text)
+        processed_text['symbols']['total_clean_symbols'] = total_clean_symbols
+
+        self._count_words(clean_words, processed_text)
+
+    def _tokenize(self, text, processed_text):
+        from nltk.tokenize import word_tokenize
 
-    def _tokenize(self, text):
         raw_words = word_tokenize(text)
         clean_words = [word for word in raw_words if word not in self.stop_words]
-        normal_words = [self.morph.parse(word)[0].normal_form for word in clean_words]
+        self._count_words(clean_words, processed_text)
 
-        self.processed_text['words']['words'] = normal_words
-        self.processed_text['words']['total_words'] = len(normal_words)
+    def _count_words(self, clean_words, processed_text):
+        surface_counter = Counter(clean_words)
+        lemmas = self._word_statistics(surface_counter, processed_text)
+        processed_text['words']['words'] = [lemmas[word] for word in clean_words]
+
+    def _word_statistics(self, surface_counter, processed_text):
+        # Каждая словоформа лемматизируется один раз, порядок первых вхождений сохраняется
+        lemmas = self.lemma_cache.lemmatize(surface_counter, self.morph)
+
+        words_counter = Counter()
+        for word, count in surface_counter.items():
+            words_counter[lemmas[word]] += count
+
+        processed_text['words']['total_words'] = sum(surface_counter.values())
 
-        words_counter = Counter(normal_words)
         words = list(words_counter)
 
-        self.processed_text['words']['total_unique_words'] = len(words)
-        self.processed_text['words']['unique_words'] = words
-        self.processed_text['words']['most_popular_words'] = words_counter.most_common(self.num_top_words)
-        self.processed_text['words']['persent_unique_words'] = self.processed_text['words']['total_unique_words'] / self.processed_text['words']['total_words'] * 100.0
+        processed_text['words']['total_unique_words'] = len(words)
+        processed_text['words']['unique_words'] = words
+        processed_text['words']['word_counts'] = [words_counter[word] for word in words]
+        processed_text['words']['vocabulary_sketch'] = HyperLogLog.from_words(words).to_bytes()
+        processed_text['words']['most_popular_words'] = words_counter.most_common(self.num_top_words)
+        processed_text['words']['persent_unique_words'] = processed_text['words']['total_unique_words'] / processed_text['words']['total_words'] * 100.0
+
+        return lemmas
 
     def process(self, raw_text):
-        self.processed_text['text'].clear()
-        self.processed_text['words'].clear()
-        self.processed_text['symbols'].clear()
+        """ Возвращает новый словарь результатов, не разделяемый с другими вызовами. """
+        processed_text = {'symbols': dict(), 'text': dict(), 'words': dict()}
+
+        if self.tokenizer == 'fast':
+            self._fast_clean_and_tokenize(raw_text, processed_text)
+        else:
+            self._clean_raw_text(raw_text, processed_text)
+            self._tokenize(processed_text['text']['clean_text'], processed_text)
+
+        return processed_text
+
+    def process_chunks(self, chunks):
+        """ Потоковая обработка текста, заданного фрагментами (абзацами), соединяемыми пробелом.
+
+        Результат совпадает с process(' '.join(chunks)), но без списка всех слов words['words'].
+        Потоково работает только быстрый токенизатор; с tokenizer='nltk' текст соединяется целиком.
+        """
+        if self.tokenizer != 'fast':
+            processed_text = self.process(' '.join(chunks))
+            del processed_text['words']['words']
+            return processed_text
+
+        processed_text = {'symbols': dict(), 'text': dict(), 'words': dict()}
+        raw_chunks = []
+        surface_counter = Counter()
+
+        def remember(chunks):
+            for chunk in chunks:
+                raw_chunks.append(chunk)
+                yield chunk
+
+        total_clean_symbols = self.fast_tokenizer.tokenize_chunks(remember(chunks), surface_counter.update)
+
+        raw_text = ' '.join(raw_chunks)
+        processed_text['text']['raw_text'] = raw_text
+        processed_text['symbols']['total_raw_symbols'] = len(raw_text)
+        processed_text['symbols']['total_clean_symbols'] = total_clean_symbols
 
-        self._clean_raw_text(raw_text)
-        self._tokenize(self.processed_text['text']['clean_text'])
+        self._word_statistics(surface_counter, processed_text)
+
+        return processed_text
+
+
+class TextProcessorPool:
+    """ Пул экземпляров TextProcessor для обработки отчетов в нескольких потоках.
+
+    Экземпляры создаются по мере необходимости (не больше size) и разделяют
+    один словарь pymorphy2. Пул можно передавать в Report вместо TextProcessor.
+    """
+
+    def __init__(self, size=4, **processor_kwargs):
+        self.size = size
+        self.processor_kwargs = processor_kwargs
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+        self._morph = None
+        self.config = processor_config(**processor_kwargs)
+
+    def _create(self):
+        with self._lock:
+            if self._created >= self.size:
+                return None
+            # Место в пуле занимается до создания, чтобы не превысить size из других потоков
+            self._created += 1
+
+        try:
+            with self._lock:
+                if self._morph is None:
+                    self._morph = pymorphy2.MorphAnalyzer()
+            return TextProcessor(morph=self._morph, **self.processor_kwargs)
+        except BaseException:
+            # Иначе место останется занятым и processor() будет вечно ждать свободный экземпляр
+            with self._lock:
+                self._created -= 1
+            raise
+
+    @contextmanager
+    def processor(self):
+        try:
+            text_processor = self._idle.get_nowait()
+        except queue.Empty:
+            text_processor = self._create() or self._idle.get()
+
+        try:
+            yield text_processor
+        finally:
+            self._idle.put(text_processor)
+
+    def warm_up(self, count=1):
+        """ Создает заранее до count экземпляров: загружает словари pymorphy2 и стоп-слова. """
+        while self._created < count:
+            text_processor = self._create()
+            if text_processor is None:
+                break
+            self._idle.put(text_processor)
+
+    def process(self, raw_text):
+        with self.processor() as text_processor:
+            return text_processor.process(raw_text)
 
-        return self.processed_text
\ No newline at end of file
+    def process_chunks(self, chunks):
+        with self.processor() as text_processor:
+            return text_processor.process_chunks(chunks)
@@ -0,0 +1,43 @@
+import zlib
+
+import pymongo
+
+
+class TextStore:
+    """ Полные тексты отчетов, сжатые zlib, в отдельной коллекции report_texts.
+
+    Документы reports не содержат text.raw_text, поэтому выборки статистики
+    не читают тексты; текст загружается только по явному запросу.
+    """
+
+    def __init__(self, db, level=6):
+        self.collection = db['report_texts']
+        self.level = level
+
+    def _compress(self, raw_text):
+        return zlib.compress(raw_text.encode('utf-8'), self.level)
+
+    @staticmethod
+    def _decompress(entry):
+        return zlib.decompress(entry['raw_text']).decode('utf-8')
+
+    def put_many(self, texts):
+        """ texts - пары (номер отчета, текст). """
+        requests = [pymongo.ReplaceOne({'_id': report_id},
+                                       {'raw_text': self._compress(raw_text), 'length': len(raw_text)},
+                                       upsert=True)
+                    for report_id, raw_text in texts]
+        if requests:
+            self.collection.bulk_write(requests, ordered=False)
+
+    def get(self, report_id):
+        entry = self.collection.find_one({'_id': report_id})
+        return self._decompress(entry) if entry is not None else None
+
+    def get_many(self, report_ids):
+        """ Словарь {номер отчета: текст} для отчетов, у которых есть текст. """
+        return {entry['_id']: self._decompress(entry)
+                for entry in self.collection.find({'_id': {'$in': list(report_ids)}})}
+
+    def drop(self):
+        self.collection.drop()
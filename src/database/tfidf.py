@@ -0,0 +1,23 @@
+import heapq
+import math
+
+
+def idf(total_documents, document_frequency):
+    """ Сглаженная обратная частота документа, как smooth_idf в scikit-learn. """
+    return math.log((1 + total_documents) / (1 + document_frequency)) + 1
+
+
+def top_terms(counts, document_frequencies, total_documents, limit):
+    """ limit слов с наибольшим TF-IDF: [(слово, вес)] по убыванию веса.
+
+    counts - {слово: число вхождений} отчета, автора или группы,
+    document_frequencies - {слово: число отчетов со словом}.
+    """
+    total = sum(counts.values())
+    if not total:
+        return []
+
+    scores = ((count / total * idf(total_documents, document_frequencies.get(word, 0)), word)
+              for word, count in counts.items())
+
+    return [(word, score) for score, word in heapq.nlargest(limit, scores)]
@@ -0,0 +1,82 @@
+import re
+import string
+
+
+class FastTokenizer:
+    """ Очистка текста, разбиение на слова и фильтрация стоп-слов за один проход.
+
+    Дает те же слова и то же число очищенных символов, что и цепочка
+    регулярных выражений TextProcessor._clean_raw_text + nltk word_tokenize.
+    """
+
+    # Разбиения слитных форм, которые выполняет nltk word_tokenize
+    CONTRACTIONS = {
+        'cannot': ('can', 'not'),
+        'gimme': ('gim', 'me'),
+        'gonna': ('gon', 'na'),
+        'gotta': ('got', 'ta'),
+        'lemme': ('lem', 'me'),
+        'wanna': ('wan', 'na'),
+    }
+
+    def __init__(self, stop_words):
+        self.stop_words = frozenset(stop_words)
+        # Фрагмент - последовательность символов, которые не заменяются пробелом
+        self.piece_re = re.compile(f'[\\w{re.escape(string.punctuation)}]+')
+        self.letters_re = re.compile(r'[^\W\d_]+')
+
+    def tokenize(self, raw_text):
+        """ Возвращает (слова без стоп-слов, длина очищенного текста). """
+        words = []
+        total_symbols = self.tokenize_chunks([raw_text], words.extend)
+        return words, total_symbols
+
+    def tokenize_chunks(self, chunks, consume):
+        """ Разбирает тексты chunks так, как если бы они были соединены пробелом.
+
+        Слова каждого фрагмента передаются списком в consume, весь список слов
+        не накапливается. Возвращает длину очищенного текста.
+        """
+        total_symbols = 0
+        offset = 0
+        first_start = last_end = None
+        has_gap = False
+
+        for index, chunk in enumerate(chunks):
+            if index:
+                offset += 1
+
+            text = chunk.lower()
+            words = []
+
+            for match in self.piece_re.finditer(text):
+                parts = self.letters_re.findall(match.group())
+                if not parts:
+                    continue
+
+                word = parts[0] if len(parts) == 1 else ''.join(parts)
+                total_symbols += len(word) + 1
+
+                if first_start is None:
+                    first_start = offset + match.start()
+                last_end = offset + match.end()
+
+                if word in self.CONTRACTIONS:
+                    words.extend(w for w in self.CONTRACTIONS[word] if w not in self.stop_words)
+                elif word not in self.stop_words:
+                    words.append(word)
+
+            if words:
+                consume(words)
+
+            # Пока слов нет, запоминаем, остался ли в тексте хотя бы один пробел
+            if first_start is None and not has_gap:
+                has_gap = index > 0 or bool(text) and not self.piece_re.fullmatch(text)
+
+            offset += len(text)
+
+        # Пробелы между словами уже учтены, добавляем пробелы по краям текста
+        if first_start is None:
+            return 1 if has_gap else 0
+
+        return total_symbols - 1 + (first_start > 0) + (last_end < offset)
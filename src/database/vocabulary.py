@@ -0,0 +1,119 @@
+import threading
+from collections import Counter
+
+import pymongo
+from pymongo.errors import BulkWriteError
+
+DUPLICATE_KEY = 11000
+
+
+class Vocabulary:
+    """ Общий словарь лемм: каждому слову присваивается постоянный целый номер.
+
+    Отчеты и сводки хранят отсортированные списки номеров вместо строк.
+    Номера выдаются счетчиком из коллекции counters, поэтому несколько
+    процессов могут добавлять слова одновременно. Известные пары слово-номер
+    кэшируются в процессе: они никогда не меняются.
+    """
+
+    def __init__(self, db):
+        self.collection = db['vocabulary']
+        self.counters = db['counters']
+        self._ids = dict()
+        self._words = dict()
+        self._lock = threading.Lock()
+
+    def _remember(self, entries):
+        with self._lock:
+            for entry in entries:
+                self._ids[entry['word']] = entry['_id']
+                self._words[entry['_id']] = entry['word']
+
+    def _load(self, query):
+        self._remember(self.collection.find(query))
+
+    def ids(self, words):
+        """ Словарь {слово: номер}; новым словам номера присваиваются. """
+        words = set(words)
+        missing = [word for word in words if word not in self._ids]
+        if missing:
+            self._load({'word': {'$in': missing}})
+            missing = [word for word in missing if word not in self._ids]
+
+        if missing:
+            counter = self.counters.find_one_and_update({'_id': 'vocabulary'},
+                                                        {'$inc': {'seq': len(missing)}},
+                                                        upsert=True,
+                                                        return_document=pymongo.ReturnDocument.AFTER)
+            first = counter['seq'] - len(missing)
+            try:
+                self.collection.insert_many([{'_id': first + number, 'word': word}
+                                             for number, word in enumerate(missing)], ordered=False)
+            except BulkWriteError as ex:
+                # Часть слов одновременно добавил другой процесс (нарушение уникального
+                # индекса по word): их номера берутся из базы. Другие ошибки не скрываются.
+                if any(error.get('code') != DUPLICATE_KEY for error in ex.details.get('writeErrors', [])):
+                    raise
+            self._load({'word': {'$in': missing}})
+
+            lost = [word for word in missing if word not in self._ids]
+            if lost:
+                raise RuntimeError(f'Vocabulary ids were not allocated for {len(lost)} words')
+
+        return {word: self._ids[word] for word in words}
+
+    def words(self, ids):
+        """ Словарь {номер: слово} для известных номеров. """
+        ids = set(ids)
+        missing = [id_ for id_ in ids if id_ not in self._words]
+        if missing:
+            self._load({'_id': {'$in': missing}})
+
+        return {id_: self._words[id_] for id_ in ids if id_ in self._words}
+
+    def encode(self, words):
+        """ Отсортированный список номеров слов. Уже закодированные номера сохраняются. """
+        words = set(words)
+        strings = [word for word in words if isinstance(word, str)]
+        ids = {word for word in words if not isinstance(word, str)}
+        ids.update(self.ids(strings).values())
+        return sorted(ids)
+
+    def decode(self, ids):
+        """ Слова по номерам в порядке ids. Строки (незакодированные данные) возвращаются как есть. """
+        words = self.words(id_ for id_ in ids if not isinstance(id_, str))
+        return [id_ if isinstance(id_, str) else words[id_] for id_ in ids]
+
+    def encode_words(self, words):
+        """ Кодирует поля unique_words и most_popular_words раздела words отчета.
+
+        Числа вхождений word_counts переупорядочиваются вместе с unique_words.
+        """
+        words = dict(words)
+        if 'unique_words' in words and 'word_counts' in words:
+            unique_words = words['unique_words']
+            ids = self.ids(word for word in unique_words if isinstance(word, str))
+            counts = Counter()
+            for word, count in zip(unique_words, words['word_counts']):
+                counts[ids.get(word, word)] += count
+            words['unique_words'] = sorted(counts)
+            words['word_counts'] = [counts[id_] for id_ in words['unique_words']]
+        elif 'unique_words' in words:
+            words['unique_words'] = self.encode(words['unique_words'])
+        if 'most_popular_words' in words:
+            popular = words['most_popular_words']
+            ids = self.ids(word for word, _ in popular if isinstance(word, str))
+            words['most_popular_words'] = [[ids.get(word, word), count] for word, count in popular]
+
+        return words
+
+    def decode_words(self, words):
+        """ Обратное encode_words преобразование, на месте. """
+        if 'unique_words' in words:
+            words['unique_words'] = self.decode(words['unique_words'])
+        if 'most_popular_words' in words:
+            popular = words['most_popular_words']
+            decoded = self.decode([word for word, _ in popular])
+            words['most_popular_words'] = [[word, count] for word, (_, count) in zip(decoded, popular)]
+
+        return words
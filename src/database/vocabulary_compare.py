@@ -0,0 +1,84 @@
+import numpy as np
+
+
+class VocabularyMatrix:
+    """ Словари авторов в виде строк булевой матрицы авторы x слова.
+
+    Номера слов из общего словаря сжимаются в номера столбцов, после чего
+    все попарные пересечения считаются одним матричным умножением.
+    """
+
+    def __init__(self, vocabularies):
+        """ vocabularies - список пар (автор, номера слов из Vocabulary). """
+        self.authors = [author for author, _ in vocabularies]
+        word_lists = [np.asarray(list(words), dtype=np.int64) for _, words in vocabularies]
+        sizes = [len(words) for words in word_lists]
+
+        if sum(sizes):
+            self.words, word_ids = np.unique(np.concatenate(word_lists), return_inverse=True)
+        else:
+            self.words, word_ids = np.empty(0, dtype=np.int64), np.empty(0, dtype=np.intp)
+
+        rows = np.repeat(np.arange(len(sizes)), sizes)
+        self.matrix = np.zeros((len(sizes), len(self.words)), dtype=bool)
+        self.matrix[rows, word_ids] = True
+
+        self.sizes = self.matrix.sum(axis=1)
+
+    def overlap(self):
+        """ Матрица числа общих слов для всех пар авторов. """
+        rows = self.matrix.astype(np.int32)
+        return rows @ rows.T
+
+    def overlap_percent(self):
+        """ Процент общих слов от меньшего из двух словарей, на диагонали nan. """
+        with np.errstate(divide='ignore', invalid='ignore'):
+            percent = self.overlap() / np.minimum.outer(self.sizes, self.sizes) * 100.0
+        np.fill_diagonal(percent, np.nan)
+        return percent
+
+    def intersection(self, i, j):
+        return self.words[np.flatnonzero(self.matrix[i] & self.matrix[j])].tolist()
+
+
+class LazyIntersections:
+    """ Списки общих слов для упорядоченных пар авторов, вычисляемые при обходе.
+
+    Каждая неупорядоченная пара считается один раз и используется для (A, B) и (B, A).
+    decode переводит номера слов в слова.
+    """
+
+    def __init__(self, vocabulary_matrix, decode=None):
+        self.vocabulary_matrix = vocabulary_matrix
+        self.decode = decode
+        self._cache = {}
+
+    def __len__(self):
+        count = len(self.vocabulary_matrix.authors)
+        return count * (count - 1)
+
+    def __iter__(self):
+        authors = self.vocabulary_matrix.authors
+        for i, author in enumerate(authors):
+            for j, other_author in enumerate(authors):
+                if i != j:
+                    yield author, other_author, self._intersection(i, j)
+
+    def _intersection(self, i, j):
+        key = (min(i, j), max(i, j))
+        if key not in self._cache:
+            words = self.vocabulary_matrix.intersection(*key)
+            self._cache[key] = self.decode(words) if self.decode else words
+        return self._cache[key]
+
+
+def compare_vocabularies(vocabularies, decode=None):
+    """ Возвращает ({автор: {автор: процент}}, LazyIntersections) как ReportsDataBase.get_words_compare. """
+    vocabulary_matrix = VocabularyMatrix(vocabularies)
+    percent = vocabulary_matrix.overlap_percent().tolist()
+
+    compare = {}
+    for i, author in enumerate(vocabulary_matrix.authors):
+        compare[author] = dict(zip(vocabulary_matrix.authors, percent[i]))
+
+    return compare, LazyIntersections(vocabulary_matrix, decode)
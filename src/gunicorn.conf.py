@@ -0,0 +1,22 @@
+""" Настройки gunicorn для запуска в докере: gunicorn -c gunicorn.conf.py app:app
+
+Приложение создается в главном процессе до fork рабочих (preload_app), вместе со
+словарями анализатора (PRELOAD_ANALYZER): рабочие процессы делят их страницы памяти
+и не загружают словари при первом запросе. Подключение к базе каждый рабочий
+процесс создает сам при прогреве.
+"""
+import os
+
+os.environ.setdefault('PRELOAD_ANALYZER', '1')
+
+bind = '0.0.0.0:5000'
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+preload_app = True
+# Загрузка больших отчетов и импорт выполняются дольше стандартных 30 секунд
+timeout = 300
+
+
+def post_fork(server, worker):
+    from app import app, start_warm_up
+
+    start_warm_up(app)
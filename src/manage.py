@@ -0,0 +1,255 @@
+import argparse
+import os
+import sys
+
+from database.reports_data_base import ReportsDataBase
+
+# !!! Если не в докере то: mongodb://localhost:27017/
+DEFAULT_DB_URL = 'mongodb'
+DEFAULT_DB_NAME = 'nosql1h19-report-stats'
+
+
+def ingest(db, args):
+    from database.bulk_ingest import ingest_directory
+
+    manifest = args.manifest
+    if manifest is None:
+        candidates = [os.path.join(args.directory, name) for name in ('manifest.csv', 'manifest.json')]
+        manifest = next((path for path in candidates if os.path.exists(path)), None)
+        if manifest is None:
+            sys.exit('Не найден манифест: укажите --manifest')
+
+    def progress(done, total):
+        if done % 100 == 0 or done == total:
+            print(f'Обработано {done}/{total}', file=sys.stderr)
+
+    result = ingest_directory(db, args.directory, manifest,
+                              workers=args.workers,
+                              batch_size=args.batch_size,
+                              streaming=args.streaming,
+                              progress=progress)
+
+    print(f'Файлов: {result.total}, загружено: {result.inserted}, ошибок: {len(result.failures)}')
+    print(f'Время: {result.elapsed:.1f} с, {result.throughput:.1f} отчетов/с')
+    for path, error in result.failures:
+        print(f'  {path}: {error}')
+
+    return 1 if result.failures else 0
+
+
+def rebuild_summaries(db, args):
+    db.rebuild_summaries()
+    print('Сводки по авторам и группам пересчитаны')
+    return 0
+
+
+def print_sizes(before, after):
+    print(f'{"коллекция":<14}{"данные до":>14}{"после":>14}{"диск до":>14}{"после":>14}')
+    for name in before:
+        print(f'{name:<14}{before[name][0]:>14}{after[name][0]:>14}{before[name][1]:>14}{after[name][1]:>14}')
+
+
+def migrate_vocabulary(db, args):
+    before = db.collection_sizes()
+    converted = db.migrate_vocabulary(args.batch_size)
+    after = db.collection_sizes()
+
+    print(f'Преобразовано отчетов: {converted}')
+    print_sizes(before, after)
+    return 0
+
+
+def migrate_texts(db, args):
+    before = db.collection_sizes()
+    moved = db.migrate_texts(args.batch_size)
+    after = db.collection_sizes()
+
+    print(f'Перенесено текстов: {moved}')
+    print_sizes(before, after)
+    return 0
+
+
+def indexes(db, args):
+    if args.action == 'apply':
+        result = db.apply_indexes(args.drop_undeclared, args.recreate)
+        for name in result['mismatched']:
+            action = 'пересоздан' if args.recreate else 'запустите с --recreate, чтобы пересоздать'
+            print(f'Параметры индекса {name} отличаются от объявленных: {action}')
+        for name in result['created']:
+            print(f'Создан индекс {name}')
+        for name in result['dropped']:
+            print(f'Удален индекс {name}')
+        if not any(result.values()):
+            print('Индексы соответствуют объявленным')
+        return 0
+
+    problems = 0
+    for result in db.audit_indexes():
+        stages = ' <- '.join(f'{stage}({index})' if index else stage for stage, index in result['stages'])
+        mark = '!!' if result['problems'] else 'ok'
+        print(f'{mark} {result["collection"]}: {result["name"]}: {stages}')
+        for problem in result['problems']:
+            print(f'   {problem}')
+        problems += bool(result['problems'])
+
+    print(f'Запросов с замечаниями: {problems}')
+
+    # Число использований с момента запуска сервера: кандидаты на удаление - индексы с нулем
+    for collection, usage in db.index_usage().items():
+        for index_name, accesses in sorted(usage.items()):
+            print(f'{collection}.{index_name}: использований {accesses}')
+
+    return 1 if problems else 0
+
+
+def cache_stats(db, args):
+    if db.analysis_cache is None:
+        print('Кэш результатов обработки отключен')
+        return 0
+
+    if args.clear:
+        db.analysis_cache.clear()
+
+    stats = db.analysis_cache.stats()
+    print(f'Записей: {stats["size"]}/{stats["max_size"]}, '
+          f'объем: {stats["bytes"] / 2 ** 20:.1f}/{stats["max_bytes"] / 2 ** 20:.0f} МБ, попаданий: {stats["hits"]}, '
+          f'промахов: {stats["misses"]}, доля попаданий: {stats["hit_rate"]:.1%}')
+    return 0
+
+
+def rebuild_terms(db, args):
+    db.rebuild_term_stats()
+    print('Частоты слов по отчетам пересчитаны')
+    return 0
+
+
+def reanalyse(db, args):
+    from database.reanalysis import reanalyse_reports
+
+    processor_kwargs = {'extra_stop_words': args.stop_words,
+                        'num_top_words': args.num_top_words,
+                        'tokenizer': args.tokenizer}
+
+    def progress(done, total):
+        print(f'Обработано {done}/{total}', file=sys.stderr)
+
+    result = reanalyse_reports(db, processor_kwargs,
+                               workers=args.workers,
+                               batch_size=args.batch_size,
+                               throttle=args.throttle,
+                               restart=args.restart,
+                               progress=progress)
+
+    print(f'Настройки {result.config}: обработано {result.processed}, обновлено {result.updated}, '
+          f'без текста: {result.skipped}, ошибок: {result.failed}')
+    print(f'Время: {result.elapsed:.1f} с, {result.throughput:.1f} отчетов/с')
+    for report_id, error in result.failures:
+        print(f'  {report_id}: {error}')
+
+    return 1 if result.failures else 0
+
+
+def near_duplicates(db, args):
+    if args.backfill:
+        print(f'Вычислены подписи отчетов: {db.backfill_minhash(args.batch_size)}')
+
+    clusters = db.find_near_duplicates(args.threshold, args.max_bucket)
+    for number, reports in enumerate(clusters, 1):
+        print(f'Группа {number}: {len(reports)} отчетов')
+        for report in reports:
+            print(f'  {report["_id"]}  {report["group"]}  {report["author"]}  {report["title"]}')
+
+    print(f'Групп похожих отчетов: {len(clusters)}')
+    return 0
+
+
+def import_reports(db, args):
+    from bson import json_util
+    from utils.json_stream import iter_json_records
+
+    with open(args.file, 'rb') as stream:
+        records = iter_json_records(stream, object_hook=json_util.object_hook)
+        result = db.import_reports(records, args.batch_size)
+
+    print(f'Добавлено: {result.inserted}, обновлено: {result.updated}, с ошибками: {result.failed}')
+    if result.error:
+        print(f'Чтение прервано: {result.error}')
+    for index, error in result.failures:
+        print(f'  запись {index}: {error}')
+
+    return 1 if result.failed or result.error else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Обслуживание базы отчетов')
+    parser.add_argument('--db-url', default=DEFAULT_DB_URL)
+    parser.add_argument('--db-name', default=DEFAULT_DB_NAME)
+    commands = parser.add_subparsers(dest='command')
+    commands.required = True
+
+    ingest_parser = commands.add_parser('ingest', help='загрузить каталог .docx отчетов')
+    ingest_parser.add_argument('directory')
+    ingest_parser.add_argument('--manifest', help='CSV/JSON с метаданными (по умолчанию manifest.csv|json в каталоге)')
+    ingest_parser.add_argument('--workers', type=int, default=None)
+    ingest_parser.add_argument('--batch-size', type=int, default=100)
+    ingest_parser.add_argument('--streaming', action='store_true', help='потоковый разбор docx')
+    ingest_parser.set_defaults(handler=ingest)
+
+    summaries_parser = commands.add_parser('rebuild-summaries', help='пересчитать сводки по авторам, группам и куб rollup_cube')
+    summaries_parser.set_defaults(handler=rebuild_summaries)
+
+    vocabulary_parser = commands.add_parser('migrate-vocabulary', help='заменить слова в отчетах номерами из общего словаря')
+    vocabulary_parser.add_argument('--batch-size', type=int, default=500)
+    vocabulary_parser.set_defaults(handler=migrate_vocabulary)
+
+    texts_parser = commands.add_parser('migrate-texts', help='перенести тексты отчетов в сжатую коллекцию report_texts')
+    texts_parser.add_argument('--batch-size', type=int, default=500)
+    texts_parser.set_defaults(handler=migrate_texts)
+
+    indexes_parser = commands.add_parser('indexes', help='применить объявленные индексы или проверить планы запросов')
+    indexes_parser.add_argument('action', choices=('apply', 'audit'))
+    indexes_parser.add_argument('--drop-undeclared', action='store_true', help='удалить не объявленные индексы')
+    indexes_parser.add_argument('--recreate', action='store_true',
+                                help='пересоздать индексы, параметры которых отличаются от объявленных')
+    indexes_parser.set_defaults(handler=indexes)
+
+    cache_parser = commands.add_parser('analysis-cache', help='статистика кэша результатов обработки docx')
+    cache_parser.add_argument('--clear', action='store_true', help='очистить кэш и счетчики')
+    cache_parser.set_defaults(handler=cache_stats)
+
+    terms_parser = commands.add_parser('rebuild-terms', help='пересчитать число отчетов с каждым словом (для TF-IDF)')
+    terms_parser.set_defaults(handler=rebuild_terms)
+
+    reanalyse_parser = commands.add_parser('reanalyse', help='повторно обработать сохраненные тексты с новыми настройками')
+    reanalyse_parser.add_argument('--stop-words', nargs='*', default=[], help='дополнительные стоп-слова')
+    reanalyse_parser.add_argument('--num-top-words', type=int, default=25)
+    reanalyse_parser.add_argument('--tokenizer', choices=('fast', 'nltk'), default='fast')
+    reanalyse_parser.add_argument('--workers', type=int, default=2)
+    reanalyse_parser.add_argument('--batch-size', type=int, default=100)
+    reanalyse_parser.add_argument('--throttle', type=float, default=1.0,
+                                  help='пауза после пачки в долях времени ее обработки')
+    reanalyse_parser.add_argument('--restart', action='store_true', help='начать заново, а не с сохраненного места')
+    reanalyse_parser.set_defaults(handler=reanalyse)
+
+    duplicates_parser = commands.add_parser('near-duplicates', help='найти группы почти одинаковых отчетов')
+    duplicates_parser.add_argument('--threshold', type=float, default=0.8, help='минимальное сходство текстов (0..1)')
+    duplicates_parser.add_argument('--max-bucket', type=int, default=100,
+                                   help='пропускать LSH-полосы, общие для большего числа отчетов')
+    duplicates_parser.add_argument('--backfill', action='store_true', help='сначала вычислить подписи старых отчетов')
+    duplicates_parser.add_argument('--batch-size', type=int, default=500)
+    duplicates_parser.set_defaults(handler=near_duplicates)
+
+    import_parser = commands.add_parser('import', help='импортировать отчеты из JSON-массива или NDJSON')
+    import_parser.add_argument('file')
+    import_parser.add_argument('--batch-size', type=int, default=500)
+    import_parser.set_defaults(handler=import_reports)
+
+    args = parser.parse_args(argv)
+    # Команде indexes не нужны уже созданные индексы: она их и создает
+    db = ReportsDataBase(args.db_url, args.db_name, check_indexes=args.command != 'indexes')
+
+    return args.handler(db, args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
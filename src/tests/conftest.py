@@ -0,0 +1,85 @@
+import glob
+import os
+import random
+
+import pytest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..')
+SAMPLES = sorted(glob.glob(os.path.join(ROOT, 'Samples', '*.docx')) +
+                 glob.glob(os.path.join(ROOT, 'HelloWorld', '*.docx')))
+
+META = {
+    'title': 'Отчет',
+    'author': 'Иванов Иван',
+    'faculty': 'ФКТИ',
+    'department': 'МОЭВМ',
+    'course': '3',
+    'group': '3341',
+}
+
+WORDS = ['альфа', 'бета', 'гамма', 'дельта', 'эпсилон', 'дзета', 'эта', 'тета', 'йота', 'каппа']
+
+
+def text(size, seed):
+    """ Воспроизводимый текст из size слов (сочетаний двух слов WORDS). """
+    generator = random.Random(seed)
+    return ' '.join(generator.choice(WORDS) + generator.choice(WORDS) for _ in range(size))
+
+
+def words(counts):
+    """ Раздел words отчета по словарю {слово: число вхождений}. """
+    return {'total_words': sum(counts.values()), 'total_unique_words': len(counts),
+            'persent_unique_words': len(counts) / sum(counts.values()) * 100.0,
+            'unique_words': list(counts), 'word_counts': list(counts.values()),
+            'most_popular_words': sorted(counts.items(), key=lambda item: -item[1])}
+
+
+def record(author, raw_text='текст', group=3341, counts=None, **fields):
+    """ Запись экспорта отчета для import_reports. """
+    data = {
+        'title': 'Отчет', 'author': author, 'group': group, 'department': 'МОЭВМ', 'course': 3, 'faculty': 'ФКТИ',
+        'text': {'raw_text': raw_text},
+        'words': words(counts or {'слово': 1}),
+        'symbols': {'total_raw_symbols': len(raw_text), 'total_clean_symbols': len(raw_text)},
+    }
+    data.update(fields)
+    return data
+
+
+@pytest.fixture(scope='session')
+def stop_words():
+    """ Стоп-слова nltk; без загруженного корпуса тесты обработки текста пропускаются. """
+    from nltk.corpus import stopwords
+    try:
+        return stopwords.words('russian')
+    except LookupError:
+        pytest.skip('нет корпуса nltk stopwords (python -m nltk.downloader stopwords)')
+
+
+@pytest.fixture
+def app(monkeypatch, tmp_path, stop_words):
+    """ Приложение с базой в памяти (mongomock вместо сервера MongoDB). """
+    mongomock = pytest.importorskip('mongomock')
+    import pymongo
+    from app import DEFAULT_CONFIG, create_app
+    from database.indexes import apply_indexes
+
+    client = mongomock.MongoClient()
+    monkeypatch.setattr(pymongo, 'MongoClient', lambda *args, **kwargs: client)
+    apply_indexes(client[DEFAULT_CONFIG['DB_NAME']])
+
+    app = create_app({'UPLOAD_FOLDER': str(tmp_path / 'reports'), 'TESTING': True})
+    yield app
+    app.jobs.shutdown()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def upload(client, path, **meta):
+    data = dict(META, **meta)
+    with open(path, 'rb') as docx:
+        data['file'] = (docx, os.path.basename(path))
+        return client.post('/upload', data=data, content_type='multipart/form-data')
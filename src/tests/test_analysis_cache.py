@@ -0,0 +1,63 @@
+import pytest
+
+from database.analysis_cache import AnalysisCache
+
+
+def analysis(raw_text):
+    return {'date': None, 'text': {'raw_text': raw_text}, 'symbols': {'total_raw_symbols': len(raw_text)},
+            'words': {'unique_words': [], 'total_words': 0}}
+
+
+@pytest.fixture
+def db():
+    mongomock = pytest.importorskip('mongomock')
+    return mongomock.MongoClient()['test']
+
+
+def test_raw_text_is_stored_compressed(db):
+    cache = AnalysisCache(db)
+    raw_text = 'отчет по лабораторной работе ' * 1000
+    source = analysis(raw_text)
+    cache.put('a', 'config', source)
+
+    stored = db['analysis_cache'].find_one()
+    assert isinstance(stored['text']['raw_text'], bytes)
+    assert stored['size'] < len(raw_text)
+    assert source['text']['raw_text'] == raw_text
+    assert cache.get('a', 'config') == analysis(raw_text)
+    assert cache.get('a', 'other') is None
+
+
+def test_cache_is_bounded_by_bytes(db):
+    cache = AnalysisCache(db, max_entries=100, max_bytes=500)
+    for digest in 'abcdef':
+        cache.put(digest, 'config', analysis(digest * 10))
+        # Запись с тем же ключом заменяется, размер не удваивается
+        cache.put(digest, 'config', analysis(digest * 10))
+
+    stats = cache.stats()
+    sizes = [entry['size'] for entry in db['analysis_cache'].find()]
+    assert stats['bytes'] == sum(sizes) <= 500
+    assert 0 < stats['size'] < 6
+    assert cache.get('f', 'config') is not None
+    assert cache.get('a', 'config') is None
+
+
+def test_cache_is_bounded_by_entries(db):
+    cache = AnalysisCache(db, max_entries=2)
+    for digest in 'abc':
+        cache.put(digest, 'config', analysis(digest))
+    assert db['analysis_cache'].count_documents({}) == 2
+    assert cache.get('a', 'config') is None
+
+
+def test_repeated_upload_uses_cache(app, client):
+    from tests.conftest import SAMPLES, upload
+
+    upload(client, SAMPLES[0])
+    upload(client, SAMPLES[0], author='Петров Петр')
+
+    db = app.db.get()
+    assert db.analysis_cache.stats()['hits'] == 1
+    first, second = (db.texts.get(report['_id']) for report in db.db['reports'].find().sort('_id'))
+    assert first and first == second
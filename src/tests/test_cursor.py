@@ -0,0 +1,48 @@
+import datetime
+
+import pytest
+from bson import ObjectId, json_util
+
+from tests.conftest import record
+from utils.functions import decode_cursor, encode_cursor
+
+
+def test_cursor_round_trip():
+    values = ['Иванов Иван', 'Отчет №1 & 2/3?', ObjectId(), datetime.datetime(2020, 1, 2, 3, 4, 5)]
+    cursor = encode_cursor(iter(values))
+
+    assert cursor.replace('-', '').replace('_', '').replace('=', '').isalnum()
+    decoded = decode_cursor(cursor, len(values))
+    assert decoded[:3] == values[:3]
+    # Курсор всегда возвращает время с часовым поясом UTC; в запросе к MongoDB это то же значение
+    assert decoded[3].tzinfo is not None
+    assert decoded[3] == values[3].replace(tzinfo=datetime.timezone.utc)
+
+
+@pytest.mark.parametrize('cursor', ['', 'не base64', encode_cursor([1, 2])[:-3], encode_cursor([1])])
+def test_bad_cursor(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor, 2)
+
+
+def test_pages_cover_group_once(app, client):
+    authors = ['Андреев Антон', 'Борисов Борис', 'Васильев Виктор']
+    app.db.get().import_reports(enumerate(record(author)
+                                          for author in authors for _ in range(3)))
+
+    seen, cursor = [], None
+    while True:
+        query = {'group': 3341, 'limit': 2, 'fields': 'author'}
+        if cursor:
+            query['cursor'] = cursor
+        page = json_util.loads(client.get('/api/reports', query_string=query).data)
+        seen.extend(page['reports'])
+        cursor = page['next']
+        if cursor is None:
+            break
+
+    assert [item['author'] for item in seen] == sorted(author for author in authors for _ in range(3))
+    assert len({item['_id'] for item in seen}) == 9
+
+    response = client.get('/api/reports', query_string={'group': 3341, 'cursor': 'мусор'})
+    assert response.status_code == 400
@@ -0,0 +1,58 @@
+import gzip
+import io
+import json
+
+from bson import json_util
+
+from tests.conftest import record, text
+
+
+def reports(app):
+    """ Отчеты базы с текстами, без _id: то, что должно пережить выгрузку и загрузку. """
+    result = []
+    for report in app.db.db['reports'].find():
+        report = app.db._decode(report)
+        report['text'] = {'raw_text': app.db.get_report_text(report.pop('_id'))}
+        result.append(report)
+    return sorted(result, key=lambda report: report['author'])
+
+
+def post_import(client, data):
+    return client.post('/import', data={'file': (io.BytesIO(data), 'db_export.ndjson')},
+                       content_type='multipart/form-data')
+
+
+def test_ndjson_gzip_round_trip(app, client):
+    app.db.import_reports(enumerate(record(f'Автор {number}', raw_text=text(20, number), group=3340 + number,
+                                           counts={'слово': number + 1, 'отчет': 1}) for number in range(5)))
+    before = reports(app)
+
+    response = client.get('/export?format=ndjson&gzip=1')
+    assert response.status_code == 200
+    assert response.mimetype == 'application/gzip'
+    data = gzip.decompress(response.data)
+
+    app.db.db['reports'].delete_many({})
+    app.db.db['report_texts'].delete_many({})
+    assert post_import(client, data).status_code == 200
+
+    assert app.db.db['reports'].count_documents({}) == 5
+    assert reports(app) == before
+
+
+def test_export_without_id_keeps_texts(app, client):
+    app.db.import_reports(enumerate(record(f'Автор {number}', raw_text=text(10, number)) for number in range(5)))
+    before = reports(app)
+
+    # Пачки по 2 отчета: тексты подгружаются и в середине потока
+    lines = ''.join(app.db.iter_export('ndjson', exclude=['_id'], batch_size=2)).splitlines()
+    exported = [json_util.loads(line) for line in lines]
+    assert all('_id' not in report for report in exported)
+    assert sorted(report['text']['raw_text'] for report in exported) == sorted(text(10, number) for number in range(5))
+    assert json.loads(''.join(app.db.iter_export('json', exclude=['_id'], batch_size=2)))[0].keys() == exported[0].keys()
+
+    app.db.db['reports'].delete_many({})
+    app.db.db['report_texts'].delete_many({})
+    assert post_import(client, '\n'.join(lines).encode()).status_code == 200
+
+    assert reports(app) == before
@@ -0,0 +1,45 @@
+import pytest
+
+from database.hll import HyperLogLog
+
+
+def words(start, stop):
+    return [f'слово{index}' for index in range(start, stop)]
+
+
+@pytest.mark.parametrize('size', [0, 1, 10, 1000, 50000])
+def test_count_is_close(size):
+    estimate = HyperLogLog.from_words(words(0, size)).count()
+    assert estimate == pytest.approx(size, rel=0.05, abs=1)
+
+
+def test_duplicates_do_not_change_count():
+    sketch = HyperLogLog.from_words(words(0, 1000))
+    registers = bytes(sketch.registers)
+    sketch.update(words(0, 1000))
+    assert bytes(sketch.registers) == registers
+
+
+def test_merge_equals_union():
+    first = HyperLogLog.from_words(words(0, 3000))
+    second = HyperLogLog.from_words(words(2000, 5000))
+    union = HyperLogLog.from_words(words(0, 5000))
+
+    assert first.merge(second).registers == union.registers
+    assert first.count() == pytest.approx(5000, rel=0.05)
+
+
+def test_serialization_round_trip():
+    sketch = HyperLogLog.from_words(words(0, 100), precision=12)
+    data = sketch.to_bytes()
+    restored = HyperLogLog.from_bytes(data)
+
+    assert data[0] == 12 and len(data) < len(sketch.registers)
+    assert restored.precision == 12 and restored.registers == sketch.registers
+
+
+def test_precision_is_checked():
+    with pytest.raises(ValueError):
+        HyperLogLog(precision=3)
+    with pytest.raises(ValueError):
+        HyperLogLog(precision=10).merge(HyperLogLog(precision=11))
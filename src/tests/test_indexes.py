@@ -0,0 +1,56 @@
+import pytest
+
+from database.indexes import INDEXES, apply_indexes, missing_unique_indexes
+
+
+@pytest.fixture
+def db():
+    mongomock = pytest.importorskip('mongomock')
+    return mongomock.MongoClient()['test']
+
+
+def test_missing_unique_indexes(db):
+    unique = sum(1 for indexes in INDEXES.values() for _, options in indexes if options.get('unique'))
+    assert len(missing_unique_indexes(db)) == unique
+
+    apply_indexes(db)
+    assert missing_unique_indexes(db) == []
+
+
+def test_database_refuses_to_start_without_unique_indexes(db, monkeypatch):
+    import pymongo
+    from database.reports_data_base import ReportsDataBase
+
+    monkeypatch.setattr(pymongo, 'MongoClient', lambda *args, **kwargs: db.client)
+    with pytest.raises(RuntimeError, match='indexes apply'):
+        ReportsDataBase('mongodb', 'test')
+
+    apply_indexes(db)
+    ReportsDataBase('mongodb', 'test')
+
+
+def test_drop_undeclared(db):
+    apply_indexes(db)
+    db['reports'].create_index('title')
+
+    assert apply_indexes(db) == {'created': [], 'dropped': [], 'mismatched': []}
+    assert apply_indexes(db, drop_undeclared=True)['dropped'] == ['reports.title_1']
+
+
+def test_mismatched_options(db):
+    # Индексы с объявленными ключами, но без unique и с другим сроком хранения
+    db['vocabulary'].create_index('word')
+    db['jobs'].create_index('modified', expireAfterSeconds=60)
+    db['author_stats'].create_index([('author', 1)], partialFilterExpression={'author': {'$exists': True}})
+
+    result = apply_indexes(db)
+    assert sorted(result['mismatched']) == ['author_stats.author_1', 'jobs.modified_1', 'vocabulary.word_1']
+    assert missing_unique_indexes(db) == ['vocabulary.word']
+    assert db['jobs'].index_information()['modified_1']['expireAfterSeconds'] == 60
+
+    result = apply_indexes(db, recreate=True)
+    assert sorted(result['mismatched']) == sorted(result['created'])
+    assert missing_unique_indexes(db) == []
+    assert db['jobs'].index_information()['modified_1']['expireAfterSeconds'] == 24 * 3600
+    assert 'partialFilterExpression' not in db['author_stats'].index_information()['author_1']
+    assert apply_indexes(db) == {'created': [], 'dropped': [], 'mismatched': []}
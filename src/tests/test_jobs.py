@@ -0,0 +1,26 @@
+from utils.jobs import Job, JobQueue
+
+
+def test_job_status_is_shared_through_the_database(app):
+    job_id = app.jobs.submit(lambda: {'inserted': 1})
+    app.jobs.shutdown()
+
+    # Другой рабочий процесс: своя очередь без задач в памяти, та же база
+    other = JobQueue(store=app.db)
+    job = other.get(job_id)
+    assert job.status == Job.DONE and job.result == {'inserted': 1}
+    assert other.get('unknown') is None
+
+    response = app.test_client().get(f'/jobs/{job_id}?format=json')
+    assert b'"done"' in response.data
+
+
+def test_failed_job_is_saved(app):
+    def fail():
+        raise ValueError('битый файл')
+
+    job_id = app.jobs.submit(fail)
+    app.jobs.shutdown()
+
+    job = JobQueue(store=app.db).get(job_id)
+    assert job.status == Job.FAILED and job.error == 'битый файл' and job.finished is not None
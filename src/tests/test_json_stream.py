@@ -0,0 +1,64 @@
+import io
+import json
+
+import pytest
+
+from utils.json_stream import iter_json_records
+
+
+def records(data, **kwargs):
+    return [record for _, record in iter_json_records(io.BytesIO(data.encode('utf-8')), **kwargs)]
+
+
+class CountingStream(io.BytesIO):
+    def __init__(self, data):
+        super().__init__(data)
+        self.reads = 0
+
+    def read(self, size=-1):
+        self.reads += 1
+        return super().read(size)
+
+
+@pytest.mark.parametrize('data', [
+    '[{"a": 1}, {"b": [1, 2]}, 3]',
+    '﻿[\n{"a": 1},\n{"b": [1, 2]},\n3\n]',
+    '{"a": 1}\n{"b": [1, 2]}\n3\n',
+])
+def test_array_and_ndjson(data):
+    assert records(data, chunk_size=3) == [{'a': 1}, {'b': [1, 2]}, 3]
+
+
+def test_record_split_across_chunks():
+    record = {'title': 'Отчет', 'text': 'слово ' * 1000}
+    data = json.dumps([record, record, 12345], ensure_ascii=False)
+    assert records(data, chunk_size=7) == [record, record, 12345]
+
+
+def test_long_record_is_read_in_few_attempts():
+    data = json.dumps([{'text': 'x' * 1000000}]).encode('utf-8')
+    stream = CountingStream(data)
+    assert len(list(iter_json_records(stream, chunk_size=1024))) == 1
+    assert stream.reads < len(data) // 1024 + 5
+
+
+def test_malformed_record():
+    with pytest.raises(ValueError, match='запись 2'):
+        records('[{"a": 1}, {"b": }, {"c": 3}]')
+
+
+def test_malformed_record_does_not_buffer_the_file():
+    data = '{"a": 1}\n{"b": \n' + '{"c": 3}\n' * 10000
+    with pytest.raises(ValueError, match='запись 2'):
+        records(data, chunk_size=64, max_record_size=1024)
+
+
+@pytest.mark.parametrize('data', ['[{"a": 1},]', '[{"a": 1}, ]', '[,]'])
+def test_trailing_comma(data):
+    with pytest.raises(ValueError):
+        records(data)
+
+
+def test_unclosed_array():
+    with pytest.raises(ValueError, match='не закрыт'):
+        records('[{"a": 1}')
@@ -0,0 +1,41 @@
+import pytest
+
+from database import minhash
+from tests.conftest import text
+
+
+def jaccard(first, second):
+    first, second = minhash.shingles(first), minhash.shingles(second)
+    return len(first & second) / len(first | second)
+
+
+def test_threshold_matches_band_design():
+    assert minhash.BANDS * minhash.ROWS == minhash.NUM_PERM
+    assert 0.65 < minhash.THRESHOLD < 0.75
+
+
+def test_identical_texts_share_all_bands():
+    first = text(500, 1)
+    assert minhash.signature(first) == minhash.signature(first.upper() + ' 123 !')
+    assert minhash.similarity(minhash.signature(first), minhash.signature(first)) == 1.0
+
+
+def test_similarity_estimates_jaccard():
+    first = text(3000, 1)
+    words = first.split()
+    second = ' '.join(words[:2900] + text(100, 2).split())
+
+    estimate = minhash.similarity(minhash.signature(first), minhash.signature(second))
+    assert estimate == pytest.approx(jaccard(first, second), abs=0.1)
+    assert set(minhash.lsh_bands(minhash.signature(first))) & set(minhash.lsh_bands(minhash.signature(second)))
+
+
+def test_unrelated_texts_share_no_bands():
+    first, second = minhash.signature(text(1000, 1)), minhash.signature(text(1000, 2))
+    assert minhash.similarity(first, second) < 0.1
+    assert not set(minhash.lsh_bands(first)) & set(minhash.lsh_bands(second))
+
+
+def test_text_without_words_has_no_signature():
+    assert minhash.signature('123 !!') is None
+    assert minhash.lsh_bands(None) == []
@@ -0,0 +1,21 @@
+from tests.conftest import SAMPLES, upload
+
+
+def test_cached_getter_sees_new_reports(app, client):
+    db = app.db.get()
+    upload(client, SAMPLES[0])
+
+    first = db.get_stat_of_author('Иванов Иван')
+    assert first['total_reports_loaded'] == 1
+    assert db.get_stat_of_author('Иванов Иван') == first
+    assert db.cache.stats()['hits'] == 1
+
+    # save_report увеличивает версию данных, кэшированная сводка больше не выдается
+    version = db.data_version()
+    upload(client, SAMPLES[-1])
+    assert db.data_version() > version
+
+    second = db.get_stat_of_author('Иванов Иван')
+    assert second['total_reports_loaded'] == 2
+    assert second['sum_total_words'] > first['sum_total_words']
+    assert db.cache.stats()['hits'] == 1
@@ -0,0 +1,53 @@
+import json
+import threading
+
+from utils.lazy import Lazy
+
+
+def ready(app, client):
+    response = client.get('/ready')
+    if app.warm_up_thread is not None:
+        app.warm_up_thread.join(10)
+    return response.status_code, json.loads(response.data)
+
+
+def test_ready_while_job_workers_are_busy(app, client):
+    release = threading.Event()
+    for _ in range(app.config['UPLOAD_WORKERS'] + 1):
+        app.jobs.submit(release.wait, 10)
+
+    try:
+        ready(app, client)
+        status, body = ready(app, client)
+        assert status == 200 and body == {'ready': True, 'warm_up': 'done', 'error': None}
+    finally:
+        release.set()
+
+
+def test_failed_warm_up_is_retried(app, client):
+    database = app.db
+
+    def fail():
+        raise RuntimeError('нет базы')
+
+    app.db = Lazy(fail)
+    ready(app, client)
+    status, body = ready(app, client)
+    assert status == 503 and body['warm_up'] == 'failed' and 'нет базы' in body['error']
+
+    app.db = database
+    ready(app, client)
+    status, body = ready(app, client)
+    assert status == 200 and body['error'] is None
+
+
+def test_preload_creates_all_processors(app):
+    from app import create_app
+
+    assert app.text_processor._created == 0
+    preloaded = create_app({'PRELOAD_ANALYZER': True, 'TESTING': True})
+    try:
+        assert preloaded.text_processor._created == preloaded.text_processor.size
+        assert preloaded.text_processor._idle.qsize() == preloaded.text_processor.size
+    finally:
+        preloaded.jobs.shutdown()
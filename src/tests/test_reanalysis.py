@@ -0,0 +1,39 @@
+from database.reanalysis import reanalyse_reports
+from database.text_processor import processor_config
+from tests.conftest import SAMPLES, upload
+
+SETTINGS = {'extra_stop_words': ['данные'], 'num_top_words': 10}
+
+
+def test_reanalysis_runs_again_after_completion(app, client):
+    for author in ('Иванов Иван', 'Петров Петр'):
+        upload(client, SAMPLES[0], author=author)
+    db = app.db.get()
+    first, second = [report['_id'] for report in db.db['reports'].find().sort('_id')]
+    db.db['report_texts'].delete_one({'_id': second})
+
+    result = reanalyse_reports(db, SETTINGS, workers=1, throttle=0)
+    assert (result.updated, result.skipped, result.failed) == (1, 1, 0)
+    assert db.db['counters'].find_one({'_id': 'reanalysis'}) is None
+
+    report = db.db['reports'].find_one({'_id': first})
+    assert report['analysis_config'] == processor_config(**SETTINGS)
+    assert len(report['words']['most_popular_words']) == 10
+
+    # Отчет заново загружен через /edit с настройками приложения и сохранил свой _id
+    db.db['reports'].update_one({'_id': first}, {'$set': {'analysis_config': 'default'}})
+    assert reanalyse_reports(db, SETTINGS, workers=1, throttle=0).updated == 1
+
+
+def test_resume_counts_only_remaining_reports(app, client):
+    for author in ('Иванов Иван', 'Петров Петр'):
+        upload(client, SAMPLES[0], author=author)
+    db = app.db.get()
+    first = db.db['reports'].find_one(sort=[('_id', 1)])['_id']
+    config = processor_config(**SETTINGS)
+    db.save_reanalysis_checkpoint(config, last_id=first, processed=1, updated=1, failed=0, pending=[])
+
+    result = reanalyse_reports(db, SETTINGS, workers=1, throttle=0)
+    assert result.total == 2
+    assert result.updated == 2
+    assert db.count_stale_reports(config) == 1
@@ -0,0 +1,103 @@
+import itertools
+import math
+import random
+
+import pytest
+
+from database.hll import HyperLogLog
+from database.rollups import build_cells, exact_sum, group_averages
+from tests.conftest import record
+
+
+def report(generator, index):
+    total = generator.randint(1, 5000)
+    unique = generator.randint(1, total)
+    return {
+        'faculty': generator.choice(['ФКТИ', 'ФЭЛ']),
+        'department': generator.choice(['МОЭВМ', 'САПР']),
+        'course': generator.choice([1, 2]),
+        'group': generator.choice([1341, 2341, 3341]),
+        'words': {'total_words': total, 'total_unique_words': unique,
+                  'persent_unique_words': unique / total * 100.0,
+                  'vocabulary_sketch': HyperLogLog.from_words([f'слово{index}']).to_bytes()},
+        'symbols': {'total_raw_symbols': total * 7.1, 'total_clean_symbols': total * 6.3},
+    }
+
+
+def naive_averages(reports):
+    groups = {}
+    for item in reports:
+        groups.setdefault(item['group'], []).append(item['words'])
+    return [{'_id': group,
+             'avg_total_words': math.fsum(words['total_words'] for words in items) / len(items),
+             'avg_unique_words': math.fsum(words['total_unique_words'] for words in items) / len(items),
+             'avg_persent_unique_words': math.fsum(words['persent_unique_words'] for words in items) / len(items),
+             'total_reports_loaded': len(items)}
+            for group, items in sorted(groups.items())]
+
+
+def test_exact_sum_keeps_remainder():
+    values = [1e16, 1.0, -1e16, 0.1] * 10
+    parts = [exact_sum(values[index:index + 3]) for index in range(0, len(values), 3)]
+    assert math.fsum(value for part in parts for value in part) == math.fsum(values)
+
+
+def test_cells_reproduce_group_averages():
+    generator = random.Random(1)
+    reports = [report(generator, index) for index in range(300)]
+    cells = build_cells(reports)
+
+    assert sum(cell['count'] for cell in cells) == len(reports)
+    assert len({tuple(sorted(cell['_id'].items())) for cell in cells}) == len(cells)
+    assert group_averages(cells) == naive_averages(reports)
+
+    faculty = [cell for cell in cells if cell['faculty'] == 'ФКТИ']
+    assert group_averages(faculty) == naive_averages([item for item in reports if item['faculty'] == 'ФКТИ'])
+
+
+def test_cells_merge_vocabulary_sketches():
+    generator = random.Random(2)
+    reports = [report(generator, index) for index in range(200)]
+    sketch = HyperLogLog()
+    for cell in build_cells(reports):
+        sketch.merge(HyperLogLog.from_bytes(cell['vocabulary_sketch']))
+    assert sketch.count() == pytest.approx(200, rel=0.05)
+
+
+def test_filtered_stat_by_groups_reads_the_cube(app):
+    db = app.db.get()
+    reports = []
+    for index, (faculty, group) in enumerate([('ФКТИ', 1), ('ФКТИ', 1), ('ФЭЛ', 2), ('ФКТИ', 2)]):
+        reports.append(record(f'Автор {"абвг"[index]}', group=group, counts={'слово': index + 1, 'еще': 2},
+                              faculty=faculty))
+    db.import_reports(enumerate(reports))
+
+    result = list(db.get_stat_by_groups(faculty='ФКТИ'))
+    assert result == naive_averages([item for item in reports if item['faculty'] == 'ФКТИ'])
+
+
+def test_cube_matches_aggregation_pipeline(app):
+    db = app.db.get()
+    generator = random.Random(3)
+    records = []
+    for index in range(60):
+        counts = {f'слово{word}': generator.randint(1, 9) for word in generator.sample(range(40), generator.randint(1, 20))}
+        records.append(record(f'Автор {"абвгдежзик"[index % 10]}', group=generator.choice([1341, 2341, 3341]),
+                              counts=counts, faculty=generator.choice(['ФКТИ', 'ФЭЛ']),
+                              department=generator.choice(['МОЭВМ', 'САПР']), course=generator.choice([1, 2, 3])))
+    db.import_reports(enumerate(records))
+    # Часть отчетов меняет кафедру и курс: ячейки куба изменяются вычитанием
+    for report in db.db['reports'].find().limit(15):
+        db.update_report(report['_id'], {'department': 'ВТ', 'course': 4})
+
+    combinations = itertools.product([None, 1, 3, 4], [None, 'ФКТИ', 'ФЭЛ'], [None, 'МОЭВМ', 'ВТ'])
+    for course, faculty, department in combinations:
+        expected = list(db.db['reports'].aggregate(db._stat_by_groups_pipeline(course, faculty, department)))
+        result = list(db.get_stat_by_groups(course, faculty, department))
+
+        assert [row['_id'] for row in result] == [row['_id'] for row in expected]
+        for row, expected_row in zip(result, expected):
+            assert row['total_reports_loaded'] == expected_row['total_reports_loaded']
+            # $avg суммирует double не так, как math.fsum: расхождение допустимо только в последних битах
+            for field in ('avg_total_words', 'avg_unique_words', 'avg_persent_unique_words'):
+                assert row[field] == pytest.approx(expected_row[field], rel=1e-12)
@@ -0,0 +1,26 @@
+from tests.conftest import record, text
+
+
+def test_imported_reports_are_found_as_similar(app):
+    db = app.db.get()
+    original = text(1000, 1)
+    result = db.import_reports(enumerate([record('Иванов Иван', original),
+                                          record('Петров Петр', original + ' еще немного текста'),
+                                          record('Сидоров Сидор', text(1000, 2))]))
+    assert result.inserted == 3
+
+    first = db.db['reports'].find_one({'author': 'Иванов Иван'})
+    assert first['lsh_bands']
+    similar = db.get_similar_reports(first['_id'])
+    assert [report['author'] for report in similar] == ['Петров Петр']
+
+    clusters = db.find_near_duplicates(0.8)
+    assert [sorted(report['author'] for report in cluster) for cluster in clusters] == [['Иванов Иван', 'Петров Петр']]
+
+
+def test_oversized_buckets_are_skipped(app):
+    db = app.db.get()
+    db.import_reports(enumerate(record(author, text(300, 1)) for author in ('Иванов Иван', 'Петров Петр', 'Орлов Олег')))
+
+    assert len(db.find_near_duplicates(0.8)) == 1
+    assert db.find_near_duplicates(0.8, max_bucket=2) == []
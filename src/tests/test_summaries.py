@@ -0,0 +1,78 @@
+import math
+
+import pytest
+
+from tests.conftest import record
+
+
+def test_summaries_follow_inserts_and_moves(app):
+    db = app.db.get()
+    db.import_reports(enumerate([record('Иванов Иван', group=1, counts={'база': 2, 'индекс': 1}),
+                                 record('Иванов Иван', group=1, counts={'база': 1, 'запрос': 3}),
+                                 record('Петров Петр', group=1, counts={'запрос': 1})]))
+
+    ivanov = db.db['author_stats'].find_one({'author': 'Иванов Иван'})
+    assert ivanov['total_reports_loaded'] == 2
+    assert ivanov['sum_total_words'] == 7
+    counts = dict(zip(db.vocabulary.decode(ivanov['unique_words']), ivanov['word_counts']))
+    assert counts == {'база': 3, 'индекс': 1, 'запрос': 3}
+
+    group = db.db['group_stats'].find_one({'_id': 1})
+    assert group['total_reports_loaded'] == 3
+    assert math.isclose(group['avg_total_words'], 8 / 3)
+
+    moved = db.db['reports'].find_one({'author': 'Петров Петр'})['_id']
+    db.update_report(moved, {'group': 2})
+
+    assert db.db['group_stats'].find_one({'_id': 1})['total_reports_loaded'] == 2
+    assert db.db['group_stats'].find_one({'_id': 2})['total_reports_loaded'] == 1
+    assert db.db['author_stats'].find_one({'author': 'Петров Петр'})['group'] == 2
+    assert db.db['author_stats'].count_documents({}) == 2
+
+
+def snapshot(db):
+    def normalize(document):
+        document = {key: value for key, value in document.items() if key not in ('_id', 'revision')}
+        return {key: pytest.approx(value) if isinstance(value, float) else value for key, value in document.items()}
+
+    keys = {'author_stats': ('group', 'author'), 'group_stats': ('_id',),
+            'rollup_cube': ('faculty', 'department', 'course', 'group')}
+    return {name: [normalize(document) for document in sorted(db.db[name].find(),
+                                                               key=lambda document: [document[key] for key in fields])]
+            for name, fields in keys.items()}
+
+
+def test_incremental_summaries_match_rebuild(app, monkeypatch):
+    db = app.db.get()
+
+    def full_scan(*args):
+        raise AssertionError('сводка пересчитана по всем отчетам')
+
+    monkeypatch.setattr(db, '_refresh_group_summary', full_scan)
+    monkeypatch.setattr(db, '_refresh_author_summary', full_scan)
+
+    db.import_reports(enumerate([record('Иванов Иван', group=1, counts={'база': 2, 'индекс': 1}),
+                                 record('Иванов Иван', group=1, counts={'база': 1, 'запрос': 3}),
+                                 record('Петров Петр', group=1, counts={'запрос': 1}, course=2),
+                                 record('Сидоров Сидор', group=2, counts={'ключ': 4})]))
+    reports = {report['author']: report['_id'] for report in db.db['reports'].find({}, {'author': 1})}
+
+    # Смена группы, словаря (слово 'индекс' исчезает) и только названия
+    db.update_report(reports['Петров Петр'], {'group': 2})
+    first = db.db['reports'].find_one({'author': 'Иванов Иван'}, {'_id': 1})['_id']
+    db.update_report(first, {'words': db.vocabulary.decode_words(record('', counts={'база': 5})['words']),
+                             'symbols': {'total_raw_symbols': 10, 'total_clean_symbols': 9}})
+    db.update_report(reports['Сидоров Сидор'], {'title': 'Другое название'})
+
+    # Импорт с _id сливается с существующим отчетом, без _id - добавляет новый
+    exported = db.db['reports'].find_one({'author': 'Сидоров Сидор'}, {'author': 1, 'group': 1})
+    db.import_reports(enumerate([record('Сидоров Сидор', group=3, counts={'ключ': 1}, _id=exported['_id']),
+                                 record('Орлов Олег', group=1, counts={'база': 1})]))
+
+    incremental = snapshot(db)
+    assert db.db['author_stats'].find_one({'author': 'Сидоров Сидор', 'group': 2}) is None
+    assert db.db['group_stats'].find_one({'_id': 1})['total_reports_loaded'] == 3
+
+    monkeypatch.undo()
+    db.rebuild_summaries()
+    assert incremental == snapshot(db)
@@ -0,0 +1,29 @@
+from tests.conftest import SAMPLES, record, upload
+
+
+def term_stats(db):
+    return {entry['_id']: entry['df'] for entry in db.db['term_stats'].find()}
+
+
+def test_document_frequencies_match_rebuild(app, client):
+    db = app.db.get()
+
+    assert upload(client, SAMPLES[0]).status_code == 302
+    uploaded = term_stats(db)
+    db.import_reports(enumerate([record('Сидоров Сидор', counts={'база': 2, 'индекс': 1}),
+                                 record('Петров Петр', counts={'база': 1, 'запрос': 3})]))
+
+    # Изменение словаря: 'индекс' удаляется, 'ключ' добавляется
+    report = db.db['reports'].find_one({'author': 'Сидоров Сидор'}, {'_id': 1})
+    db.update_report(report['_id'], {'words': record('', counts={'база': 1, 'ключ': 2})['words']})
+    # Импорт с _id заменяет словарь существующего отчета
+    report = db.db['reports'].find_one({'author': 'Петров Петр'}, {'_id': 1})
+    db.import_reports(enumerate([record('Петров Петр', counts={'ключ': 1}, _id=report['_id'])]))
+
+    incremental = term_stats(db)
+    ids = db.vocabulary.ids(['база', 'индекс', 'ключ', 'запрос'])
+    added = {word: incremental.get(id_, 0) - uploaded.get(id_, 0) for word, id_ in ids.items()}
+    assert added == {'база': 1, 'индекс': 0, 'ключ': 2, 'запрос': 0}
+
+    db.rebuild_term_stats()
+    assert incremental == term_stats(db)
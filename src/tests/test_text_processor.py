@@ -0,0 +1,107 @@
+import itertools
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from database.text_processor import LemmaCache, TextProcessor, TextProcessorPool
+from tests.conftest import text
+
+CHUNKS = ['Отчет по лабораторной работе №1.', '', 'Базы данных: NoSQL, MongoDB и индексы!',
+          'Индексы ускоряют запросы к базам данных.']
+
+
+@pytest.fixture(scope='module')
+def morph():
+    pymorphy2 = pytest.importorskip('pymorphy2')
+    return pymorphy2.MorphAnalyzer()
+
+
+@pytest.mark.parametrize('tokenizer', TextProcessor.TOKENIZERS)
+def test_process_chunks_matches_process(stop_words, morph, tokenizer):
+    processor = TextProcessor(tokenizer=tokenizer, morph=morph)
+    try:
+        expected = processor.process(' '.join(CHUNKS))
+    except LookupError:
+        pytest.skip('нет данных nltk punkt')
+    del expected['words']['words']
+
+    assert processor.process_chunks(iter(CHUNKS)) == expected
+
+
+def test_failed_creation_frees_pool_slot(stop_words, monkeypatch):
+    from database import text_processor
+
+    pool = text_processor.TextProcessorPool(size=1)
+    original = text_processor.TextProcessor
+
+    def fail(**kwargs):
+        raise RuntimeError('нет словарей')
+
+    monkeypatch.setattr(text_processor, 'TextProcessor', fail)
+    with pytest.raises(RuntimeError):
+        pool.process('текст')
+    assert pool._created == 0
+
+    monkeypatch.setattr(text_processor, 'TextProcessor', original)
+    assert pool.process('текст')['words']['total_words'] == 1
+
+
+@pytest.mark.parametrize('pooled', [False, True])
+def test_concurrent_results_are_isolated(stop_words, morph, pooled):
+    texts = [text(500 + seed * 10, seed) for seed in range(16)]
+    serial = TextProcessor(morph=morph)
+    expected = [serial.process(item) for item in texts]
+    processor = TextProcessorPool(size=4) if pooled else TextProcessor(morph=morph)
+
+    jobs = [index % len(texts) for index in range(len(texts) * 10)]
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        results = list(executor.map(lambda index: (index, processor.process(texts[index])), jobs))
+
+    assert sum(result != expected[index] for index, result in results) == 0
+    # Ни словари результата, ни их разделы и списки не разделяются между вызовами
+    objects = [[result, result['words'], result['symbols'], result['text'], result['words']['unique_words']]
+               for _, result in results]
+    assert len({id(item) for item in itertools.chain.from_iterable(objects)}) == len(results) * 5
+
+
+class CountingMorph:
+    """ Анализатор-заглушка: нормальная форма - слово в верхнем регистре, разборы подсчитываются. """
+
+    class Parse:
+        def __init__(self, word):
+            self.normal_form = word.upper()
+
+    def __init__(self):
+        self.parsed = []
+
+    def parse(self, word):
+        self.parsed.append(word)
+        return [self.Parse(word)]
+
+
+def test_lemma_cache_evicts_least_recently_used():
+    cache, morph = LemmaCache(max_size=3), CountingMorph()
+
+    assert cache.lemmatize(['а', 'б', 'в'], morph) == {'а': 'А', 'б': 'Б', 'в': 'В'}
+    assert cache.lemmatize(['а'], morph) == {'а': 'А'}
+    # 'б' дольше всех не использовалось и вытесняется при добавлении 'г'
+    cache.lemmatize(['г'], morph)
+    assert cache.stats()['size'] == 3
+
+    morph.parsed.clear()
+    assert cache.lemmatize(['а', 'б', 'в', 'г'], morph) == {'а': 'А', 'б': 'Б', 'в': 'В', 'г': 'Г'}
+    assert morph.parsed == ['б']
+    assert cache.stats() == {'size': 3, 'max_size': 3, 'hits': 4, 'misses': 5, 'hit_rate': 4 / 9}
+
+
+def test_cache_stats_reports_lemma_counters(app, client, monkeypatch):
+    import app as app_module
+
+    cache = LemmaCache(max_size=2)
+    monkeypatch.setattr(app_module, 'lemma_cache', cache)
+    cache.lemmatize(['а', 'б'], CountingMorph())
+    cache.lemmatize(['а', 'в'], CountingMorph())
+
+    stats = json.loads(client.get('/cache_stats').data)['lemmas']
+    assert stats == {'size': 2, 'max_size': 2, 'hits': 1, 'misses': 3, 'hit_rate': 0.25}
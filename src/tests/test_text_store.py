@@ -0,0 +1,23 @@
+from tests.conftest import record, text
+
+
+def test_migrate_inline_texts(app):
+    db = app.db.get()
+    db.import_reports(enumerate(record(f'Автор {number}', raw_text=text(30, number)) for number in range(7)))
+    report_ids = [report['_id'] for report in db.db['reports'].find({}, {'_id': 1})]
+
+    # Отчеты, сохраненные до появления TextStore: текст лежит в самом документе
+    for report_id in report_ids:
+        db.db['reports'].update_one({'_id': report_id}, {'$set': {'text.raw_text': db.texts.get(report_id)}})
+    db.texts.drop()
+    before = {report_id: db.get_report_by_id(report_id) for report_id in report_ids}
+    assert all('raw_text' in report['text'] for report in before.values())
+
+    assert db.migrate_texts(batch_size=3) == 7
+
+    assert db.db['reports'].count_documents({'text.raw_text': {'$exists': True}}) == 0
+    assert db.db['report_texts'].count_documents({}) == 7
+    for report_id in report_ids:
+        assert db.get_report_by_id(report_id, with_text=True) == before[report_id]
+        assert db.get_report_text(report_id) == before[report_id]['text']['raw_text']
+    assert db.migrate_texts() == 0
@@ -0,0 +1,64 @@
+import pytest
+
+from database.tokenizer import FastTokenizer
+
+TEXTS = [
+    '',
+    '   ',
+    '!!! ... ---',
+    'Отчет по лабораторной работе №1.',
+    '  Базы данных: NoSQL, MongoDB и индексы!  ',
+    "It's a test, we cannot stop; gonna wanna-do 42nd",
+    'Слова_с_подчеркиванием, числа 3.14 и e-mail: test@example.com',
+    'Ё-моё\tтабуляция\nи перевод строки',
+]
+
+
+@pytest.fixture(scope='module')
+def reference(stop_words):
+    """ Цепочка TextProcessor с nltk word_tokenize: (слова без стоп-слов, длина очищенного текста). """
+    pytest.importorskip('pymorphy2')
+    from database.text_processor import TextProcessor
+
+    processor = TextProcessor(tokenizer='nltk')
+
+    def tokenize(raw_text):
+        from nltk.tokenize import word_tokenize
+
+        processed_text = {'symbols': dict(), 'text': dict(), 'words': dict()}
+        processor._clean_raw_text(raw_text, processed_text)
+        words = [word for word in word_tokenize(processed_text['text']['clean_text'])
+                 if word not in processor.stop_words]
+        return words, processed_text['symbols']['total_clean_symbols']
+
+    try:
+        tokenize('проверка')
+    except LookupError:
+        pytest.skip('нет данных nltk punkt')
+    return processor.fast_tokenizer, tokenize
+
+
+@pytest.mark.parametrize('text', TEXTS)
+def test_matches_nltk_pipeline(reference, text):
+    tokenizer, tokenize = reference
+    assert tokenizer.tokenize(text) == tokenize(text)
+
+
+@pytest.mark.parametrize('chunks', [
+    TEXTS,
+    ['', '', 'слово'],
+    ['слово', '', ''],
+    ['  ', 'слово  ', '!'],
+    ['!', '?'],
+    [],
+])
+def test_chunks_match_joined_text(chunks):
+    tokenizer = FastTokenizer(['и', 'по'])
+    words = []
+    total_symbols = tokenizer.tokenize_chunks(iter(chunks), words.extend)
+    assert (words, total_symbols) == tokenizer.tokenize(' '.join(chunks))
+
+
+def test_stop_words_and_contractions():
+    tokenizer = FastTokenizer(['not', 'и'])
+    assert tokenizer.tokenize('Кошки и собаки cannot') == (['кошки', 'собаки', 'can'], 21)
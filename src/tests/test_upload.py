@@ -0,0 +1,46 @@
+import json
+import zipfile
+
+import pytest
+
+from tests.conftest import SAMPLES, upload
+from utils.functions import spooled_file
+
+
+@pytest.mark.parametrize('max_size', [1 << 30, 1])
+def test_spooled_file_opens_as_zip(tmp_path, max_size):
+    # max_size=1 - файл сразу сбрасывается на диск
+    buffer = spooled_file(str(tmp_path), max_size)
+    with open(SAMPLES[0], 'rb') as docx:
+        buffer.write(docx.read())
+    buffer.seek(0)
+
+    assert buffer.readable() and buffer.seekable()
+    with zipfile.ZipFile(buffer) as archive:
+        assert 'word/document.xml' in archive.namelist()
+
+
+@pytest.mark.parametrize('threshold', [8 * 1024 * 1024, 1])
+def test_upload_docx(app, client, threshold):
+    app.config['UPLOAD_SPOOL_THRESHOLD'] = threshold
+
+    response = upload(client, SAMPLES[0])
+
+    assert response.status_code == 302
+    assert response.headers['Location'].rstrip('/').split('/')[-2] == 'report_stat'
+    report = app.db.db['reports'].find_one()
+    assert report['author'] == 'Иванов Иван'
+    assert report['words']['total_words'] > 0
+    assert app.db.get_report_text(report['_id'])
+
+
+def test_upload_docx_async(app, client):
+    app.config['ASYNC_UPLOADS'] = True
+
+    response = upload(client, SAMPLES[0])
+    assert response.status_code == 302
+    job_id = response.headers['Location'].rstrip('/').split('/')[-1]
+
+    app.jobs.shutdown()
+    job = json.loads(client.get(f'/jobs/{job_id}?format=json').data)
+    assert job['status'] == 'done', job
@@ -0,0 +1,58 @@
+from tests.conftest import SAMPLES, upload
+
+
+def test_success_is_tagged_and_revalidated(client):
+    upload(client, SAMPLES[0])
+
+    response = client.get('/groups/3341')
+    assert response.status_code == 200
+    assert response.headers['ETag']
+
+    again = client.get('/groups/3341', headers={'If-None-Match': response.headers['ETag']})
+    assert again.status_code == 304
+
+
+def test_errors_are_not_tagged(app, client, monkeypatch):
+    upload(client, SAMPLES[0])
+
+    missing = client.get('/groups/9999')
+    assert missing.status_code == 404
+    assert 'ETag' not in missing.headers
+
+    def fail(*args, **kwargs):
+        raise RuntimeError('database is down')
+
+    monkeypatch.setattr(app.db.get(), 'get_stat_of_group', fail)
+    failed = client.get('/groups/3341')
+    assert failed.status_code == 500
+    assert 'ETag' not in failed.headers
+    assert 'Last-Modified' not in failed.headers
+
+    terms = client.get('/groups/9999/distinctive_terms')
+    assert terms.status_code == 404
+    assert 'ETag' not in terms.headers
+
+
+def test_last_modified_only_after_its_second_has_passed(app, client, monkeypatch):
+    import datetime
+    from werkzeug.http import http_date
+
+    upload(client, SAMPLES[0])
+    version, modified = app.db.get_version(3341)
+
+    # Только что измененные данные: Last-Modified не отдается, новая запись в ту же секунду видна по ETag
+    fresh = client.get('/groups/3341')
+    assert 'Last-Modified' not in fresh.headers
+    assert client.get('/groups/3341', headers={'If-Modified-Since': http_date(modified)}).status_code == 200
+
+    old = modified - datetime.timedelta(minutes=1)
+    monkeypatch.setattr(app.db.get(), 'get_version', lambda group=None: (version, old))
+
+    settled = client.get('/groups/3341')
+    assert settled.headers['Last-Modified']
+    assert client.get('/groups/3341', headers={'If-Modified-Since': settled.headers['Last-Modified']}).status_code == 304
+
+    # ETag проверяется раньше If-Modified-Since: у новой версии другой ETag
+    monkeypatch.setattr(app.db.get(), 'get_version', lambda group=None: (version + 1, old))
+    assert client.get('/groups/3341', headers={'If-None-Match': settled.headers['ETag'],
+                                               'If-Modified-Since': settled.headers['Last-Modified']}).status_code == 200
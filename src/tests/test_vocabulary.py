@@ -0,0 +1,45 @@
+import pytest
+from pymongo.errors import BulkWriteError
+
+from database.indexes import apply_indexes
+from database.vocabulary import Vocabulary
+
+
+@pytest.fixture
+def db():
+    mongomock = pytest.importorskip('mongomock')
+    db = mongomock.MongoClient()['test']
+    apply_indexes(db)
+    return db
+
+
+def test_ids_are_stable_and_decodable(db):
+    vocabulary = Vocabulary(db)
+    ids = vocabulary.ids(['кот', 'пес'])
+
+    assert vocabulary.ids(['пес', 'кот']) == ids
+    assert Vocabulary(db).decode(sorted(ids.values())) == sorted(ids, key=ids.get)
+
+
+def test_word_added_concurrently_keeps_its_id(db, monkeypatch):
+    first = Vocabulary(db).ids(['кот'])
+
+    # Второй процесс не видит слово при первом чтении и пытается добавить его сам
+    second = Vocabulary(db)
+    load = second._load
+    calls = []
+    monkeypatch.setattr(second, '_load', lambda query: calls.append(query) if len(calls) == 0 else load(query))
+
+    assert second.ids(['кот', 'пес'])['кот'] == first['кот']
+    assert db['vocabulary'].count_documents({'word': 'кот'}) == 1
+
+
+def test_other_write_errors_are_raised(db, monkeypatch):
+    vocabulary = Vocabulary(db)
+
+    def fail(*args, **kwargs):
+        raise BulkWriteError({'writeErrors': [{'index': 0, 'code': 121, 'errmsg': 'Document failed validation'}]})
+
+    monkeypatch.setattr(vocabulary.collection, 'insert_many', fail)
+    with pytest.raises(BulkWriteError):
+        vocabulary.ids(['кот'])
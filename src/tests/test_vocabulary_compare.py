@@ -0,0 +1,45 @@
+import math
+
+from tests.conftest import SAMPLES, upload
+
+AUTHORS = ['Петров Петр', 'Сидоров Сидор']
+
+
+def old_words_compare(db, authors, group):
+    """ Сравнение словарей прежним способом: объединение unique_words отчетов и попарный обход множеств. """
+    vocabularies = {}
+    for report in db.db['reports'].find({'group': group, 'author': {'$in': authors}}):
+        vocabularies.setdefault(report['author'], set()).update(db._decode(report)['words']['unique_words'])
+
+    compare, words_intersections = {}, []
+    for author in sorted(vocabularies):
+        compare[author] = {}
+        for other_author in sorted(vocabularies):
+            if other_author == author:
+                compare[author][author] = float('nan')
+                continue
+            intersection = vocabularies[author] & vocabularies[other_author]
+            compare[author][other_author] = len(intersection) / min(len(vocabularies[author]),
+                                                                    len(vocabularies[other_author])) * 100.0
+            words_intersections.append((author, other_author, intersection))
+    return compare, words_intersections
+
+
+def test_words_compare_matches_per_word_loop(app, client):
+    # У первого автора два отчета: его словарь - объединение словарей отчетов
+    for path, author in zip(SAMPLES[:3], [AUTHORS[0], AUTHORS[1], AUTHORS[0]]):
+        assert upload(client, path, author=author).status_code == 302
+
+    compare, words_intersections = app.db.get_words_compare(AUTHORS, 3341)
+    expected, expected_intersections = old_words_compare(app.db.get(), AUTHORS, 3341)
+
+    assert list(compare) == list(expected) == AUTHORS
+    for author in AUTHORS:
+        assert math.isnan(compare[author][author])
+        for other_author in AUTHORS:
+            if other_author != author:
+                assert compare[author][other_author] == expected[author][other_author]
+    assert 0 < compare[AUTHORS[0]][AUTHORS[1]] < 100
+
+    assert [(author, other_author, set(words)) for author, other_author, words in words_intersections] == \
+        expected_intersections
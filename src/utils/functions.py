@@ -1,4 +1,15 @@
+import base64
+import datetime
+import functools
+import hashlib
 import os
+import shutil
+import tempfile
+import zlib
+
+from bson import json_util
+from bson.tz_util import utc
+from flask import Request, current_app, request
 
 
 def validate_input(data, is_empty_file=False):
@@ -62,18 +73,144 @@ def serialized_meta(form):
     }
 
 
-def save_file(file, path):
+class SpooledFile(tempfile.SpooledTemporaryFile):
+    """ SpooledTemporaryFile с readable/seekable/writable.
+
+    До Python 3.11 у SpooledTemporaryFile этих методов нет, а zipfile
+    (python-docx, DocxStream) вызывает seekable() у переданного файла.
+    """
+
+    def readable(self):
+        return self._file.readable()
+
+    def seekable(self):
+        return self._file.seekable()
+
+    def writable(self):
+        return self._file.writable()
+
+
+def spooled_file(path, max_memory_size):
+    """ Временный файл в памяти, который сбрасывается в path при превышении max_memory_size. """
     if not os.path.exists(path):
         os.makedirs(path)
 
-    filename = file.filename
-    path = os.path.join(path, filename)
+    return SpooledFile(max_size=max_memory_size, dir=path)
+
+
+def copy_upload(file, path, max_memory_size):
+    """ Копирует загруженный файл, чтобы он пережил закрытие запроса. """
+    buffer = spooled_file(path, max_memory_size)
     try:
-        file.save(path)
-        return path
+        file.stream.seek(0)
+        shutil.copyfileobj(file.stream, buffer)
+        buffer.seek(0)
+        return buffer
 
     except:
-        raise OSError("Can't save file")
+        buffer.close()
+        raise OSError("Can't read file")
+
+
+def gzip_stream(chunks, level=6):
+    """ Сжимает поток строк в gzip на лету, по мере поступления частей. """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+# Время в курсорах всегда с часовым поясом UTC, независимо от умолчаний версии pymongo
+CURSOR_JSON_OPTIONS = json_util.JSONOptions(tz_aware=True, tzinfo=utc)
+
+
+def encode_cursor(values):
+    """ Курсор страницы: значения ключей сортировки последней записи в виде строки для URL. """
+    data = json_util.dumps(list(values), json_options=CURSOR_JSON_OPTIONS)
+    return base64.urlsafe_b64encode(data.encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor, size):
+    """ Обратное encode_cursor преобразование; ValueError для чужой или поврежденной строки. """
+    try:
+        values = json_util.loads(base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8'),
+                                 json_options=CURSOR_JSON_OPTIONS)
+    except Exception:
+        raise ValueError('Некорректный курсор страницы')
+
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError('Некорректный курсор страницы')
+    return values
+
+
+# Запас на точность Last-Modified (1 секунда) и расхождение часов приложения и MongoDB
+LAST_MODIFIED_DELAY = datetime.timedelta(seconds=2)
+
+
+def versioned(group_arg=None):
+    """ Условный GET для страниц и JSON, зависящих только от данных отчетов.
+
+    ETag строится из версии данных (всех отчетов или группы из аргумента
+    group_arg маршрута) и параметров запроса. Совпадение If-None-Match или
+    If-Modified-Since дает 304 до вызова обработчика и запросов агрегации.
+    Метки получают только ответы 200: ошибки обработчики возвращают с кодами
+    4xx/5xx, и клиенты не должны получать их повторно по 304.
+
+    If-None-Match проверяется первым и сравнивает саму версию. Last-Modified
+    точен до секунды, и запись в ту же секунду его не меняет, поэтому время
+    изменения моложе LAST_MODIFIED_DELAY не отдается и If-Modified-Since
+    для него не учитывается: такие ответы проверяются только по ETag.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(*args, **kwargs)
+
+            group = kwargs.get(group_arg) if group_arg else None
+            version, modified = current_app.db.get_version(group)
+
+            key = f'{group}:{version}:{request.full_path}'
+            etag = hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+            if modified is not None:
+                modified = modified.replace(tzinfo=None)
+                if datetime.datetime.utcnow() - modified < LAST_MODIFIED_DELAY:
+                    modified = None
+
+            if request.if_none_match:
+                not_modified = request.if_none_match.contains(etag)
+            else:
+                not_modified = bool(modified and request.if_modified_since and
+                                    modified.replace(microsecond=0) <= request.if_modified_since.replace(tzinfo=None))
+
+            if not_modified:
+                response = current_app.response_class(status=304)
+            else:
+                response = current_app.make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+
+            response.set_etag(etag)
+            if modified:
+                response.last_modified = modified
+            # Кэши могут хранить ответ, но обязаны проверять его актуальность
+            response.cache_control.no_cache = True
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+class UploadRequest(Request):
+    """ Запрос, хранящий загруженные файлы в памяти до UPLOAD_SPOOL_THRESHOLD байт. """
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return spooled_file(current_app.config['UPLOAD_FOLDER'],
+                            current_app.config['UPLOAD_SPOOL_THRESHOLD'])
 
 
 if __name__ == '__main__':
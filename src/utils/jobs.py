@@ -0,0 +1,94 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+
+class Job:
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+
+    def __init__(self, job_id):
+        self.id = job_id
+        self.status = Job.PENDING
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.finished = None
+
+    def serialize(self):
+        return {
+            'id': self.id,
+            'status': self.status,
+            'result': self.result,
+            'error': self.error,
+            'created': self.created,
+            'finished': self.finished
+        }
+
+    @classmethod
+    def deserialize(cls, data):
+        job = cls(data['id'])
+        for field in ('status', 'result', 'error', 'created', 'finished'):
+            setattr(job, field, data.get(field))
+        return job
+
+
+class JobQueue:
+    """ Очередь фоновых задач на локальном пуле потоков, без внешнего брокера.
+
+    Хранит статусы последних max_jobs задач в памяти процесса. Если задано
+    хранилище store (объект с методами save_job и get_job), статусы также
+    записываются в него: задачу можно проверить из любого рабочего процесса.
+    """
+
+    def __init__(self, workers=2, max_jobs=1000, store=None):
+        self.max_jobs = max_jobs
+        self.store = store
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='job')
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, fn, *args, **kwargs):
+        job = Job(uuid.uuid4().hex)
+
+        with self._lock:
+            self._jobs[job.id] = job
+            while len(self._jobs) > self.max_jobs:
+                self._jobs.popitem(last=False)
+
+        self._save(job)
+        self._executor.submit(self._run, job, fn, args, kwargs)
+        return job.id
+
+    def _save(self, job):
+        if self.store is not None:
+            self.store.save_job(job.serialize())
+
+    def _run(self, job, fn, args, kwargs):
+        job.status = Job.RUNNING
+        try:
+            self._save(job)
+            job.result = fn(*args, **kwargs)
+            job.status = Job.DONE
+        except Exception as ex:
+            job.error = str(ex) or type(ex).__name__
+            job.status = Job.FAILED
+        finally:
+            job.finished = time.time()
+        self._save(job)
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None and self.store is not None:
+            data = self.store.get_job(job_id)
+            if data is not None:
+                job = Job.deserialize(data)
+        return job
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
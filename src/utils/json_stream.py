@@ -0,0 +1,94 @@
+import codecs
+import json
+
+WHITESPACE = ' \t\n\r'
+# Наибольший размер одной записи в символах
+MAX_RECORD_SIZE = 64 * 1024 * 1024
+
+
+def iter_json_records(stream, chunk_size=64 * 1024, object_hook=None, max_record_size=MAX_RECORD_SIZE):
+    """ Последовательно читает объекты из JSON-массива или NDJSON, не загружая файл целиком.
+
+    Формат определяется по первому значащему символу: '[' - массив, иначе NDJSON.
+    Выдает пары (номер записи, объект); битая запись завершает чтение ValueError.
+    Если запись не разобрана, буфер перед следующей попыткой увеличивается вдвое,
+    поэтому длинная запись разбирается за линейное время; запись длиннее
+    max_record_size символов считается битой.
+    """
+    decoder = json.JSONDecoder(object_hook=object_hook)
+    utf8 = codecs.getincrementaldecoder('utf-8-sig')()
+    buffer = ''
+    position = 0
+    eof = False
+    is_array = None
+    expect_separator = False
+    expect_record = False
+    index = 0
+
+    def fill(buffer, position, size=1):
+        # Дочитывает не меньше size символов (или до конца файла) к непрочитанной части буфера
+        parts = [buffer[position:]]
+        read = 0
+        eof = False
+        while read < size and not eof:
+            data = stream.read(chunk_size)
+            eof = not data
+            if isinstance(data, bytes):
+                data = utf8.decode(data, final=eof)
+            parts.append(data)
+            read += len(data)
+        return ''.join(parts), 0, eof
+
+    while True:
+        while position < len(buffer) and buffer[position] in WHITESPACE:
+            position += 1
+
+        if position >= len(buffer):
+            if eof:
+                break
+            buffer, position, eof = fill(buffer, position)
+            continue
+
+        char = buffer[position]
+        if is_array is None:
+            is_array = char == '['
+            if is_array:
+                position += 1
+                continue
+
+        if is_array:
+            if char == ']':
+                if expect_record:
+                    raise ValueError(f'Лишняя запятая после записи {index}')
+                return
+            if expect_separator:
+                if char != ',':
+                    raise ValueError(f'Ожидалась запятая после записи {index}')
+                position += 1
+                expect_separator = False
+                expect_record = True
+                continue
+
+        try:
+            record, end = decoder.raw_decode(buffer, position)
+        except ValueError:
+            # Запись еще не прочитана целиком
+            pending = len(buffer) - position
+            if eof or pending > max_record_size:
+                raise ValueError(f'Некорректная запись {index + 1}')
+            buffer, position, eof = fill(buffer, position, max(pending, chunk_size))
+            continue
+
+        # Число в конце буфера может продолжаться в следующей части
+        if end == len(buffer) and not eof and not isinstance(record, (dict, list)):
+            buffer, position, eof = fill(buffer, position)
+            continue
+
+        index += 1
+        position = end
+        expect_separator = is_array
+        expect_record = False
+        yield index, record
+
+    if is_array:
+        raise ValueError('JSON-массив не закрыт')
@@ -0,0 +1,29 @@
+import threading
+
+
+class Lazy:
+    """ Заместитель объекта, создаваемого factory() при первом обращении к его атрибутам.
+
+    Создание выполняется один раз, в том числе при одновременных обращениях из
+    нескольких потоков. Ошибка создания не запоминается: следующее обращение
+    повторит попытку.
+    """
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._instance = None
+        self._lock = threading.Lock()
+
+    @property
+    def created(self):
+        return self._instance is not None
+
+    def get(self):
+        if self._instance is None:
+            with self._lock:
+                if self._instance is None:
+                    self._instance = self._factory()
+        return self._instance
+
+    def __getattr__(self, name):
+        return getattr(self.get(), name)